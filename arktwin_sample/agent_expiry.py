@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+エージェントの有効期限管理
+
+最後に観測してから一定時間（TTL）が経過したエージェントと、
+上限数を超えた分の最も古いエージェントを、全件を走査せずに求める。
+
+最後に観測した時刻はエージェントごとの辞書に記録し、ヒープにはエージェントごとに1件の
+（観測時刻, 世代, ID）のみを置く。観測のたびにヒープを更新せず、
+取り出した時点で再観測されていれば積み直す（遅延更新）。
+世代は削除・再追加のたびに増やし、以前の追加で積んだヒープの要素を無効にする。
+TTLは expire() の時点の値で判定するため、実行中にTTLを変更しても既存のエージェントに正しく適用される。
+"""
+
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+
+class ExpiryQueue:
+    """TTLと上限数によるエージェントの削除対象を管理する
+
+    Attributes:
+        ttl (Optional[float]): 最後に観測してから削除するまでの秒数（Noneの場合は期限なし）
+        max_agents (Optional[int]): 保持するエージェントの上限数（Noneの場合は上限なし）
+    """
+
+    def __init__(self, ttl: Optional[float] = 5.0, max_agents: Optional[int] = None):
+        self.ttl = ttl
+        self.max_agents = max_agents
+        # 最後に観測した時刻
+        self._seen: Dict[str, float] = {}
+        self._generation: Dict[str, int] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._next_generation = 0
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def __contains__(self, agent_id: str) -> bool:
+        return agent_id in self._seen
+
+    def touch(self, agent_id: str, now: float):
+        """エージェントを観測した時刻を記録する"""
+        if agent_id in self._seen:
+            # ヒープは取り出し時に積み直すため、観測時刻の記録のみ更新する
+            self._seen[agent_id] = now
+            return
+        self._next_generation += 1
+        self._seen[agent_id] = now
+        self._generation[agent_id] = self._next_generation
+        heapq.heappush(self._heap, (now, self._next_generation, agent_id))
+
+    def discard(self, agent_id: str):
+        """エージェントの記録を削除する（ヒープの要素は取り出し時に捨てる）"""
+        self._seen.pop(agent_id, None)
+        self._generation.pop(agent_id, None)
+
+    def clear(self):
+        self._seen.clear()
+        self._generation.clear()
+        self._heap.clear()
+
+    def _pop_oldest(self, seen_before: Optional[float]) -> Optional[str]:
+        """最後に観測した時刻が最も古いエージェントを取り出す
+
+        Args:
+            seen_before (Optional[float]): 指定した場合は観測時刻がこの時刻以前のエージェントのみ
+
+        Returns:
+            Optional[str]: 取り出したエージェントID（該当なしの場合None）
+        """
+        heap = self._heap
+        while heap:
+            seen, generation, agent_id = heap[0]
+            if seen_before is not None and seen > seen_before:
+                return None
+            if self._generation.get(agent_id) != generation:
+                # 削除済み、または以前の追加で積んだ要素
+                heapq.heappop(heap)
+                continue
+            current = self._seen[agent_id]
+            if current > seen:
+                # 再観測されているため積み直す
+                heapq.heapreplace(heap, (current, generation, agent_id))
+                continue
+            heapq.heappop(heap)
+            self.discard(agent_id)
+            return agent_id
+        return None
+
+    def expire(self, now: float) -> List[str]:
+        """期限切れのエージェントと、上限数を超えた分の最も古いエージェントを取り除く
+
+        Returns:
+            List[str]: 取り除いたエージェントID（呼び出し側で保持データから削除する）
+        """
+        evicted: List[str] = []
+        if self.ttl is not None:
+            while True:
+                agent_id = self._pop_oldest(now - self.ttl)
+                if agent_id is None:
+                    break
+                evicted.append(agent_id)
+        if self.max_agents is not None:
+            while len(self._seen) > self.max_agents:
+                agent_id = self._pop_oldest(None)
+                if agent_id is None:
+                    break
+                evicted.append(agent_id)
+        return evicted
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+エージェント状態ストア
+
+シミュレーターが管理するエージェントの状態を、エージェントごとのオブジェクトではなく
+連続したNumPy配列（struct-of-arrays）で保持する。
+位置・向き・速さ・速度を配列単位で一括計算することで、
+多数のエージェントを1フレーム（100ms）内で更新できるようにする。
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+class AgentStore:
+    """エージェント状態のstruct-of-arrays
+
+    各エージェントは行番号で表され、エージェントIDから行番号への索引を持つ。
+    配列は容量を倍々に拡張し、使用中の行のみをビューとして公開する。
+
+    Attributes:
+        ids (List[str]): 行番号順のエージェントID
+        index (Dict[str, int]): エージェントIDから行番号への索引
+    """
+
+    def __init__(self, capacity: int = 16, extra_columns: Sequence[str] = ()):
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.size = 0
+        capacity = max(1, capacity)
+        # 位置（メートル）: x=東, y=北, z=上
+        self._position = np.zeros((capacity, 3))
+        # 向き（ラジアン、X軸から反時計回り）
+        self._heading = np.zeros(capacity)
+        # 速さ（m/s）
+        self._speed = np.zeros(capacity)
+        # 速度ベクトル（m/s）
+        self._velocity = np.zeros((capacity, 3))
+        # シミュレーター固有の追加列（歩行者の目標地点など）
+        self._extra: Dict[str, np.ndarray] = {name: np.zeros(capacity) for name in extra_columns}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, agent_id: str) -> bool:
+        return agent_id in self.index
+
+    @property
+    def capacity(self) -> int:
+        return len(self._heading)
+
+    @property
+    def position(self) -> np.ndarray:
+        """位置配列 (size, 3) のビュー"""
+        return self._position[:self.size]
+
+    @property
+    def heading(self) -> np.ndarray:
+        """向き配列 (size,) のビュー（ラジアン）"""
+        return self._heading[:self.size]
+
+    @property
+    def speed(self) -> np.ndarray:
+        """速さ配列 (size,) のビュー"""
+        return self._speed[:self.size]
+
+    @property
+    def velocity(self) -> np.ndarray:
+        """速度配列 (size, 3) のビュー"""
+        return self._velocity[:self.size]
+
+    def column(self, name: str) -> np.ndarray:
+        """追加列 (size,) のビューを取得する"""
+        return self._extra[name][:self.size]
+
+    def row(self, agent_id: str) -> int:
+        """エージェントIDに対応する行番号を取得する"""
+        return self.index[agent_id]
+
+    def _reserve(self, capacity: int):
+        """少なくとも指定した容量を確保する"""
+        if capacity <= self.capacity:
+            return
+        new_capacity = max(capacity, self.capacity * 2)
+
+        def grow(array: np.ndarray) -> np.ndarray:
+            grown = np.zeros((new_capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            return grown
+
+        self._position = grow(self._position)
+        self._heading = grow(self._heading)
+        self._speed = grow(self._speed)
+        self._velocity = grow(self._velocity)
+        self._extra = {name: grow(array) for name, array in self._extra.items()}
+
+    def add(self, agent_id: str, x: float, y: float, z: float,
+            speed: float = 0.0, heading: float = 0.0, **extra: float) -> int:
+        """エージェントを1件追加する
+
+        Args:
+            agent_id (str): エージェントID
+            x, y, z (float): 位置（メートル）
+            speed (float): 速さ（m/s）
+            heading (float): 向き（ラジアン）
+            **extra (float): 追加列の値
+
+        Returns:
+            int: 追加した行番号
+        """
+        rows = self.add_many([agent_id], np.array([[x, y, z]]), np.array([speed]),
+                             np.array([heading]), **{k: np.array([v]) for k, v in extra.items()})
+        return int(rows[0])
+
+    def add_many(self, agent_ids: Iterable[str], positions: np.ndarray,
+                 speeds: Optional[np.ndarray] = None, headings: Optional[np.ndarray] = None,
+                 **extra: np.ndarray) -> np.ndarray:
+        """エージェントをまとめて追加する
+
+        Args:
+            agent_ids (Iterable[str]): エージェントID
+            positions (np.ndarray): 位置 (n, 3)
+            speeds (Optional[np.ndarray]): 速さ (n,)
+            headings (Optional[np.ndarray]): 向き (n,)（ラジアン）
+            **extra (np.ndarray): 追加列の値 (n,)
+
+        Returns:
+            np.ndarray: 追加した行番号
+        """
+        agent_ids = list(agent_ids)
+        count = len(agent_ids)
+        start = self.size
+        duplicated = [agent_id for agent_id in agent_ids if agent_id in self.index]
+        if duplicated or len(set(agent_ids)) != count:
+            raise ValueError(f"エージェントIDが重複しています: {duplicated[:5]}")
+        self.index.update(zip(agent_ids, range(start, start + count)))
+        self._reserve(start + count)
+        self.ids.extend(agent_ids)
+
+        end = start + count
+        self._position[start:end] = positions
+        self._speed[start:end] = 0.0 if speeds is None else speeds
+        self._heading[start:end] = 0.0 if headings is None else headings
+        for name, values in extra.items():
+            self._extra[name][start:end] = values
+        self.size = end
+        self.update_velocity(slice(start, end))
+        return np.arange(start, end)
+
+    def set_motion(self, rows, x: np.ndarray, y: np.ndarray, heading: np.ndarray,
+                   speed: np.ndarray, z=None):
+        """指定した行の位置・向き・速さを一括で設定し、速度を再計算する
+
+        Args:
+            rows: 行番号の配列またはスライス
+            x, y (np.ndarray): 位置（メートル）
+            heading (np.ndarray): 向き（ラジアン）
+            speed (np.ndarray): 速さ（m/s）
+            z: 高さ（省略時は変更しない）
+        """
+        self._position[rows, 0] = x
+        self._position[rows, 1] = y
+        if z is not None:
+            self._position[rows, 2] = z
+        self._heading[rows] = heading
+        self._speed[rows] = speed
+        self.update_velocity(rows)
+
+    def update_velocity(self, rows=slice(None)):
+        """向きと速さから速度ベクトルを一括計算する（水平面内の移動）"""
+        if isinstance(rows, slice):
+            rows = slice(*rows.indices(self.size))
+        heading = self._heading[rows]
+        speed = self._speed[rows]
+        self._velocity[rows, 0] = speed * np.cos(heading)
+        self._velocity[rows, 1] = speed * np.sin(heading)
+        self._velocity[rows, 2] = 0.0
+
+    def heading_degrees(self) -> np.ndarray:
+        """向きを度単位で取得する（ArkTwinのEulerAngles.z）"""
+        return np.degrees(self.heading)
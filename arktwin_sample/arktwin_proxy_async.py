@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+ArkTwin プロキシサーバー（asyncio版）
+
+arktwin_proxy_server.py と同じREST API・WebSocket配信を、aiohttp と
+python-socketio の AsyncServer により1つのイベントループで提供する。
+Edgeのポーリングも同じイベントループ上で行うため、接続ごとのスレッドを持たず、
+多数の待機中のダッシュボード接続（WebSocket・ロングポーリング）を少ないメモリで保持できる。
+
+arktwin_proxy_server.py の --server asyncio で起動する。
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+import socketio
+from aiohttp import web
+
+from arktwin_proxy_server import (
+    ArkTwinProxy,
+    EdgeEndpoint,
+    long_poll_timeout,
+)
+from edge_client import AsyncEdgeClient, gather_within_deadline
+from metrics import CONTENT_TYPE
+from snapshot_store import Snapshot
+from viewport import Viewport
+
+logger = logging.getLogger(__name__)
+
+
+def _query_value(query, name: str, type_, default=None):
+    """クエリパラメータを型変換して取得する
+
+    Flask の request.args.get(name, default, type) と同じく、
+    パラメータがない場合と変換できない場合は default を返す。
+    """
+    try:
+        return type_(query[name])
+    except (KeyError, ValueError):
+        return default
+
+
+class AsyncArkTwinProxy(ArkTwinProxy):
+    """イベントループ上で動作する ArkTwin Edge API のプロキシクラス
+
+    統合・有効期限・スナップショット・配信メッセージの作成は ArkTwinProxy と共通で、
+    Edgeへの問い合わせ、更新ループ、Socket.IOへの送信のみを非同期で行う。
+    """
+
+    def __init__(self, sio: socketio.AsyncServer, edges: Optional[List[EdgeEndpoint]] = None,
+                 agent_ttl: Optional[float] = 5.0, max_agents: Optional[int] = None):
+        super().__init__(edges, agent_ttl=agent_ttl, max_agents=max_agents)
+        self.sio = sio
+        # 配信メッセージの作成と送信の順序をイベントループ内で保つ
+        self._stream_lock = asyncio.Lock()
+        self._edge_clients: Dict[str, AsyncEdgeClient] = {}
+        self._update_task: Optional[asyncio.Task] = None
+        # 公開のたびに set() して差し替える（ロングポーリングの待機用）
+        self._published = asyncio.Event()
+        # クライアントの接続・データ要求時に一時停止中の更新ループを起こす
+        self._wakeup = asyncio.Event()
+
+    def start_monitoring(self):
+        """ArkTwin監視を開始（イベントループ上から呼び出す）"""
+        if not self.is_running:
+            self.is_running = True
+            self.touch_demand()
+            self._update_task = asyncio.get_running_loop().create_task(self._update_loop_async())
+            logger.info("ArkTwin監視を開始しました")
+
+    def stop_monitoring(self):
+        """ArkTwin監視を停止"""
+        self.is_running = False
+        if self._update_task is not None:
+            self._update_task.cancel()
+            self._update_task = None
+        logger.info("ArkTwin監視を停止しました")
+
+    async def close(self):
+        """監視を停止し、Edgeへの接続を閉じる"""
+        self.stop_monitoring()
+        for client in self._edge_clients.values():
+            await client.close()
+        self._edge_clients.clear()
+
+    async def _update_loop_async(self):
+        """データ更新ループ（周期の維持と一時停止は ArkTwinProxy._update_loop と同じ）"""
+        while self.is_running:
+            self._wakeup.clear()
+            if not self._has_demand():
+                self._set_paused(True)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._set_paused(False)
+            try:
+                started = time.perf_counter()
+                await self._fetch_all_data_async()
+                started = self._record_phase("fetch", started)
+                self._publish_snapshot()
+                started = self._record_phase("publish", started)
+                await self._emit_update_async()
+                self._record_phase("emit", started)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._record_error(e)
+                delay = self._loop_backoff.failure(time.monotonic())
+            else:
+                self._loop_backoff.success()
+                delay = self._next_delay()
+            await asyncio.sleep(delay)
+
+    def _edge_client(self, edge: EdgeEndpoint) -> AsyncEdgeClient:
+        client = self._edge_clients.get(edge.url)
+        if client is None:
+            client = AsyncEdgeClient(edge.url, pool_size=2)
+            self._edge_clients[edge.url] = client
+        return client
+
+    async def _fetch_neighbors_async(self, edge: EdgeEndpoint, timestamp):
+        """指定したEdgeから近隣情報を取得
+
+        Returns:
+            Tuple[dict, float]: レスポンスと所要時間（秒）
+        """
+        started = time.perf_counter()
+        data = await self._edge_client(edge).query_neighbors(self._neighbor_query(timestamp),
+                                                             timeout=edge.timeout)
+        return data, time.perf_counter() - started
+
+    async def _fetch_all_data_async(self):
+        """全Edgeへの近隣検索を並行して送信し、期限までに届いたレスポンスを統合"""
+        edges = self._edges_due()
+        now = time.time()
+        if not edges:
+            self._finish_update(now)
+            return
+        timestamp = {
+            "seconds": int(now),
+            "nanos": 0
+        }
+
+        loop = asyncio.get_running_loop()
+        tasks = {index: loop.create_task(self._fetch_neighbors_async(edge, timestamp))
+                 for index, edge in enumerate(edges)}
+        results = await gather_within_deadline(
+            tasks, loop.time() + max(edge.timeout for edge in edges) + 0.1)
+
+        for index, edge in enumerate(edges):
+            result = results.get(index)
+            if result is None or isinstance(result, asyncio.TimeoutError):
+                self._record_edge_result(edge, now, timed_out=True)
+            elif isinstance(result, Exception):
+                self._record_edge_result(edge, now, error=result)
+            else:
+                data, latency = result
+                self._record_edge_result(edge, now, data=data, latency=latency)
+        self._finish_update(now)
+
+    def _publish_snapshot(self) -> Snapshot:
+        snapshot = super()._publish_snapshot()
+        published, self._published = self._published, asyncio.Event()
+        published.set()
+        return snapshot
+
+    async def wait_for_snapshot(self, since: int, timeout: float) -> Snapshot:
+        """バージョン since より新しいスナップショットが公開されるまで待つ（SnapshotStore.wait_for と同じ）"""
+        if self.snapshots.current.version != since:
+            return self.snapshots.current
+        try:
+            await asyncio.wait_for(self._published.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.snapshots.current
+
+    async def _emit_update_async(self):
+        """WebSocket経由でデータ更新を送信"""
+        snapshot = self.snapshots.current
+        async with self._stream_lock:
+            for event, data, options in self._stream_messages(snapshot):
+                self._observe_payload(event, data, snapshot)
+                await self.sio.emit(event, data, **options)
+
+    async def add_client(self, sid: str, stream: Optional[str]):
+        """配信方式（None: 全件, "delta", "binary"）を指定してクライアントを追加し、初期データを送信"""
+        async with self._stream_lock:
+            await self.sio.enter_room(sid, self._register_client(sid, stream))
+            if stream is None:
+                await self.sio.emit('data_update', self.get_current_data(), to=sid)
+        if stream is not None:
+            await self.request_keyframe_async(sid)
+
+    async def request_keyframe_async(self, sid: str, dropped: bool = False):
+        """クライアントにキーフレームまたはID辞書を送信（再同期要求、dropped は request_keyframe と同じ）"""
+        async with self._stream_lock:
+            if dropped:
+                self._dropped_frames.labels("resync").inc()
+            for event, data, options in self._resync_messages(sid):
+                self._observe_payload(event, data)
+                await self.sio.emit(event, data, **options)
+
+    async def set_viewport_async(self, sid: str, viewport: Optional[Viewport]):
+        """クライアントの表示範囲を設定（Noneの場合は絞り込みを解除）"""
+        async with self._stream_lock:
+            self._apply_viewport(sid, viewport)
+
+    async def remove_client_async(self, sid: str):
+        """切断したクライアントを削除"""
+        async with self._stream_lock:
+            self._unregister_client(sid)
+
+
+@web.middleware
+async def cors_middleware(request: web.Request, handler):
+    """全オリジンからのアクセスを許可（Flask-CORS の既定と同じ）"""
+    if request.method == "OPTIONS":
+        response = web.Response()
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+        response.headers["Access-Control-Allow-Headers"] = request.headers.get(
+            "Access-Control-Request-Headers", "Content-Type")
+    else:
+        response = await handler(request)
+    response.headers["Access-Control-Allow-Origin"] = "*"
+    return response
+
+
+def create_app(edges: Optional[List[EdgeEndpoint]] = None, agent_ttl: Optional[float] = 5.0,
+               max_agents: Optional[int] = None, idle_timeout: Optional[float] = 10.0,
+               neighbors_number: int = 100) -> web.Application:
+    """REST API と Socket.IO を提供する aiohttp アプリケーションを作成
+
+    Returns:
+        web.Application: app["proxy"] に AsyncArkTwinProxy を保持するアプリケーション
+    """
+    sio = socketio.AsyncServer(async_mode="aiohttp", cors_allowed_origins="*",
+                               logger=False, engineio_logger=False)
+    proxy = AsyncArkTwinProxy(sio, edges, agent_ttl=agent_ttl, max_agents=max_agents)
+    proxy.idle_timeout = idle_timeout
+    proxy.neighbors_number = neighbors_number
+    app = web.Application(middlewares=[cors_middleware])
+    app["proxy"] = proxy
+    sio.attach(app)
+
+    # REST API エンドポイント
+    async def index(request: web.Request):
+        """可視化ページ"""
+        return web.FileResponse(os.path.join(".", "visualization.html"))
+
+    async def get_data(request: web.Request):
+        """現在のデータを取得（ETag と since によるロングポーリングは Flask 版と同じ）"""
+        proxy.touch_demand()
+        since = _query_value(request.query, "since", int)
+        if since is None:
+            snapshot = proxy.snapshots.current
+        else:
+            timeout = long_poll_timeout(_query_value(request.query, "timeout", float))
+            snapshot = await proxy.wait_for_snapshot(since, timeout)
+
+        etag = f'"{snapshot.etag}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("If-None-Match", "")
+        if etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=snapshot.json(), content_type="application/json", headers=headers)
+
+    async def start_monitoring(request: web.Request):
+        """監視開始"""
+        proxy.start_monitoring()
+        return web.json_response({"status": "started", "message": "ArkTwin監視を開始しました"})
+
+    async def stop_monitoring(request: web.Request):
+        """監視停止"""
+        proxy.stop_monitoring()
+        return web.json_response({"status": "stopped", "message": "ArkTwin監視を停止しました"})
+
+    async def get_config(request: web.Request):
+        """設定の取得"""
+        return web.json_response(proxy.get_config())
+
+    async def post_config(request: web.Request):
+        """設定の更新"""
+        proxy.update_config(await request.json())
+        return web.json_response({"status": "updated", "message": "設定を更新しました"})
+
+    async def get_stats(request: web.Request):
+        """統計情報を取得"""
+        return web.json_response(proxy.snapshots.current.stats)
+
+    async def metrics(request: web.Request):
+        """Prometheus形式のメトリクス"""
+        return web.Response(body=proxy.metrics.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    app.router.add_get("/", index)
+    app.router.add_get("/visualization.html", index)
+    app.router.add_get("/api/data", get_data)
+    app.router.add_post("/api/start", start_monitoring)
+    app.router.add_post("/api/stop", stop_monitoring)
+    app.router.add_get("/api/config", get_config)
+    app.router.add_post("/api/config", post_config)
+    app.router.add_get("/api/stats", get_stats)
+    app.router.add_get("/metrics", metrics)
+
+    # WebSocket イベント
+    @sio.event
+    async def connect(sid, environ):
+        """クライアント接続時（stream=delta / binary で配信方式を選択）"""
+        logger.info('クライアントが接続しました')
+        stream = parse_qs(environ.get("QUERY_STRING", "")).get("stream", [None])[0]
+        await proxy.add_client(sid, stream if stream in ("delta", "binary") else None)
+
+    @sio.event
+    async def disconnect(sid, *args):
+        """クライアント切断時"""
+        logger.info('クライアントが切断しました')
+        await proxy.remove_client_async(sid)
+
+    @sio.event
+    async def resync(sid):
+        """差分やID辞書を取りこぼしたクライアントからの再同期要求"""
+        await proxy.request_keyframe_async(sid, dropped=True)
+
+    @sio.event
+    async def subscribe(sid, data):
+        """表示範囲と種類の絞り込み（{"bbox": [min_x, min_y, max_x, max_y], "kinds": [...]}）"""
+        try:
+            viewport = Viewport.parse(data)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"表示範囲の指定が正しくありません: {e}")
+            return
+        await proxy.set_viewport_async(sid, viewport)
+
+    @sio.on('start_monitoring')
+    async def handle_start_monitoring(sid):
+        """監視開始要求"""
+        proxy.start_monitoring()
+        await sio.emit('status_update', {"status": "started", "message": "監視を開始しました"}, to=sid)
+
+    @sio.on('stop_monitoring')
+    async def handle_stop_monitoring(sid):
+        """監視停止要求"""
+        proxy.stop_monitoring()
+        await sio.emit('status_update', {"status": "stopped", "message": "監視を停止しました"}, to=sid)
+
+    async def close_proxy(app: web.Application):
+        await proxy.close()
+
+    app.on_cleanup.append(close_proxy)
+    return app
+
+
+def run_server(edges: Optional[List[EdgeEndpoint]] = None, agent_ttl: Optional[float] = 5.0,
+               max_agents: Optional[int] = None, idle_timeout: Optional[float] = 10.0,
+               neighbors_number: int = 100, host: str = "127.0.0.1", port: int = 8091):
+    """asyncio版のプロキシサーバーを起動（Ctrl+C で終了）"""
+    app = create_app(edges, agent_ttl=agent_ttl, max_agents=max_agents, idle_timeout=idle_timeout,
+                     neighbors_number=neighbors_number)
+    web.run_app(app, host=host, port=port, print=None)
@@ -6,23 +6,37 @@ ArkTwin プロキシサーバー
 CORS問題を解決しながらリアルタイムデータを提供する。
 
 機能:
-- ArkTwin Edge APIへのプロキシ
-- WebSocket によるリアルタイム通信
+- ArkTwin Edge APIへのプロキシ（複数のEdgeを並行してポーリング）
+- WebSocket によるリアルタイム通信（全件配信、またはキーフレーム + 差分配信）
 - データキャッシュと配信
 - CORS対応
 """
 
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, send_from_directory
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room
 import requests
 import threading
 import time
 import json
+import math
 import os
 from datetime import datetime
 import logging
 import urllib3
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from agent_expiry import ExpiryQueue
+from binary_encoder import BinaryFrameEncoder
+from delta_encoder import DeltaEncoder
+from edge_client import get_edge_client
+from metrics import BYTES_BUCKETS, CONTENT_TYPE, COUNT_BUCKETS, MetricsRegistry
+from poll_scheduler import Backoff, PollScheduler
+from snapshot_store import Snapshot, SnapshotStore
+from transform_serializer import dumps
+from viewport import Viewport, ViewportIndex
 
 # SSL警告を抑制
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -44,36 +58,220 @@ socketio = SocketIO(
     engineio_logger=False    # Engine.IOのログを無効化
 )
 
+@dataclass
+class EdgeEndpoint:
+    """ポーリング対象のArkTwin Edge"""
+    name: str
+    port: int
+    host: str = "127.0.0.1"
+    timeout: float = 1.0  # 近隣検索の期限（秒）
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+
+def parse_edge(spec, default_host: str = "127.0.0.1", default_timeout: float = 1.0) -> EdgeEndpoint:
+    """Edgeの指定を解析する
+
+    文字列（"name=host:port", "name=port", "host:port", "port"）または
+    name, host, port, timeout を持つ辞書を受け付ける。
+    """
+    if isinstance(spec, dict):
+        return EdgeEndpoint(
+            name=str(spec.get("name", spec["port"])),
+            port=int(spec["port"]),
+            host=str(spec.get("host", default_host)),
+            timeout=float(spec.get("timeout", default_timeout))
+        )
+    spec = str(spec)
+    name, _, address = spec.rpartition("=")
+    host, _, port = address.rpartition(":")
+    return EdgeEndpoint(name=name or port, port=int(port), host=host or default_host,
+                        timeout=default_timeout)
+
+
+@dataclass
+class ClientView:
+    """表示範囲を指定したクライアントの配信状態
+    
+    表示範囲ごとに送るエージェントが異なるため、差分配信のクライアントは専用のエンコーダーを持つ。
+    """
+    viewport: Viewport
+    encoder: Optional[DeltaEncoder] = None
+    # 次の更新周期で差分の代わりにキーフレームを送る
+    needs_keyframe: bool = field(default=False)
+
+
+# 配信方式ごとのSocket.IOルーム
+FULL_ROOM = "full"    # 毎周期全件を data_update で受信するクライアント
+DELTA_ROOM = "delta"  # キーフレーム + 差分を受信するクライアント（接続時に stream=delta を指定）
+BINARY_ROOM = "binary"  # ID辞書 + 型付き配列のバイナリを受信するクライアント（接続時に stream=binary を指定）
+
+# /api/data?since=<version> のロングポーリングで新しいデータを待つ秒数（既定と上限）
+LONG_POLL_TIMEOUT = 25.0
+LONG_POLL_MAX_TIMEOUT = 60.0
+
+
+def long_poll_timeout(timeout: Optional[float]) -> float:
+    """/api/data の timeout パラメータを待機秒数に変換する（Flask版とasyncio版で共通）
+
+    未指定・有限でない値（nan, inf）は既定値とし、0〜上限の範囲に収める。
+    """
+    if timeout is None or not math.isfinite(timeout):
+        return LONG_POLL_TIMEOUT
+    return min(max(timeout, 0.0), LONG_POLL_MAX_TIMEOUT)
+
+
 class ArkTwinProxy:
     """ArkTwin Edge API のプロキシクラス"""
     
-    def __init__(self):
+    def __init__(self, edges: Optional[List[EdgeEndpoint]] = None,
+                 agent_ttl: Optional[float] = 5.0, max_agents: Optional[int] = None):
         # 設定
-        self.vehicle_port = 2237
-        self.pedestrian_port = 2238
-        self.host = "127.0.0.1"
+        # ポーリング対象のEdge（既定は車両用と歩行者用）
+        self.edges: List[EdgeEndpoint] = edges or [
+            EdgeEndpoint("vehicle", 2237),
+            EdgeEndpoint("pedestrian", 2238)
+        ]
         self.update_interval = 0.2  # 0.2秒間隔
+        # Edgeごとの近隣検索で取得するエージェント数の上限
+        self.neighbors_number = 100
+        # クライアントがいない状態がこの秒数続いたらポーリングを一時停止（Noneの場合は停止しない）
+        self.idle_timeout: Optional[float] = 10.0
+        # 問い合わせ時間を差し引いて周期を保つスケジューラー
+        self.scheduler = PollScheduler()
+        # 失敗が続くEdgeごとのバックオフ（Edge名 -> Backoff）と、更新ループ自体のエラー時のバックオフ
+        self._edge_backoff: Dict[str, Backoff] = {}
+        self._loop_backoff = Backoff(base=1.0, maximum=30.0)
+        # 最後にクライアントからデータを要求された時刻（time.monotonic()）
+        self._last_demand = float("-inf")
+        # クライアントの接続・データ要求・停止時に一時停止中の更新ループを起こす
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        # Edgeへの並行問い合わせ用スレッドプール
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_workers = 0
         
         # データストレージ
         self.vehicles = {}
         self.pedestrians = {}
+        # 一定時間観測されないエージェントと、上限数を超えた分の古いエージェントを削除する
+        self.expiry = ExpiryQueue(ttl=agent_ttl, max_agents=max_agents)
         self.last_update = None
         self.is_running = False
         self.update_thread = None
         
+        # 差分配信の状態
+        # 符号化と送信は更新スレッドとSocket.IOハンドラーの間で _stream_lock により排他する
+        self.delta_encoder = DeltaEncoder()
+        self._stream_lock = threading.Lock()
+        self._full_clients = set()
+        self._delta_clients = set()
+        # キーフレームの送信待ちのクライアント
+        self._pending_keyframes = set()
+        # 差分配信のクライアントがいない間はエンコーダーの状態が古くなる
+        self._delta_stale = True
+        # バイナリ配信の状態（ID辞書は接続時・再同期時に全体を送信し、以降は追加分のみ）
+        self.binary_encoder = BinaryFrameEncoder()
+        self._binary_clients = set()
+        # 表示範囲を指定したクライアント（sid -> ClientView）と、範囲の絞り込みに使う空間索引
+        self._views: Dict[str, ClientView] = {}
+        self.viewport_index = ViewportIndex()
+        
         # 統計情報
         self.stats = {
             "total_updates": 0,
             "last_update_time": None,
             "vehicle_count": 0,
             "pedestrian_count": 0,
-            "errors": []
+            "errors": [],
+            "evicted_agents": 0,
+            "paused": False,
+            "overruns": 0,
+            "edges": {}
         }
+        
+        # ハンドラーに公開する状態
+        # vehicles, pedestrians, stats は更新スレッドのみが変更し、
+        # 他のスレッドは更新周期ごとに公開したスナップショットを読み出す
+        self.snapshots = SnapshotStore(self.stats)
+        
+        # /metrics で公開するメトリクス（更新周期の内訳、Edgeごとの応答時間、配信量）
+        self.metrics = MetricsRegistry()
+        self._phase_seconds = self.metrics.histogram(
+            "arktwin_proxy_update_phase_seconds",
+            "更新周期の各段階（fetch: Edgeへの問い合わせと統合, publish: スナップショットの公開, "
+            "emit: 配信メッセージの作成と送信）の所要時間", ["phase"])
+        self._edge_fetch_seconds = self.metrics.histogram(
+            "arktwin_proxy_edge_fetch_seconds", "Edgeごとの近隣検索の応答時間", ["edge"])
+        self._edge_failures = self.metrics.counter(
+            "arktwin_proxy_edge_failures_total", "Edgeごとの近隣検索の失敗回数（reason: error, timeout）",
+            ["edge", "reason"])
+        self._payload_bytes = self.metrics.histogram(
+            "arktwin_proxy_payload_bytes", "配信したメッセージ1件の大きさ（イベントごと）", ["event"],
+            buckets=BYTES_BUCKETS)
+        self._agents_per_update = self.metrics.histogram(
+            "arktwin_proxy_agents_per_update", "更新周期ごとの保持エージェント数", buckets=COUNT_BUCKETS)
+        self._evicted_agents = self.metrics.counter(
+            "arktwin_proxy_evicted_agents_total", "有効期限切れ・上限超過で削除したエージェント数")
+        self._clients = self.metrics.gauge(
+            "arktwin_proxy_clients", "配信方式ごとのSocket.IOクライアント数", ["stream"])
+        self._dropped_frames = self.metrics.counter(
+            "arktwin_proxy_dropped_frames_total",
+            "取りこぼした更新（overrun: 周期に間に合わなかった回数, resync: クライアントからの再同期要求）",
+            ["reason"])
+        self._paused = self.metrics.gauge(
+            "arktwin_proxy_paused", "クライアントがいないためポーリングを一時停止しているか")
+        for stream in ("full", "delta", "binary"):
+            self._clients.labels(stream).set(0)
+    
+    def _edge(self, name: str) -> Optional[EdgeEndpoint]:
+        return next((edge for edge in self.edges if edge.name == name), None)
+    
+    def _set_edge_port(self, name: str, port: int):
+        edge = self._edge(name)
+        if edge is None:
+            self.edges.append(EdgeEndpoint(name, port, host=self.host))
+        else:
+            edge.port = port
+    
+    @property
+    def vehicle_port(self) -> Optional[int]:
+        """車両用Edgeのポート番号（互換性のため）"""
+        edge = self._edge("vehicle")
+        return edge.port if edge else None
+    
+    @vehicle_port.setter
+    def vehicle_port(self, port: int):
+        self._set_edge_port("vehicle", port)
+    
+    @property
+    def pedestrian_port(self) -> Optional[int]:
+        """歩行者用Edgeのポート番号（互換性のため）"""
+        edge = self._edge("pedestrian")
+        return edge.port if edge else None
+    
+    @pedestrian_port.setter
+    def pedestrian_port(self, port: int):
+        self._set_edge_port("pedestrian", port)
+    
+    @property
+    def host(self) -> str:
+        """Edgeのホスト（設定すると全Edgeに反映）"""
+        return self.edges[0].host if self.edges else "127.0.0.1"
+    
+    @host.setter
+    def host(self, host: str):
+        for edge in self.edges:
+            edge.host = host
     
     def start_monitoring(self):
         """ArkTwin監視を開始"""
         if not self.is_running:
             self.is_running = True
+            self._stopped.clear()
+            self.touch_demand()
             self.update_thread = threading.Thread(target=self._update_loop, daemon=True)
             self.update_thread.start()
             logger.info("ArkTwin監視を開始しました")
@@ -81,56 +279,178 @@ class ArkTwinProxy:
     def stop_monitoring(self):
         """ArkTwin監視を停止"""
         self.is_running = False
+        self._stopped.set()
+        self._wakeup.set()
         if self.update_thread:
             self.update_thread.join(timeout=5)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
         logger.info("ArkTwin監視を停止しました")
     
     def _update_loop(self):
-        """データ更新ループ"""
+        """データ更新ループ
+        
+        問い合わせと配信にかかった時間を差し引いて update_interval の周期を保ち、
+        クライアントがいない間は一時停止する。
+        """
         while self.is_running:
+            self._wakeup.clear()
+            if not self._has_demand():
+                self._set_paused(True)
+                self._wakeup.wait(timeout=1.0)
+                continue
+            self._set_paused(False)
             try:
+                started = time.perf_counter()
                 self._fetch_all_data()
+                started = self._record_phase("fetch", started)
+                self._publish_snapshot()
+                started = self._record_phase("publish", started)
                 self._emit_update()
-                time.sleep(self.update_interval)
+                self._record_phase("emit", started)
             except Exception as e:
-                logger.error(f"データ更新エラー: {e}")
-                self.stats["errors"].append({
-                    "time": datetime.now().isoformat(),
-                    "error": str(e)
-                })
-                # エラーが多すぎる場合は一時停止
-                if len(self.stats["errors"]) > 10:
-                    self.stats["errors"] = self.stats["errors"][-5:]  # 最新5件のみ保持
-                time.sleep(5)  # エラー時は少し長めに待機
+                self._record_error(e)
+                delay = self._loop_backoff.failure(time.monotonic())
+            else:
+                self._loop_backoff.success()
+                delay = self._next_delay()
+            # 停止要求があればすぐに抜ける
+            self._stopped.wait(timeout=delay)
+    
+    def _record_phase(self, phase: str, started: float) -> float:
+        """更新周期の段階の所要時間を記録し、次の段階の開始時刻（time.perf_counter()）を返す"""
+        now = time.perf_counter()
+        self._phase_seconds.labels(phase).observe(now - started)
+        return now
+    
+    def touch_demand(self):
+        """クライアントからデータを要求されたことを記録し、一時停止中の更新ループを起こす"""
+        self._last_demand = time.monotonic()
+        self._wakeup.set()
+    
+    def _has_demand(self) -> bool:
+        """ポーリングを続ける必要があるか（Socket.IOクライアントがいる、または最近のデータ要求がある）"""
+        if self._full_clients or self._delta_clients or self._binary_clients:
+            return True
+        return self.idle_timeout is None or time.monotonic() - self._last_demand < self.idle_timeout
+    
+    def _set_paused(self, paused: bool):
+        if self.stats["paused"] != paused:
+            self.stats["paused"] = paused
+            self._paused.set(1 if paused else 0)
+            # 再開時は予定時刻を数え直す
+            self.scheduler.reset()
+            logger.info("クライアントがいないためポーリングを一時停止しました" if paused
+                        else "ポーリングを再開しました")
+            self._publish_snapshot()
+    
+    def _next_delay(self) -> float:
+        """次の更新までの待ち時間（周期から今回の所要時間を差し引く）"""
+        delay = self.scheduler.delay(time.monotonic(), self.update_interval)
+        if self.scheduler.overruns != self.stats["overruns"]:
+            self._dropped_frames.labels("overrun").inc(self.scheduler.overruns - self.stats["overruns"])
+            self.stats["overruns"] = self.scheduler.overruns
+        return delay
+    
+    def _record_error(self, error: Exception):
+        """更新ループのエラーを統計に記録して公開"""
+        logger.error(f"データ更新エラー: {error}")
+        self.stats["errors"].append({
+            "time": datetime.now().isoformat(),
+            "error": str(error)
+        })
+        # エラーが多すぎる場合は一時停止
+        if len(self.stats["errors"]) > 10:
+            self.stats["errors"] = self.stats["errors"][-5:]  # 最新5件のみ保持
+        self._publish_snapshot()
+    
+    def _get_executor(self, workers: int) -> ThreadPoolExecutor:
+        """Edgeの数以上のスレッドを持つスレッドプールを取得"""
+        if self._executor is None or self._executor_workers < workers:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._executor = ThreadPoolExecutor(max_workers=workers,
+                                                thread_name_prefix="edge-poll")
+            self._executor_workers = workers
+        return self._executor
     
     def _fetch_all_data(self):
-        """全データを取得"""
+        """全データを取得
+        
+        全Edgeへの近隣検索を並行して送信し、各Edgeの期限までに
+        届いたレスポンスを統合する。更新にかかる時間は最も遅いEdgeで決まる。
+        """
         timestamp = {
             "seconds": int(time.time()),
             "nanos": 0
         }
+        edges = self._edges_due()
+        now = time.time()
+        if not edges:
+            self._finish_update(now)
+            return
+        
+        executor = self._get_executor(len(edges))
+        futures = {executor.submit(self._fetch_neighbors, edge, timestamp): edge for edge in edges}
+        # 各Edgeの問い合わせは自身の期限で打ち切られる
+        done, _ = wait(futures, timeout=max(edge.timeout for edge in edges) + 0.1)
         
-        # 車両データを取得（歩行者の近隣情報）
-        try:
-            vehicles_data = self._fetch_neighbors(self.vehicle_port, timestamp)
-            if vehicles_data and "neighbors" in vehicles_data:
-                # 歩行者の近隣情報（車両側から見た歩行者）
-                for agent_id, agent_data in vehicles_data["neighbors"].items():
-                    if agent_id.startswith("pedestrian") and self._validate_agent_data(agent_data):
-                        self.pedestrians[agent_id] = self._process_agent_data(agent_id, agent_data)
-        except Exception as e:
-            logger.warning(f"車両側データ取得エラー: {e}")
+        for future, edge in futures.items():
+            if future not in done:
+                self._record_edge_result(edge, now, timed_out=True)
+                continue
+            try:
+                data, latency = future.result()
+            except requests.Timeout:
+                self._record_edge_result(edge, now, timed_out=True)
+                continue
+            except Exception as e:
+                self._record_edge_result(edge, now, error=e)
+                continue
+            self._record_edge_result(edge, now, data=data, latency=latency)
+        self._finish_update(now)
+    
+    def _edges_due(self) -> List[EdgeEndpoint]:
+        """今回問い合わせるEdge（バックオフ中のEdgeを除く）"""
+        now = time.monotonic()
+        return [edge for edge in self.edges
+                if edge.name not in self._edge_backoff or self._edge_backoff[edge.name].ready(now)]
+    
+    def _record_edge_result(self, edge: EdgeEndpoint, now: float, data: Optional[dict] = None,
+                            latency: Optional[float] = None, error: Optional[Exception] = None,
+                            timed_out: bool = False):
+        """1つのEdgeの近隣検索の結果を統計に記録し、近隣情報を統合
         
-        # 歩行者データを取得（車両の近隣情報）
-        try:
-            pedestrians_data = self._fetch_neighbors(self.pedestrian_port, timestamp)
-            if pedestrians_data and "neighbors" in pedestrians_data:
-                # 車両の近隣情報（歩行者側から見た車両）
-                for agent_id, agent_data in pedestrians_data["neighbors"].items():
-                    if agent_id.startswith("vehicle") and self._validate_agent_data(agent_data):
-                        self.vehicles[agent_id] = self._process_agent_data(agent_id, agent_data)
-        except Exception as e:
-            logger.warning(f"歩行者側データ取得エラー: {e}")
+        失敗（期限切れを含む）が続くEdgeは、他のEdgeと独立にバックオフする。
+        """
+        edge_stats = self.stats["edges"].setdefault(
+            edge.name, {"latency_ms": None, "errors": 0, "timeouts": 0, "last_error": None,
+                        "backoff_s": 0.0})
+        backoff = self._edge_backoff.setdefault(edge.name, Backoff(base=self.update_interval))
+        if timed_out or error is not None:
+            edge_stats["backoff_s"] = round(backoff.failure(time.monotonic()), 2)
+            self._edge_failures.labels(edge.name, "timeout" if timed_out else "error").inc()
+            if timed_out:
+                edge_stats["timeouts"] += 1
+                logger.warning(f"{edge.name} Edge の応答が期限（{edge.timeout}秒）内に届きませんでした"
+                               f"（{edge_stats['backoff_s']}秒後に再試行）")
+            else:
+                edge_stats["errors"] += 1
+                edge_stats["last_error"] = str(error)
+                logger.warning(f"{edge.name} Edge データ取得エラー: {error}"
+                               f"（{edge_stats['backoff_s']}秒後に再試行）")
+            return
+        backoff.success()
+        edge_stats["backoff_s"] = 0.0
+        edge_stats["latency_ms"] = round(latency * 1000, 1)
+        self._edge_fetch_seconds.labels(edge.name).observe(latency)
+        if data and "neighbors" in data:
+            self._merge_neighbors(data["neighbors"], now)
+    
+    def _finish_update(self, now: float):
+        """全Edgeの結果を統合した後、古いエージェントを削除して統計を更新"""
+        self._evict_agents(now)
         
         # 統計更新
         self.stats["total_updates"] += 1
@@ -138,26 +458,60 @@ class ArkTwinProxy:
         self.stats["vehicle_count"] = len(self.vehicles)
         self.stats["pedestrian_count"] = len(self.pedestrians)
         self.last_update = time.time()
+        self._agents_per_update.observe(len(self.vehicles) + len(self.pedestrians))
+    
+    def _merge_neighbors(self, neighbors: Dict[str, dict], now: float):
+        """近隣情報を種類ごとに統合
+        
+        各Edgeからは他のシミュレーターのエージェントが近隣情報として見えるため、
+        全Edgeの近隣情報を合わせると全エージェントになる。
+        """
+        for agent_id, agent_data in neighbors.items():
+            if not self._validate_agent_data(agent_data):
+                continue
+            kind = agent_data.get("kind")
+            if kind == "vehicle" or agent_id.startswith("vehicle"):
+                self.vehicles[agent_id] = self._process_agent_data(agent_id, agent_data)
+            elif kind == "pedestrian" or agent_id.startswith("pedestrian"):
+                self.pedestrians[agent_id] = self._process_agent_data(agent_id, agent_data)
+            else:
+                continue
+            self.expiry.touch(agent_id, now)
     
-    def _fetch_neighbors(self, port, timestamp):
-        """指定ポートから近隣情報を取得"""
-        url = f"http://{self.host}:{port}/api/edge/neighbors/_query"
-        query = {
+    def _evict_agents(self, now: float):
+        """カリング範囲外に出たなどで観測されなくなったエージェントを削除
+        
+        削除したエージェントは差分配信の removed に含まれる。
+        """
+        evicted = self.expiry.expire(now)
+        for agent_id in evicted:
+            self.vehicles.pop(agent_id, None)
+            self.pedestrians.pop(agent_id, None)
+        if evicted:
+            self.stats["evicted_agents"] += len(evicted)
+            self._evicted_agents.inc(len(evicted))
+            logger.debug(f"{len(evicted)} 件のエージェントを削除しました")
+    
+    def _neighbor_query(self, timestamp) -> dict:
+        """近隣検索のリクエストボディ"""
+        return {
             "timestamp": timestamp,
-            "neighborsNumber": 100,
+            "neighborsNumber": self.neighbors_number,
             "changeDetection": False
         }
+    
+    def _fetch_neighbors(self, edge: EdgeEndpoint, timestamp):
+        """指定したEdgeから近隣情報を取得
         
-        # SSL検証を無効化し、タイムアウトを設定
-        response = requests.post(
-            url, 
-            json=query, 
-            timeout=5,
-            verify=False,  # SSL証明書の検証を無効化
-            headers={'Connection': 'close'}  # HTTP接続をクローズ
-        )
-        response.raise_for_status()
-        return response.json()
+        Returns:
+            Tuple[dict, float]: レスポンスと所要時間（秒）
+        """
+        query = self._neighbor_query(timestamp)
+        
+        # キープアライブ接続をプールしたEdgeクライアントを使用
+        started = time.perf_counter()
+        data = get_edge_client(edge.url, pool_size=2).query_neighbors(query, timeout=edge.timeout)
+        return data, time.perf_counter() - started
     
     def _validate_agent_data(self, agent_data):
         """エージェントデータの妥当性チェック"""
@@ -183,24 +537,272 @@ class ArkTwinProxy:
             "speed": transform.get("localTranslationSpeed", {"x": 0, "y": 0, "z": 0})
         }
     
+    def _publish_snapshot(self) -> Snapshot:
+        """更新スレッドの状態をスナップショットとして公開"""
+        return self.snapshots.publish(self.last_update, self.vehicles, self.pedestrians, self.stats)
+    
     def _emit_update(self):
         """WebSocket経由でデータ更新を送信"""
-        data = {
-            "timestamp": self.last_update,
-            "vehicles": list(self.vehicles.values()),
-            "pedestrians": list(self.pedestrians.values()),
-            "stats": self.stats
+        snapshot = self.snapshots.current
+        with self._stream_lock:
+            for event, data, options in self._stream_messages(snapshot):
+                self._observe_payload(event, data, snapshot)
+                socketio.emit(event, data, **options)
+    
+    def _observe_payload(self, event: str, data: dict, snapshot: Optional[Snapshot] = None):
+        """配信するメッセージの大きさを記録
+        
+        スナップショット全体の data_update はキャッシュされたJSONの長さを、
+        バイナリのフレームは型付き配列の長さとその他の項目のJSONの長さの和を使う。
+        """
+        if (snapshot is not None and data.get("vehicles") is snapshot.vehicles
+                and data.get("pedestrians") is snapshot.pedestrians):
+            size = len(snapshot.json())
+        else:
+            arrays = [value for value in data.values() if isinstance(value, bytes)]
+            if arrays:
+                size = sum(map(len, arrays)) + len(dumps(
+                    {key: value for key, value in data.items() if not isinstance(value, bytes)}))
+            else:
+                size = len(dumps(data))
+        self._payload_bytes.labels(event).observe(size)
+    
+    def _stream_messages(self, snapshot: Snapshot) -> List[Tuple[str, dict, dict]]:
+        """スナップショットから配信するメッセージを作成
+        
+        全件配信のクライアントには data_update を、差分配信のクライアントには
+        前回からの差分（agents_delta）を、バイナリ配信のクライアントには
+        型付き配列のフレーム（agents_binary）を送信する。符号化は全クライアントで共有する。
+        表示範囲を指定したクライアントはルームへの送信から除き、範囲内のエージェントのみを個別に送信する。
+        呼び出し側は _stream_lock を保持し、返した順に送信する。
+        
+        Returns:
+            List[Tuple[str, dict, dict]]: イベント名、データ、送信先（to, skip_sid）の組
+        """
+        messages = []
+        views = self._views
+        if views:
+            self.viewport_index.update(snapshot)
+        stats = self._stream_stats(snapshot)
+        timestamp = snapshot.timestamp
+        
+        culled = [sid for sid in self._full_clients if sid in views]
+        if len(self._full_clients) > len(culled):
+            messages.append(('data_update', snapshot.to_dict(), {"to": FULL_ROOM, "skip_sid": culled or None}))
+        for sid in culled:
+            vehicles, pedestrians = self.viewport_index.select(views[sid].viewport)
+            data = dict(snapshot.to_dict(), vehicles=vehicles, pedestrians=pedestrians)
+            messages.append(('data_update', data, {"to": sid}))
+        
+        if self._binary_clients:
+            agents = snapshot.agents()
+            # ID辞書の追加分は表示範囲にかかわらず全クライアントに送る
+            dictionary = self.binary_encoder.update_dictionary(agents)
+            culled = [sid for sid in self._binary_clients if sid in views]
+            if len(self._binary_clients) > len(culled):
+                frame = self.binary_encoder.frame(agents, dictionary, stats, timestamp)
+                messages.append(('agents_binary', frame, {"to": BINARY_ROOM, "skip_sid": culled or None}))
+            for sid in culled:
+                vehicles, pedestrians = self.viewport_index.select(views[sid].viewport)
+                frame = self.binary_encoder.frame(vehicles + pedestrians, dictionary, stats, timestamp)
+                messages.append(('agents_binary', frame, {"to": sid}))
+        
+        culled = [sid for sid in self._delta_clients if sid in views]
+        for sid in culled:
+            view = views[sid]
+            vehicles, pedestrians = self.viewport_index.select(view.viewport)
+            frame = view.encoder.encode(vehicles + pedestrians, stats, timestamp)
+            if view.needs_keyframe:
+                view.needs_keyframe = False
+                messages.append(('agents_keyframe', view.encoder.keyframe(stats, timestamp), {"to": sid}))
+            else:
+                messages.append(('agents_delta', frame, {"to": sid}))
+        
+        if len(self._delta_clients) == len(culled):
+            self._delta_stale = True
+            return messages
+        frame = self.delta_encoder.encode(snapshot.agents(), stats, timestamp)
+        pending = self._pending_keyframes
+        self._pending_keyframes = set()
+        if self._delta_stale:
+            # 差分の起点となる状態を持つクライアントがいないため、全員にキーフレームを送る
+            pending = self._delta_clients.difference(culled)
+            self._delta_stale = False
+        if pending:
+            keyframe = self.delta_encoder.keyframe(stats, timestamp)
+            for sid in pending:
+                messages.append(('agents_keyframe', keyframe, {"to": sid}))
+        skip = list(pending) + culled
+        messages.append(('agents_delta', frame, {"to": DELTA_ROOM, "skip_sid": skip or None}))
+        return messages
+    
+    @staticmethod
+    def _stream_stats(snapshot: Snapshot) -> dict:
+        """差分配信に添える統計情報（件数のみ）"""
+        stats = snapshot.stats
+        return {
+            "total_updates": stats["total_updates"],
+            "last_update_time": stats["last_update_time"],
+            "vehicle_count": stats["vehicle_count"],
+            "pedestrian_count": stats["pedestrian_count"]
         }
-        socketio.emit('data_update', data)
     
-    def get_current_data(self):
-        """現在のデータを取得"""
+    def _register_client(self, sid: str, stream: Optional[str]) -> str:
+        """配信方式（None, "delta", "binary"）ごとのクライアントを追加し、参加するルームを返す"""
+        self.touch_demand()
+        if stream == "delta":
+            self._delta_clients.add(sid)
+            self._update_client_gauges()
+            return DELTA_ROOM
+        if stream == "binary":
+            self._binary_clients.add(sid)
+            self._update_client_gauges()
+            return BINARY_ROOM
+        self._full_clients.add(sid)
+        self._update_client_gauges()
+        return FULL_ROOM
+    
+    def _update_client_gauges(self):
+        self._clients.labels("full").set(len(self._full_clients))
+        self._clients.labels("delta").set(len(self._delta_clients))
+        self._clients.labels("binary").set(len(self._binary_clients))
+    
+    def add_full_client(self, sid: str):
+        """全件配信のクライアントを追加"""
+        with self._stream_lock:
+            join_room(self._register_client(sid, None), sid=sid, namespace="/")
+    
+    def add_delta_client(self, sid: str):
+        """差分配信のクライアントを追加し、キーフレームを送信"""
+        with self._stream_lock:
+            join_room(self._register_client(sid, "delta"), sid=sid, namespace="/")
+        self.request_keyframe(sid)
+    
+    def add_binary_client(self, sid: str):
+        """バイナリ配信のクライアントを追加し、ID辞書を送信"""
+        with self._stream_lock:
+            join_room(self._register_client(sid, "binary"), sid=sid, namespace="/")
+        self.request_keyframe(sid)
+    
+    def request_keyframe(self, sid: str, dropped: bool = False):
+        """クライアントにキーフレームを送信（再同期要求）
+        
+        Args:
+            sid (str): クライアントのセッションID
+            dropped (bool): クライアントが差分やID辞書の取りこぼしを検出した場合はTrue
+        """
+        with self._stream_lock:
+            if dropped:
+                self._dropped_frames.labels("resync").inc()
+            for event, data, options in self._resync_messages(sid):
+                self._observe_payload(event, data)
+                socketio.emit(event, data, **options)
+    
+    def _resync_messages(self, sid: str) -> List[Tuple[str, dict, dict]]:
+        """再同期のためにクライアントへ送信するメッセージを作成
+        
+        最後に符号化した状態が最新であればすぐに送信し、
+        古い場合は次の更新周期で送信する。
+        バイナリ配信のクライアントにはID辞書の全体を送信する。
+        """
+        if sid in self._binary_clients:
+            # バイナリ配信は毎周期全件を送るため、ID辞書のみ送り直す
+            return [('agents_dictionary', self.binary_encoder.dictionary_frame(), {"to": sid})]
+        if sid not in self._delta_clients:
+            return []
+        view = self._views.get(sid)
+        if view is not None:
+            # 表示範囲を指定したクライアントは専用のエンコーダーのキーフレームを送る
+            if view.encoder.seq == 0:
+                view.needs_keyframe = True
+                return []
+            snapshot = self.snapshots.current
+            return [('agents_keyframe', view.encoder.keyframe(self._stream_stats(snapshot), snapshot.timestamp),
+                     {"to": sid})]
+        if self._delta_stale:
+            self._pending_keyframes.add(sid)
+            return []
+        snapshot = self.snapshots.current
+        keyframe = self.delta_encoder.keyframe(self._stream_stats(snapshot), snapshot.timestamp)
+        return [('agents_keyframe', keyframe, {"to": sid})]
+    
+    def remove_client(self, sid: str):
+        """切断したクライアントを削除"""
+        with self._stream_lock:
+            self._unregister_client(sid)
+    
+    def _unregister_client(self, sid: str):
+        # 最後のクライアントが切断しても idle_timeout の間は再接続に備えてポーリングを続ける
+        self._last_demand = time.monotonic()
+        self._full_clients.discard(sid)
+        self._delta_clients.discard(sid)
+        self._binary_clients.discard(sid)
+        self._pending_keyframes.discard(sid)
+        self._views.pop(sid, None)
+        self._update_client_gauges()
+    
+    def set_viewport(self, sid: str, viewport: Optional[Viewport]):
+        """クライアントの表示範囲を設定（Noneの場合は絞り込みを解除）"""
+        with self._stream_lock:
+            self._apply_viewport(sid, viewport)
+    
+    def _apply_viewport(self, sid: str, viewport: Optional[Viewport]):
+        if viewport is None:
+            view = self._views.pop(sid, None)
+            if view is not None and sid in self._delta_clients:
+                # 共有のエンコーダーの差分に戻るため、キーフレームから受信し直す
+                self._pending_keyframes.add(sid)
+            return
+        view = self._views.get(sid)
+        if view is not None:
+            # 範囲外に出たエージェントは専用のエンコーダーの差分で削除される
+            view.viewport = viewport
+            return
+        view = ClientView(viewport)
+        if sid in self._delta_clients:
+            view.encoder = DeltaEncoder()
+            view.needs_keyframe = True
+            self._pending_keyframes.discard(sid)
+        self._views[sid] = view
+    
+    def get_config(self) -> dict:
+        """設定を取得（/api/config）"""
         return {
-            "timestamp": self.last_update,
-            "vehicles": list(self.vehicles.values()),
-            "pedestrians": list(self.pedestrians.values()),
-            "stats": self.stats
+            "vehicle_port": self.vehicle_port,
+            "pedestrian_port": self.pedestrian_port,
+            "host": self.host,
+            "update_interval": self.update_interval,
+            "neighbors_number": self.neighbors_number,
+            "idle_timeout": self.idle_timeout,
+            "agent_ttl": self.expiry.ttl,
+            "max_agents": self.expiry.max_agents,
+            "edges": [asdict(edge) for edge in self.edges]
         }
+    
+    def update_config(self, data: dict):
+        """設定を更新（/api/config）"""
+        if 'edges' in data:
+            self.edges = [parse_edge(spec, default_host=self.host) for spec in data['edges']]
+        if 'vehicle_port' in data:
+            self.vehicle_port = int(data['vehicle_port'])
+        if 'pedestrian_port' in data:
+            self.pedestrian_port = int(data['pedestrian_port'])
+        if 'host' in data:
+            self.host = str(data['host'])
+        if 'update_interval' in data:
+            self.update_interval = float(data['update_interval'])
+        if 'neighbors_number' in data:
+            self.neighbors_number = int(data['neighbors_number'])
+        if 'idle_timeout' in data:
+            self.idle_timeout = None if data['idle_timeout'] is None else float(data['idle_timeout'])
+        if 'agent_ttl' in data:
+            self.expiry.ttl = None if data['agent_ttl'] is None else float(data['agent_ttl'])
+        if 'max_agents' in data:
+            self.expiry.max_agents = None if data['max_agents'] is None else int(data['max_agents'])
+    
+    def get_current_data(self):
+        """現在のデータを取得（最後に公開したスナップショット）"""
+        return self.snapshots.current.to_dict()
 
 # プロキシインスタンス
 proxy = ArkTwinProxy()
@@ -218,8 +820,29 @@ def visualization():
 
 @app.route('/api/data')
 def get_data():
-    """現在のデータを取得"""
-    return jsonify(proxy.get_current_data())
+    """現在のデータを取得（同じバージョンのJSONは1回だけ生成）
+    
+    クエリパラメーター:
+        since: 指定したバージョンより新しいデータが公開されるまで待つ（ロングポーリング）
+        timeout: ロングポーリングで待つ秒数（既定25秒、最大60秒）
+    
+    レスポンスにはバージョンごとのETagを付け、If-None-Match が一致する場合は 304 を返す。
+    """
+    proxy.touch_demand()
+    since = request.args.get('since', type=int)
+    if since is None:
+        snapshot = proxy.snapshots.current
+    else:
+        timeout = long_poll_timeout(request.args.get('timeout', type=float))
+        snapshot = proxy.snapshots.wait_for(since, timeout)
+    
+    if request.if_none_match.contains(snapshot.etag):
+        response = Response(status=304)
+    else:
+        response = Response(snapshot.json(), mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/api/start', methods=['POST'])
 def start_monitoring():
@@ -237,43 +860,59 @@ def stop_monitoring():
 def config():
     """設定の取得・更新"""
     if request.method == 'GET':
-        return jsonify({
-            "vehicle_port": proxy.vehicle_port,
-            "pedestrian_port": proxy.pedestrian_port,
-            "host": proxy.host,
-            "update_interval": proxy.update_interval
-        })
+        return jsonify(proxy.get_config())
     
     elif request.method == 'POST':
-        data = request.get_json()
-        if 'vehicle_port' in data:
-            proxy.vehicle_port = int(data['vehicle_port'])
-        if 'pedestrian_port' in data:
-            proxy.pedestrian_port = int(data['pedestrian_port'])
-        if 'host' in data:
-            proxy.host = str(data['host'])
-        if 'update_interval' in data:
-            proxy.update_interval = float(data['update_interval'])
-        
+        proxy.update_config(request.get_json())
         return jsonify({"status": "updated", "message": "設定を更新しました"})
 
 @app.route('/api/stats')
 def get_stats():
     """統計情報を取得"""
-    return jsonify(proxy.stats)
+    return jsonify(proxy.snapshots.current.stats)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus形式のメトリクス"""
+    return Response(proxy.metrics.render(), content_type=CONTENT_TYPE)
 
 # WebSocket イベント
 @socketio.on('connect')
 def handle_connect():
     """クライアント接続時"""
     logger.info('クライアントが接続しました')
-    # 現在のデータを送信
-    emit('data_update', proxy.get_current_data())
+    stream = request.args.get('stream')
+    if stream == 'delta':
+        # キーフレームを送信し、以降は差分のみを送信
+        proxy.add_delta_client(request.sid)
+    elif stream == 'binary':
+        # ID辞書を送信し、以降は型付き配列のバイナリを送信
+        proxy.add_binary_client(request.sid)
+    else:
+        # 現在のデータを送信し、以降も毎周期全件を送信
+        proxy.add_full_client(request.sid)
+        emit('data_update', proxy.get_current_data())
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """クライアント切断時"""
     logger.info('クライアントが切断しました')
+    proxy.remove_client(request.sid)
+
+@socketio.on('resync')
+def handle_resync():
+    """差分やID辞書を取りこぼしたクライアントからの再同期要求"""
+    proxy.request_keyframe(request.sid, dropped=True)
+
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """表示範囲と種類の絞り込み（{"bbox": [min_x, min_y, max_x, max_y], "kinds": [...]}）"""
+    try:
+        viewport = Viewport.parse(data)
+    except (TypeError, ValueError) as e:
+        logger.warning(f"表示範囲の指定が正しくありません: {e}")
+        return
+    proxy.set_viewport(request.sid, viewport)
 
 @socketio.on('start_monitoring')
 def handle_start_monitoring():
@@ -287,8 +926,43 @@ def handle_stop_monitoring():
     proxy.stop_monitoring()
     emit('status_update', {"status": "stopped", "message": "監視を停止しました"})
 
-def main():
+def main(argv=None):
     """メイン処理"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="ArkTwin プロキシサーバー")
+    parser.add_argument("--port", type=int, default=8091,
+                        help="待ち受けポート番号 (デフォルト: 8091)")
+    parser.add_argument("--edge", action="append", default=None,
+                        help="ポーリングするEdge（name=host:port 形式、複数指定可）。"
+                             "未指定時は vehicle=127.0.0.1:2237 と pedestrian=127.0.0.1:2238")
+    parser.add_argument("--edge-timeout", type=float, default=1.0,
+                        help="Edgeごとの近隣検索の期限（秒） (デフォルト: 1.0)")
+    parser.add_argument("--neighbors-number", type=int, default=100,
+                        help="Edgeごとの近隣検索で取得するエージェント数の上限 (デフォルト: 100)")
+    parser.add_argument("--agent-ttl", type=float, default=5.0,
+                        help="観測されなくなったエージェントを削除するまでの秒数。0以下で無効 (デフォルト: 5.0)")
+    parser.add_argument("--max-agents", type=int, default=None,
+                        help="保持するエージェントの上限数。超えた分は最も古いものから削除 (デフォルト: 上限なし)")
+    parser.add_argument("--idle-timeout", type=float, default=10.0,
+                        help="クライアントがいない状態がこの秒数続いたらEdgeのポーリングを一時停止。"
+                             "0以下で停止しない (デフォルト: 10.0)")
+    parser.add_argument("--server", choices=["threading", "asyncio"], default="threading",
+                        help="サーバーの実行方式。threading: Flask-SocketIO（接続ごとのスレッド）、"
+                             "asyncio: aiohttp と python-socketio によるイベントループ (デフォルト: threading)")
+    args = parser.parse_args(argv)
+    
+    proxy.expiry.ttl = args.agent_ttl if args.agent_ttl > 0 else None
+    proxy.expiry.max_agents = args.max_agents
+    proxy.idle_timeout = args.idle_timeout if args.idle_timeout > 0 else None
+    proxy.neighbors_number = args.neighbors_number
+    
+    if args.edge:
+        proxy.edges = [parse_edge(spec, default_timeout=args.edge_timeout) for spec in args.edge]
+    else:
+        for edge in proxy.edges:
+            edge.timeout = args.edge_timeout
+    
     print("ArkTwin プロキシサーバー")
     print("=" * 50)
     
@@ -297,12 +971,23 @@ def main():
         print("警告: visualization.html が見つかりません")
         print("可視化UIは利用できません")
     
-    port = 8091
+    port = args.port
+    print("ポーリング対象: " + ", ".join(f"{edge.name}={edge.host}:{edge.port}" for edge in proxy.edges))
     print(f"サーバー開始: http://127.0.0.1:{port}")
     print(f"可視化ページ: http://127.0.0.1:{port}/visualization.html")
     print(f"API エンドポイント: http://127.0.0.1:{port}/api/data")
+    print(f"実行方式: {args.server}")
     print("Ctrl+C で終了")
     
+    if args.server == "asyncio":
+        # REST API、WebSocket配信、Edgeのポーリングを1つのイベントループで実行
+        from arktwin_proxy_async import run_server
+        run_server(proxy.edges, agent_ttl=proxy.expiry.ttl, max_agents=proxy.expiry.max_agents,
+                   idle_timeout=proxy.idle_timeout, neighbors_number=proxy.neighbors_number,
+                   host='127.0.0.1', port=port)
+        print("\nサーバーを停止します...")
+        return
+    
     try:
         # SSL/TLSを使用せず、HTTP専用で起動
         socketio.run(
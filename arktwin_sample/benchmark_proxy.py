@@ -0,0 +1,552 @@
+#!/usr/bin/env python3
+"""
+プロキシサーバーの配信性能のベンチマーク
+
+代替Edgeサーバー（mock_edge.py）に M 体のエージェントを登録して一定周期で変換行列を送信し、
+arktwin_proxy_server.py を別プロセスで起動して N 個のダッシュボード（Socket.IO クライアント）と
+/api/data のロングポーリングを接続する。クライアント数を増やしながら次の値を計測する。
+
+- 配信遅延: プロキシがEdgeから取得したデータの時刻（timestamp）からクライアントが受信するまでの時間
+- クライアントあたりの受信量（バイト/秒）と受信した更新の割合（期待値は計測時間 / update_interval）
+- プロキシのCPU使用率とメモリ使用量（Linux の /proc から取得）、/metrics の更新周期の内訳
+- 更新周期ごとの持続可能な最大クライアント数（受信した更新の割合と配信遅延の p99 が基準を満たす最大の N）
+
+負荷を生成するクライアント側が律速にならないよう、ダッシュボードは python-socketio を使わずに
+Engine.IO / Socket.IO のフレームを直接扱い、フレームの長さとタイムスタンプのみを読み取る。
+クライアントとプロキシが同じマシンで動く場合はCPUを奪い合うため、結果は控えめな値になる。
+
+使用例:
+    python benchmark_proxy.py                                         # 1000体、0.2秒周期、1〜500クライアント
+    python benchmark_proxy.py --agents 1000 10000 --intervals 0.2 0.1 --clients 10 100 1000
+    python benchmark_proxy.py --streams full delta binary --servers threading asyncio --pollers 10
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import aiohttp
+import numpy as np
+import requests
+
+from edge_client import EdgeClient
+from frame_profiler import environment, summarize
+from mock_edge import MockEdgeProcess
+from transform_serializer import create_serializer
+
+# 更新として数えるイベント（agents_dictionary などの付随するメッセージは受信量のみ数える）
+UPDATE_EVENTS = frozenset({"data_update", "agents_keyframe", "agents_delta", "agents_binary"})
+# /metrics から読み取る更新周期の段階
+PROXY_PHASES = ("fetch", "publish", "emit")
+
+# Socket.IO のイベントパケット（42: イベント、45: バイナリ添付付きイベント）
+_EVENT_PACKET = re.compile(r'4([25])(?:(\d+)-)?(?:/[^,\[]*,)?\d*\["([^"]+)"')
+# 配信データの timestamp と version（JSONの区切りの空白の有無によらない）
+_TIMESTAMP_PATTERN = r'"timestamp":\s*(-?[0-9.eE+-]+)'
+_TIMESTAMP_TEXT = re.compile(_TIMESTAMP_PATTERN)
+_TIMESTAMP = re.compile(_TIMESTAMP_PATTERN.encode())
+_VERSION = re.compile(rb'"version":\s*(\d+)')
+# /metrics の1行（名前とラベル、値）
+_METRIC_LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*(?:\{[^}]*\})?) (\S+)$')
+
+
+def feed_agents(ports: Dict[str, int], agents: int, interval: float, area: float,
+                ready, stop, seed: int = 0):
+    """代替Edgeにエージェントを登録し、interval ごとに変換行列を送信する（別プロセスで実行）
+
+    エージェントは Edge ごとに半数ずつ登録し、area 四方の範囲を等速で移動させる（範囲の端で折り返す）。
+    """
+    rng = np.random.default_rng(seed)
+    serializer = create_serializer()
+    fleets = []
+    for index, (name, port) in enumerate(ports.items()):
+        count = agents // len(ports) + (1 if index < agents % len(ports) else 0)
+        client = EdgeClient(f"http://127.0.0.1:{port}", pool_size=1)
+        agent_ids: List[str] = []
+        for start in range(0, count, 1000):
+            requests_ = [{"agentIdPrefix": f"{name}-feed-{i:06d}", "kind": name, "status": {}, "assets": {}}
+                         for i in range(start, min(start + 1000, count))]
+            agent_ids.extend(item["agentId"] for item in client.register_agents(requests_, timeout=30))
+        position = np.zeros((count, 3))
+        position[:, :2] = rng.uniform(0.0, area, (count, 2))
+        velocity = np.zeros((count, 3))
+        heading = rng.uniform(-np.pi, np.pi, count)
+        speed = rng.uniform(1.0, 10.0, count)
+        velocity[:, 0] = np.cos(heading) * speed
+        velocity[:, 1] = np.sin(heading) * speed
+        fleets.append((client, agent_ids, position, velocity))
+    ready.set()
+
+    simulation_time = 0.0
+    while not stop.wait(interval):
+        simulation_time += interval
+        timestamp = {"seconds": int(simulation_time), "nanos": int((simulation_time % 1) * 1e9)}
+        for client, agent_ids, position, velocity in fleets:
+            position[:, :2] += velocity[:, :2] * interval
+            outside = (position[:, :2] < 0.0) | (position[:, :2] > area)
+            velocity[:, :2][outside] *= -1.0
+            np.clip(position[:, :2], 0.0, area, out=position[:, :2])
+            rotation = np.degrees(np.arctan2(velocity[:, 1], velocity[:, 0]))
+            try:
+                client.put_transforms(serializer.serialize(timestamp, agent_ids, position, rotation, velocity),
+                                      timeout=max(interval, 1.0))
+            except requests.RequestException:
+                pass
+
+
+class AgentFeeder:
+    """feed_agents() を別プロセスで実行する（with 文で使用）"""
+
+    def __init__(self, ports: Dict[str, int], agents: int, interval: float = 0.1, area: float = 500.0):
+        self.ports = ports
+        self.agents = agents
+        self.interval = interval
+        self.area = area
+        self._ready = multiprocessing.Event()
+        self._stop = multiprocessing.Event()
+        self._process: Optional[multiprocessing.Process] = None
+
+    def __enter__(self) -> "AgentFeeder":
+        self._process = multiprocessing.Process(
+            target=feed_agents, daemon=True,
+            args=(self.ports, self.agents, self.interval, self.area, self._ready, self._stop))
+        self._process.start()
+        while not self._ready.wait(0.1):
+            if not self._process.is_alive():
+                raise RuntimeError("エージェントの登録に失敗しました")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+
+
+class ProxyProcess:
+    """プロキシサーバーを別プロセスで起動し、CPU使用時間とメモリ使用量を読み取る（with 文で使用）"""
+
+    def __init__(self, port: int, edges: Dict[str, int], server: str = "threading"):
+        self.port = port
+        self.edges = edges
+        self.server = server
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "ProxyProcess":
+        directory = os.path.dirname(os.path.abspath(__file__))
+        command = [sys.executable, os.path.join(directory, "arktwin_proxy_server.py"),
+                   "--port", str(self.port), "--server", self.server, "--idle-timeout", "0"]
+        for name, port in self.edges.items():
+            command += ["--edge", f"{name}=127.0.0.1:{port}"]
+        self.process = subprocess.Popen(command, cwd=directory,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 20.0
+        while True:
+            if self.process.poll() is not None:
+                raise RuntimeError("プロキシサーバーが起動できません")
+            try:
+                requests.get(f"{self.url}/api/config", timeout=0.5).raise_for_status()
+                return self
+            except requests.RequestException:
+                if time.monotonic() > deadline:
+                    self.__exit__(None, None, None)
+                    raise RuntimeError("プロキシサーバーが応答しません")
+                time.sleep(0.1)
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+
+    def configure(self, **config):
+        """/api/config で設定を変更し、監視を開始する"""
+        requests.post(f"{self.url}/api/config", json=config, timeout=5).raise_for_status()
+        requests.post(f"{self.url}/api/start", timeout=5).raise_for_status()
+
+    def cpu_seconds(self) -> Optional[float]:
+        """プロセスのCPU使用時間（ユーザー + システム、秒）。/proc がない環境ではNone"""
+        try:
+            with open(f"/proc/{self.process.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            return None
+        # 状態を先頭として utime は12番目、stime は13番目
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    def memory(self) -> Dict[str, Optional[int]]:
+        """常駐メモリ（VmRSS）と最大常駐メモリ（VmHWM）のバイト数。/proc がない環境ではNone"""
+        values: Dict[str, Optional[int]] = {"rss_bytes": None, "peak_rss_bytes": None}
+        try:
+            with open(f"/proc/{self.process.pid}/status") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    if key == "VmRSS":
+                        values["rss_bytes"] = int(value.split()[0]) * 1024
+                    elif key == "VmHWM":
+                        values["peak_rss_bytes"] = int(value.split()[0]) * 1024
+        except OSError:
+            pass
+        return values
+
+    def metrics(self) -> Dict[str, float]:
+        """/metrics の値（ラベル付きの名前 -> 値）"""
+        text = requests.get(f"{self.url}/metrics", timeout=5).text
+        values = {}
+        for line in text.splitlines():
+            match = _METRIC_LINE.match(line)
+            if match:
+                values[match.group(1)] = float(match.group(2))
+        return values
+
+
+class Recorder:
+    """計測期間中に受信した更新の遅延と受信量を記録する"""
+
+    def __init__(self):
+        self.measuring = False
+        self.latencies: Dict[str, List[float]] = {"socketio": [], "poll": []}
+
+    def record(self, client, kind: str, event: str, size: int, timestamp: Optional[float]):
+        if not self.measuring:
+            return
+        client.bytes += size
+        if event in UPDATE_EVENTS:
+            client.updates += 1
+            if timestamp is not None:
+                self.latencies[kind].append(time.time() - timestamp)
+
+
+def _timestamp(data) -> Optional[float]:
+    """配信データ（str または bytes）の timestamp を読み取る"""
+    match = (_TIMESTAMP if isinstance(data, bytes) else _TIMESTAMP_TEXT).search(data)
+    return float(match.group(1)) if match else None
+
+
+class DashboardClient:
+    """WebSocket で接続するダッシュボードを模擬する
+
+    Engine.IO の ping に応答し、Socket.IO のイベントパケットからイベント名、長さ、timestamp のみを読み取る。
+    バイナリ添付付きのイベントは添付をすべて受信した時点で記録する。
+    """
+
+    def __init__(self, recorder: Recorder, stream: str):
+        self.recorder = recorder
+        self.stream = stream
+        self.connected = False
+        self.updates = 0
+        self.bytes = 0
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def connect(self, session: aiohttp.ClientSession, url: str):
+        query = "EIO=4&transport=websocket" + (f"&stream={self.stream}" if self.stream != "full" else "")
+        self._ws = await session.ws_connect(f"{url}/socket.io/?{query}", max_msg_size=0)
+        # Engine.IO の open パケットを受信してから名前空間に接続する
+        await self._ws.receive_str(timeout=10)
+        await self._ws.send_str("40")
+        self._task = asyncio.create_task(self._receive())
+
+    async def _receive(self):
+        pending = None  # (イベント名, 長さ, timestamp, 残りの添付数)
+        async for message in self._ws:
+            if message.type == aiohttp.WSMsgType.BINARY:
+                if pending is not None:
+                    event, size, timestamp, remaining = pending
+                    size += len(message.data)
+                    pending = (event, size, timestamp, remaining - 1)
+                    if remaining == 1:
+                        self.recorder.record(self, "socketio", event, size, timestamp)
+                        pending = None
+                continue
+            if message.type != aiohttp.WSMsgType.TEXT:
+                break
+            text = message.data
+            if text == "2":
+                await self._ws.send_str("3")
+                continue
+            if text.startswith("40"):
+                self.connected = True
+                continue
+            match = _EVENT_PACKET.match(text)
+            if match is None:
+                continue
+            # 受信量は文字数で数える（配信データはほぼASCIIのため、バイト数とほぼ等しい）
+            timestamp = _timestamp(text)
+            attachments = int(match.group(2) or 0)
+            if match.group(1) == "5" and attachments:
+                pending = (match.group(3), len(text), timestamp, attachments)
+            else:
+                self.recorder.record(self, "socketio", match.group(3), len(text), timestamp)
+
+    async def close(self):
+        if self._ws is not None:
+            await self._ws.close()
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+class DataPoller:
+    """/api/data?since=<version> のロングポーリングでデータを受信するダッシュボードを模擬する"""
+
+    def __init__(self, recorder: Recorder):
+        self.recorder = recorder
+        self.connected = True
+        self.updates = 0
+        self.bytes = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, session: aiohttp.ClientSession, url: str):
+        self._task = asyncio.create_task(self._poll(session, url))
+
+    async def _poll(self, session: aiohttp.ClientSession, url: str):
+        version = None
+        etag = None
+        while True:
+            params = {} if version is None else {"since": str(version), "timeout": "5"}
+            headers = {"If-None-Match": etag} if etag else {}
+            try:
+                async with session.get(f"{url}/api/data", params=params, headers=headers) as response:
+                    body = await response.read()
+                    etag = response.headers.get("ETag", etag)
+            except aiohttp.ClientError:
+                self.connected = False
+                await asyncio.sleep(0.5)
+                continue
+            if response.status != 200:
+                continue
+            match = _VERSION.search(body)
+            version = int(match.group(1)) if match else version
+            self.recorder.record(self, "poll", "data_update", len(body), _timestamp(body))
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+def _metric_delta(before: Dict[str, float], after: Dict[str, float], key: str) -> float:
+    return after.get(key, 0.0) - before.get(key, 0.0)
+
+
+async def measure(proxy: ProxyProcess, clients: int, pollers: int, stream: str,
+                  interval: float, args) -> dict:
+    """クライアントを接続して計測期間中の配信を記録する"""
+    recorder = Recorder()
+    ws_url = proxy.url.replace("http://", "ws://", 1)
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        dashboards = [DashboardClient(recorder, stream) for _ in range(clients)]
+        semaphore = asyncio.Semaphore(50)
+
+        async def connect(dashboard: DashboardClient):
+            async with semaphore:
+                try:
+                    await dashboard.connect(session, ws_url)
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass
+
+        await asyncio.gather(*(connect(dashboard) for dashboard in dashboards))
+        poll_clients = [DataPoller(recorder) for _ in range(pollers)]
+        for poller in poll_clients:
+            poller.start(session, proxy.url)
+
+        await asyncio.sleep(args.warmup)
+        for client in dashboards + poll_clients:
+            client.updates = client.bytes = 0
+        metrics_before = proxy.metrics()
+        cpu_before = proxy.cpu_seconds()
+        started = time.perf_counter()
+        recorder.measuring = True
+        await asyncio.sleep(args.duration)
+        recorder.measuring = False
+        elapsed = time.perf_counter() - started
+        cpu_after = proxy.cpu_seconds()
+        metrics_after = proxy.metrics()
+        memory = proxy.memory()
+        stats = requests.get(f"{proxy.url}/api/stats", timeout=5).json()
+
+        for client in dashboards + poll_clients:
+            await client.close()
+
+    expected = elapsed / interval
+    connected_dashboards = [client for client in dashboards if client.connected]
+    delivery = np.array([client.updates / expected for client in connected_dashboards + poll_clients])
+
+    def bytes_per_second(clients_) -> float:
+        return float(np.mean([client.bytes / elapsed for client in clients_])) if clients_ else 0.0
+
+    phases = {}
+    for phase in PROXY_PHASES:
+        count = _metric_delta(metrics_before, metrics_after,
+                              f'arktwin_proxy_update_phase_seconds_count{{phase="{phase}"}}')
+        total = _metric_delta(metrics_before, metrics_after,
+                              f'arktwin_proxy_update_phase_seconds_sum{{phase="{phase}"}}')
+        phases[phase] = total / count * 1000.0 if count else None
+    overruns = _metric_delta(metrics_before, metrics_after,
+                             'arktwin_proxy_dropped_frames_total{reason="overrun"}')
+
+    latency = summarize(recorder.latencies["socketio"] + recorder.latencies["poll"])
+    connected = len(connected_dashboards)
+    sustainable = (connected == clients
+                   and len(delivery) > 0 and float(delivery.min()) >= 1.0 - args.tolerance
+                   and latency.get("p99", float("inf")) <= interval * 1000.0)
+    return {
+        "clients": clients,
+        "connected": connected,
+        "pollers": pollers,
+        "duration_s": elapsed,
+        "latency_ms": latency,
+        "socketio_latency_ms": summarize(recorder.latencies["socketio"]),
+        "poll_latency_ms": summarize(recorder.latencies["poll"]),
+        "bytes_per_client_per_s": bytes_per_second(connected_dashboards),
+        "bytes_per_poller_per_s": bytes_per_second(poll_clients),
+        "delivery_ratio": {"mean": float(delivery.mean()) if len(delivery) else 0.0,
+                           "min": float(delivery.min()) if len(delivery) else 0.0},
+        "proxy_cpu_percent": (None if cpu_before is None or cpu_after is None
+                              else (cpu_after - cpu_before) / elapsed * 100.0),
+        "proxy_rss_bytes": memory["rss_bytes"],
+        "proxy_peak_rss_bytes": memory["peak_rss_bytes"],
+        "proxy_phase_ms": phases,
+        "proxy_overruns": overruns,
+        "agents_seen": stats.get("vehicle_count", 0) + stats.get("pedestrian_count", 0),
+        "sustainable": bool(sustainable),
+    }
+
+
+def run_case(agents: int, interval: float, stream: str, server: str, args) -> List[dict]:
+    """クライアント数を増やしながら1つの条件を計測する（基準を満たさなくなった時点で打ち切る）"""
+    results = []
+    for clients in sorted(args.clients):
+        with ProxyProcess(args.port, {"vehicle": args.vehicle_port, "pedestrian": args.pedestrian_port},
+                          server=server) as proxy:
+            proxy.configure(update_interval=interval, neighbors_number=agents)
+            result = asyncio.run(measure(proxy, clients, args.pollers, stream, interval, args))
+        result.update({"agents": agents, "update_interval": interval, "stream": stream, "server": server})
+        results.append(result)
+        print_result(result)
+        if not result["sustainable"] and not args.keep_going:
+            break
+    return results
+
+
+def print_result(result: dict):
+    """計測結果を1行で表示する"""
+    latency = result["latency_ms"]
+    cpu = result["proxy_cpu_percent"]
+    rss = result["proxy_rss_bytes"]
+    print(f"{result['server']:<9} {result['stream']:<6} {result['agents']:>6}体 {result['update_interval']:>4g}秒 "
+          f"{result['clients']:>5}クライアント  遅延 p50/p99 {latency.get('p50', 0.0):.1f}/{latency.get('p99', 0.0):.1f}ms  "
+          f"{result['bytes_per_client_per_s'] / 1024:.1f}KB/s  受信率 {result['delivery_ratio']['min']:.0%}  "
+          f"CPU {'-' if cpu is None else f'{cpu:.0f}%'}  RSS {'-' if rss is None else f'{rss / 2 ** 20:.0f}MB'}  "
+          f"{'OK' if result['sustainable'] else 'NG'}")
+
+
+def main(argv=None):
+    """メイン処理"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="プロキシサーバーの配信性能のベンチマーク")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50, 100, 250, 500],
+                        help="Socket.IO クライアント数（小さい順に計測） (デフォルト: 1 10 50 100 250 500)")
+    parser.add_argument("--pollers", type=int, default=0,
+                        help="併せて接続する /api/data のロングポーリング数 (デフォルト: 0)")
+    parser.add_argument("--agents", type=int, nargs="+", default=[1000],
+                        help="代替Edgeに登録するエージェント数（複数指定可） (デフォルト: 1000)")
+    parser.add_argument("--intervals", type=float, nargs="+", default=[0.2],
+                        help="プロキシの更新周期（秒、複数指定可） (デフォルト: 0.2)")
+    parser.add_argument("--streams", choices=["full", "delta", "binary"], nargs="+", default=["full"],
+                        help="クライアントの配信方式（複数指定可） (デフォルト: full)")
+    parser.add_argument("--servers", choices=["threading", "asyncio"], nargs="+", default=["threading"],
+                        help="プロキシサーバーの実行方式（複数指定可） (デフォルト: threading)")
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="ケースごとの計測時間（秒） (デフォルト: 10)")
+    parser.add_argument("--warmup", type=float, default=2.0,
+                        help="接続後に計測を始めるまでの時間（秒） (デフォルト: 2)")
+    parser.add_argument("--feed-interval", type=float, default=0.1,
+                        help="エージェントの変換行列を送信する周期（秒） (デフォルト: 0.1)")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="持続可能とみなす受信した更新の不足の割合 (デフォルト: 0.1)")
+    parser.add_argument("--keep-going", action="store_true",
+                        help="基準を満たさなくなった後もすべてのクライアント数を計測する")
+    parser.add_argument("--port", type=int, default=18091,
+                        help="プロキシサーバーのポート (デフォルト: 18091)")
+    parser.add_argument("--vehicle-port", type=int, default=22470,
+                        help="代替Edge（車両）のポート (デフォルト: 22470)")
+    parser.add_argument("--pedestrian-port", type=int, default=22480,
+                        help="代替Edge（歩行者）のポート (デフォルト: 22480)")
+    parser.add_argument("--output", type=str, default="benchmark_proxy.json",
+                        help="レポートの出力先 (デフォルト: benchmark_proxy.json)")
+    args = parser.parse_args(argv)
+
+    ports = {"vehicle": args.vehicle_port, "pedestrian": args.pedestrian_port}
+    area = 500.0
+
+    print("プロキシサーバーのベンチマーク")
+    print("=" * 50)
+    results: List[dict] = []
+    for agents in args.agents:
+        # 全エージェントがプロキシに届くよう、近隣検索の件数と距離の上限を外す
+        with MockEdgeProcess(ports, max_neighbors=agents, max_distance=area * 2), \
+                AgentFeeder(ports, agents, interval=args.feed_interval, area=area):
+            for interval in args.intervals:
+                for stream in args.streams:
+                    for server in args.servers:
+                        results.extend(run_case(agents, interval, stream, server, args))
+
+    # 条件ごとの持続可能な最大クライアント数
+    capacity: Dict[tuple, int] = {}
+    for result in results:
+        key = (result["agents"], result["update_interval"], result["stream"], result["server"])
+        capacity.setdefault(key, 0)
+        if result["sustainable"]:
+            capacity[key] = max(capacity[key], result["clients"])
+    summary = [{"agents": key[0], "update_interval": key[1], "stream": key[2], "server": key[3],
+                "max_sustainable_clients": clients} for key, clients in capacity.items()]
+
+    report = {
+        "benchmark": "proxy",
+        "created": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "config": {
+            "clients": args.clients,
+            "pollers": args.pollers,
+            "agents": args.agents,
+            "intervals": args.intervals,
+            "streams": args.streams,
+            "servers": args.servers,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "feed_interval": args.feed_interval,
+            "tolerance": args.tolerance,
+        },
+        "results": results,
+        "summary": summary,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print("持続可能な最大クライアント数:")
+    for item in summary:
+        print(f"  {item['server']} {item['stream']} {item['agents']}体 {item['update_interval']}秒: "
+              f"{item['max_sustainable_clients']}")
+    print(f"レポートを出力しました: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
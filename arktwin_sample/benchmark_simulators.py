@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+シミュレーターのフレーム処理時間のベンチマーク
+
+VehicleSimulator と PedestrianSimulator を代替Edgeサーバー（mock_edge.py）に接続し、
+エージェント数と更新周期を変えながら1フレームの処理を段階ごとに計測する。
+
+計測する段階（シミュレーターの step() が FrameProfiler に記録する段階）:
+- register: 新たに出現したエージェントの登録
+- update: 位置更新
+- serialize: 送信するエージェントの選択と変換行列のJSON生成
+- send: 変換行列の送信（PUT /api/edge/agents）
+- receive: 近隣検索（POST /api/edge/neighbors/_query）とレスポンスの反映
+- braking: 制動距離内の歩行者検索（車両のみ）
+- status: 1秒ごとの状態表示
+
+段階ごとの p50/p90/p99/最大値と、フレーム全体が更新周期を超えた割合（期限超過率）を
+JSONのレポートに出力する。--baseline で以前のレポートを指定すると p99 と期限超過率を比較し、
+許容範囲を超えて悪化した場合は終了コード1で終了する。
+
+使用例:
+    python benchmark_simulators.py                                # 10〜10000体 × 10Hz
+    python benchmark_simulators.py --agents 10 1000 100000 --rates 10 20 --output report.json
+    python benchmark_simulators.py --baseline report.json         # 前回のレポートと比較
+"""
+
+import contextlib
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from edge_client import close_edge_clients
+from frame_profiler import FrameProfiler, environment
+from mock_edge import MockEdgeProcess
+from pedestrian_simulator import PedestrianSimulator
+from scenario import Scenario, load_scenario
+from transform_publisher import TransformPublisher
+from transform_serializer import create_serializer
+from vehicle_simulator import VehicleSimulator
+
+# 経路の定義に使用する既定のシナリオ
+DEFAULT_SCENARIO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                     "scenarios", "intersection_large.json")
+# 比較時に悪化とみなさない p99 の差（ミリ秒、計測の揺らぎを無視する）
+NOISE_FLOOR_MS = 1.0
+
+
+def build_scenario(base: Scenario, count: int) -> Scenario:
+    """経路はそのままに、車両と歩行者を count 体ずつ時刻0に出現させるシナリオを作る
+
+    Args:
+        base (Scenario): 経路と母集団の定義を流用するシナリオ
+        count (int): 種類ごとのエージェント数
+    """
+    populations = []
+    for kind in ("vehicle", "pedestrian"):
+        spec = next((spec for spec in base.populations if spec.get("kind") == kind), None)
+        spec = dict(spec) if spec else {"kind": kind, "routes": [], "phaseSpread": 30.0}
+        spec.update({"agentIdPrefix": f"{kind}-bench", "count": count, "spawn": {"start": 0.0}})
+        populations.append(spec)
+    return Scenario.from_dict({"routes": base.routes, "populations": populations})
+
+
+class SimulatorBench:
+    """1つのシミュレーターのフレームを計測する
+
+    シミュレーターの step()（run() と同じフレーム処理）をそのまま実行し、
+    段階ごとの処理時間はシミュレーターの FrameProfiler の記録を使う。
+    """
+
+    def __init__(self, name: str, simulator):
+        self.name = name
+        self.simulator = simulator
+
+    def reset(self, period: float, frames: int):
+        """ウォームアップの記録を破棄し、計測するフレーム数分の記録を用意する"""
+        sim = self.simulator
+        sim.profiler = FrameProfiler(budget=period, history=max(frames, 1))
+        sim.send_errors = sim.receive_errors = 0
+        sim.sent_payloads = sim.sent_bytes = 0
+
+    def frame(self, dt: float) -> float:
+        """1フレームを実行する
+
+        Returns:
+            float: フレーム全体の処理時間（秒）
+        """
+        return self.simulator.step(dt)
+
+    def result(self, agents: int, rate: float) -> dict:
+        """計測結果をレポートの1件にまとめる"""
+        sim = self.simulator
+        stats = sim.profiler.stats()
+        return {
+            "simulator": self.name,
+            "agents": agents,
+            "rate_hz": rate,
+            "frames": stats["frames"],
+            "missed_deadline_rate": stats["overrun_rate"],
+            "phases_ms": dict(stats["phases_ms"], frame=stats["frame_ms"]),
+            "errors": {"send": sim.send_errors, "receive": sim.receive_errors},
+            "payload_bytes": sim.sent_bytes / sim.sent_payloads if sim.sent_payloads else 0.0,
+            "neighbors": len(sim.neighbors.agents),
+        }
+
+
+def create_benches(scenario: Scenario, ports: Dict[str, int], args) -> List[SimulatorBench]:
+    """両方のシミュレーターを作成してEdgeに登録する"""
+    def publisher():
+        return TransformPublisher() if args.delta else None
+
+    vehicle = VehicleSimulator(edge_port=ports["vehicle"], scenario=scenario, publisher=publisher(),
+                               serializer=create_serializer(args.serializer), request_timeout=args.timeout)
+    pedestrian = PedestrianSimulator(edge_port=ports["pedestrian"], scenario=scenario,
+                                     publisher=publisher(), serializer=create_serializer(args.serializer),
+                                     request_timeout=args.timeout)
+    for simulator in (vehicle, pedestrian):
+        if not simulator.setup_edge_connection():
+            raise RuntimeError(f"{simulator.edge_url} への登録に失敗しました")
+    return [SimulatorBench("vehicle", vehicle), SimulatorBench("pedestrian", pedestrian)]
+
+
+def run_case(scenario: Scenario, agents: int, rate: float, ports: Dict[str, int], args) -> List[dict]:
+    """1つのエージェント数と更新周期の組み合わせを計測する
+
+    シミュレーターは実運用と同じく1周期ごとに両方のフレームを実行し、
+    周期の残り時間は待機する（超過した場合は待たずに次の周期を始める）。
+    """
+    period = 1.0 / rate
+    case_scenario = build_scenario(scenario, agents)
+    with contextlib.ExitStack() as stack:
+        if not args.no_mock:
+            stack.enter_context(MockEdgeProcess(ports))
+        stack.callback(close_edge_clients)
+        devnull = stack.enter_context(open(os.devnull, "w"))
+        # シミュレーターの表示は計測の対象外とする
+        stack.enter_context(contextlib.redirect_stdout(devnull))
+
+        setup_started = time.perf_counter()
+        benches = create_benches(case_scenario, ports, args)
+        setup_seconds = time.perf_counter() - setup_started
+
+        for tick in range(args.warmup + args.ticks):
+            if tick == args.warmup:
+                for bench in benches:
+                    bench.reset(period, args.ticks)
+            tick_started = time.perf_counter()
+            for bench in benches:
+                bench.frame(period)
+            remaining = period - (time.perf_counter() - tick_started)
+            if remaining > 0:
+                time.sleep(remaining)
+
+    results = [bench.result(agents, rate) for bench in benches]
+    for result in results:
+        result["setup_seconds"] = setup_seconds
+    return results
+
+
+def compare(results: List[dict], baseline: dict, tolerance: float, missed_tolerance: float) -> List[str]:
+    """前回のレポートと比較して悪化した項目を列挙する
+
+    Args:
+        results (List[dict]): 今回の計測結果
+        baseline (dict): 前回のレポート
+        tolerance (float): p99 の悪化を許容する割合（0.2 で20%）
+        missed_tolerance (float): 期限超過率の増加を許容する幅
+
+    Returns:
+        List[str]: 悪化した項目の説明
+    """
+    previous = {(r["simulator"], r["agents"], r["rate_hz"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        key = (result["simulator"], result["agents"], result["rate_hz"])
+        before = previous.get(key)
+        if before is None:
+            continue
+        label = f"{key[0]} {key[1]}体 {key[2]}Hz"
+        for phase, summary in result["phases_ms"].items():
+            old = before.get("phases_ms", {}).get(phase, {}).get("p99")
+            new = summary.get("p99")
+            if old is None or new is None:
+                continue
+            if new > old * (1.0 + tolerance) and new - old > NOISE_FLOOR_MS:
+                regressions.append(f"{label} {phase} p99: {old:.2f}ms -> {new:.2f}ms")
+        old_missed = before.get("missed_deadline_rate", 0.0)
+        if result["missed_deadline_rate"] > old_missed + missed_tolerance:
+            regressions.append(f"{label} 期限超過率: {old_missed:.1%} -> {result['missed_deadline_rate']:.1%}")
+    return regressions
+
+
+def print_result(result: dict):
+    """計測結果を1行ずつ表示する"""
+    phases = result["phases_ms"]
+    columns = "  ".join(f"{phase}={summary.get('p50', 0.0):.2f}/{summary.get('p99', 0.0):.2f}"
+                        for phase, summary in phases.items())
+    errors = sum(result["errors"].values())
+    print(f"{result['simulator']:<10} {result['agents']:>7}体 {result['rate_hz']:>5g}Hz  {columns}  "
+          f"期限超過 {result['missed_deadline_rate']:.1%}" + (f"  エラー {errors}件" if errors else ""))
+
+
+def main(argv=None):
+    """メイン処理"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="シミュレーターのフレーム処理時間のベンチマーク")
+    parser.add_argument("--agents", type=int, nargs="+", default=[10, 100, 1000, 10000],
+                        help="種類ごとのエージェント数（複数指定可） (デフォルト: 10 100 1000 10000)")
+    parser.add_argument("--rates", type=float, nargs="+", default=[10.0],
+                        help="更新周期（Hz、複数指定可） (デフォルト: 10)")
+    parser.add_argument("--ticks", type=int, default=50,
+                        help="ケースごとに計測するフレーム数 (デフォルト: 50)")
+    parser.add_argument("--warmup", type=int, default=5,
+                        help="計測前に実行するフレーム数 (デフォルト: 5)")
+    parser.add_argument("--scenario", type=str, default=DEFAULT_SCENARIO_PATH,
+                        help="経路を流用するシナリオファイル (デフォルト: scenarios/intersection_large.json)")
+    parser.add_argument("--delta", action="store_true",
+                        help="位置・回転が変化したエージェントのみ変換行列を送信する")
+    parser.add_argument("--serializer", choices=["template", "dict"], default="template",
+                        help="変換行列のJSON生成方法 (デフォルト: template)")
+    parser.add_argument("--timeout", type=float, default=1.0,
+                        help="Edgeへのリクエストのタイムアウト（秒） (デフォルト: 1.0)")
+    parser.add_argument("--vehicle-port", type=int, default=22370,
+                        help="車両シミュレーターが接続するEdgeのポート (デフォルト: 22370)")
+    parser.add_argument("--pedestrian-port", type=int, default=22380,
+                        help="歩行者シミュレーターが接続するEdgeのポート (デフォルト: 22380)")
+    parser.add_argument("--no-mock", action="store_true",
+                        help="代替Edgeサーバーを起動せず、起動済みのEdgeに接続する")
+    parser.add_argument("--output", type=str, default="benchmark_simulators.json",
+                        help="レポートの出力先 (デフォルト: benchmark_simulators.json)")
+    parser.add_argument("--baseline", type=str, default=None,
+                        help="比較する以前のレポート")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="p99 の悪化を許容する割合 (デフォルト: 0.2)")
+    parser.add_argument("--missed-tolerance", type=float, default=0.02,
+                        help="期限超過率の増加を許容する幅 (デフォルト: 0.02)")
+    args = parser.parse_args(argv)
+
+    scenario = load_scenario(args.scenario)
+    ports = {"vehicle": args.vehicle_port, "pedestrian": args.pedestrian_port}
+
+    print("シミュレーターのベンチマーク（各段階の p50/p99、ミリ秒）")
+    print("=" * 50)
+    results: List[dict] = []
+    for agents in args.agents:
+        for rate in args.rates:
+            case_results = run_case(scenario, agents, rate, ports, args)
+            for result in case_results:
+                print_result(result)
+            results.extend(case_results)
+
+    report = {
+        "benchmark": "simulators",
+        "created": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "config": {
+            "agents": args.agents,
+            "rates_hz": args.rates,
+            "ticks": args.ticks,
+            "warmup": args.warmup,
+            "scenario": args.scenario,
+            "delta": args.delta,
+            "serializer": args.serializer,
+            "timeout": args.timeout,
+            "edge": "external" if args.no_mock else "mock_edge",
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"レポートを出力しました: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.missed_tolerance)
+        if regressions:
+            print("前回のレポートから悪化した項目:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("前回のレポートからの悪化はありません")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+バイナリ配信エンコーダー
+
+プロキシサーバーからブラウザへ配信するエージェント情報を、
+エージェントごとのJSONオブジェクトではなく型付き配列のバイト列に符号化する。
+バイト列はSocket.IOのバイナリ添付として送信され、ブラウザで
+Float32Array / Uint32Array としてそのまま読み込める。
+
+エージェントIDと種類はID辞書（番号 -> [id, kind]）として一度だけ送信し、
+各フレームは辞書番号の配列と、位置・向き・速さの配列のみを持つ。
+辞書は追加分のみを毎フレームに添付し、使われなくなった番号が増えた場合は
+世代（epoch）を更新して現在のエージェントのみで作り直す。
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# バイト列の型（リトルエンディアン、ブラウザの型付き配列と同じ並び）
+INDEX_DTYPE = np.dtype("<u4")
+VALUE_DTYPE = np.dtype("<f4")
+
+# 辞書を作り直す目安（使用中の番号に対する辞書の大きさの倍率と最小の大きさ）
+COMPACT_RATIO = 4
+COMPACT_MIN_ENTRIES = 1024
+
+_EMPTY: dict = {}
+
+
+class BinaryFrameEncoder:
+    """エージェント情報をID辞書と型付き配列のフレームに符号化する
+
+    Attributes:
+        epoch (int): ID辞書の世代（作り直すたびに増える）
+    """
+
+    def __init__(self):
+        self.epoch = 0
+        self._index: Dict[str, int] = {}
+        self._entries: List[list] = []
+        # 送信済みの辞書の大きさ
+        self._sent = 0
+
+    def _assign(self, agent_id: str, kind: str) -> int:
+        index = self._index.get(agent_id)
+        if index is None:
+            index = len(self._entries)
+            self._index[agent_id] = index
+            self._entries.append([agent_id, kind])
+        return index
+
+    def _compact(self, agents: List[dict]):
+        """現在のエージェントのみで辞書を作り直す"""
+        self.epoch += 1
+        self._index = {}
+        self._entries = []
+        self._sent = 0
+        for agent in agents:
+            self._assign(agent["id"], agent.get("kind", "unknown"))
+
+    def encode(self, agents: Iterable[dict], stats: Optional[dict] = None,
+               timestamp: Optional[float] = None) -> dict:
+        """全エージェントをバイナリフレームに符号化する
+
+        Args:
+            agents (Iterable[dict]): プロキシのエージェント情報（id, kind, x, y, z, rotation, speed）
+            stats (Optional[dict]): 併せて送信する統計情報
+            timestamp (Optional[float]): データの更新時刻
+
+        Returns:
+            dict: dictionary（追加分のID辞書）と、bytesの index, position, heading, speed を持つフレーム
+        """
+        agents = list(agents)
+        return self.frame(agents, self.update_dictionary(agents), stats, timestamp)
+
+    def update_dictionary(self, agents: List[dict]) -> dict:
+        """ID辞書に新しいエージェントを追加し、前回からの追加分を返す
+
+        表示範囲を絞ったクライアントに一部のエージェントのみを送る場合も、
+        追加分の辞書は全クライアントに同じものを送る必要があるため、全エージェントで1回だけ呼び出す。
+        """
+        if len(self._entries) > max(COMPACT_MIN_ENTRIES, COMPACT_RATIO * len(agents)):
+            self._compact(agents)
+        known = self._index
+        for agent in agents:
+            if agent["id"] not in known:
+                self._assign(agent["id"], agent.get("kind", "unknown"))
+
+        dictionary = {
+            "epoch": self.epoch,
+            "start": self._sent,
+            "entries": self._entries[self._sent:]
+        }
+        self._sent = len(self._entries)
+        return dictionary
+
+    def frame(self, agents: List[dict], dictionary: dict, stats: Optional[dict] = None,
+              timestamp: Optional[float] = None) -> dict:
+        """ID辞書に登録済みのエージェントをフレームに符号化する
+
+        Args:
+            agents (List[dict]): 送信するエージェント（update_dictionary() に渡したものの一部でもよい）
+            dictionary (dict): update_dictionary() が返した追加分のID辞書
+        """
+        count = len(agents)
+        known = self._index
+        index = np.fromiter((known[agent["id"]] for agent in agents), dtype=INDEX_DTYPE, count=count)
+        # 1回の走査で [x, y, z, 向き, 速度x, 速度y] の行を作り、配列に変換してから列を切り出す
+        values = np.array([
+            (agent["x"], agent["y"], agent["z"],
+             (agent.get("rotation") or _EMPTY).get("z", 0.0),
+             (agent.get("speed") or _EMPTY).get("x", 0.0),
+             (agent.get("speed") or _EMPTY).get("y", 0.0))
+            for agent in agents
+        ], dtype=np.float64).reshape(count, 6)
+        position = values[:, :3].astype(VALUE_DTYPE)
+        heading = values[:, 3].astype(VALUE_DTYPE)
+        speed = np.hypot(values[:, 4], values[:, 5]).astype(VALUE_DTYPE)
+
+        return {
+            "type": "binary",
+            "timestamp": timestamp,
+            "count": count,
+            "dictionary": dictionary,
+            "index": index.tobytes(),
+            "position": position.tobytes(),
+            "heading": heading.tobytes(),
+            "speed": speed.tobytes(),
+            "stats": stats
+        }
+
+    def dictionary_frame(self) -> dict:
+        """送信済みのID辞書全体を取得する（接続時・再同期時に送信）"""
+        return {
+            "epoch": self.epoch,
+            "start": 0,
+            "entries": self._entries[:self._sent]
+        }
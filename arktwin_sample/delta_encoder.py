@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+差分配信エンコーダー
+
+プロキシサーバーからブラウザへ配信するエージェント情報を、
+接続時のキーフレーム（全エージェント）と、以降の差分（追加・変更・削除のみ）に符号化する。
+
+座標と向きは整数に量子化して送信し（既定: 位置1cm、向き0.1度単位）、
+量子化後の値が変化したエージェントのみを差分に含める。
+各フレームには連番（seq）を付け、差分は直前のフレーム番号（base）を持つ。
+クライアントは base が自身の最新フレーム番号と一致しない場合に再同期を要求する。
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+# 量子化の倍率（位置: 1/100メートル、向き: 1/10度）
+POSITION_SCALE = 100
+ROTATION_SCALE = 10
+
+
+class DeltaEncoder:
+    """エージェント情報をキーフレームと差分に符号化する
+
+    エージェントは [id, kind, x, y, z, rotation] の配列で表し、x, y, z, rotation は量子化した整数とする。
+
+    Attributes:
+        seq (int): 最後に符号化したフレームの番号
+    """
+
+    def __init__(self, position_scale: int = POSITION_SCALE, rotation_scale: int = ROTATION_SCALE):
+        self.position_scale = position_scale
+        self.rotation_scale = rotation_scale
+        self.seq = 0
+        # 最後に送信した量子化済みのエージェント情報
+        self._state: Dict[str, list] = {}
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def quantize(self, agent: dict) -> list:
+        """プロキシのエージェント情報（id, kind, x, y, z, rotation）を量子化する"""
+        scale = self.position_scale
+        rotation = agent.get("rotation") or {}
+        return [
+            agent["id"],
+            agent.get("kind", "unknown"),
+            round(agent["x"] * scale),
+            round(agent["y"] * scale),
+            round(agent["z"] * scale),
+            round(float(rotation.get("z", 0.0)) * self.rotation_scale)
+        ]
+
+    def encode(self, agents: Iterable[dict], stats: Optional[dict] = None,
+               timestamp: Optional[float] = None) -> dict:
+        """前回のフレームからの差分を符号化する
+
+        Args:
+            agents (Iterable[dict]): 現在の全エージェント
+            stats (Optional[dict]): 併せて送信する統計情報
+            timestamp (Optional[float]): データの更新時刻
+
+        Returns:
+            dict: type="delta" のフレーム（upserts: 追加・変更, removed: 削除したID）
+        """
+        upserts: List[list] = []
+        current: Dict[str, list] = {}
+        previous = self._state
+        for agent in agents:
+            row = self.quantize(agent)
+            agent_id = row[0]
+            current[agent_id] = row
+            if previous.get(agent_id) != row:
+                upserts.append(row)
+        removed = [agent_id for agent_id in previous if agent_id not in current]
+
+        self._state = current
+        base = self.seq
+        self.seq += 1
+        return {
+            "type": "delta",
+            "seq": self.seq,
+            "base": base,
+            "timestamp": timestamp,
+            "upserts": upserts,
+            "removed": removed,
+            "stats": stats
+        }
+
+    def keyframe(self, stats: Optional[dict] = None, timestamp: Optional[float] = None) -> dict:
+        """最後に符号化した状態をキーフレームとして取得する
+
+        Returns:
+            dict: type="keyframe" のフレーム（以降の差分の base は seq と一致する）
+        """
+        return {
+            "type": "keyframe",
+            "seq": self.seq,
+            "positionScale": self.position_scale,
+            "rotationScale": self.rotation_scale,
+            "timestamp": timestamp,
+            "agents": list(self._state.values()),
+            "stats": stats
+        }
+
+    def reset(self):
+        """送信済みの状態を破棄する（次の encode() で全エージェントが差分に含まれる）"""
+        self._state = {}
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+ArkTwin Edge クライアント
+
+車両・歩行者シミュレーターが共通で使用するArkTwin Edge REST APIクライアント。
+Edgeごとにキープアライブ接続をプールした requests.Session を共有し、
+100ms周期の送受信で毎回TCP接続を張り直さないようにする。
+
+非同期実行モード用に asyncio 版の AsyncEdgeClient も提供する。
+AsyncEdgeClient の通信処理はトランスポートとして差し替え可能で、
+既定では aiohttp を使用し、テスト時はローカルの代替Edgeを直接呼び出せる。
+"""
+
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import aiohttp
+except ImportError:  # 非同期実行モードを使用しない場合は不要
+    aiohttp = None
+
+
+# JSONエンコード済みのボディを送信する際のヘッダー
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+class EdgeClient:
+    """ArkTwin Edge REST APIクライアント
+
+    1つのEdgeに対して1つの requests.Session を保持し、
+    HTTPAdapterのコネクションプールでキープアライブ接続を再利用する。
+    """
+
+    def __init__(self, edge_url: str, pool_size: int = 4):
+        # ArkTwin EdgeのREST APIエンドポイント
+        self.edge_url = edge_url.rstrip("/")
+        # コネクションプールの大きさ（同時に張るEdgeへの接続数の上限）
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,        # 接続先ホストは1つのEdgeのみ
+            pool_maxsize=pool_size,
+            pool_block=True,           # 上限を超えた場合は接続の解放を待つ
+            max_retries=0
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Connection": "keep-alive"})
+
+    def register_agents(self, agents: List[dict], timeout: float = 5) -> List[dict]:
+        """エージェントを登録する（POST /api/edge/agents）
+
+        Args:
+            agents (List[dict]): agentIdPrefix, kind, status, assets を持つ登録要求
+            timeout (float): タイムアウト（秒）
+
+        Returns:
+            List[dict]: Edgeが割り当てたagentIdを含むレスポンス
+        """
+        response = self.session.post(
+            f"{self.edge_url}/api/edge/agents",
+            json=agents,
+            timeout=timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def put_transforms(self, data: Union[dict, bytes], timeout: float = 1) -> None:
+        """エージェントの変換行列を送信する（PUT /api/edge/agents）
+
+        Args:
+            data (Union[dict, bytes]): timestamp と agents を持つ更新要求（JSONエンコード済みも可）
+            timeout (float): タイムアウト（秒）
+        """
+        if isinstance(data, (bytes, bytearray)):
+            # シリアライザーで生成済みのJSONはそのまま送信する
+            response = self.session.put(
+                f"{self.edge_url}/api/edge/agents",
+                data=data,
+                headers=JSON_HEADERS,
+                timeout=timeout
+            )
+        else:
+            response = self.session.put(
+                f"{self.edge_url}/api/edge/agents",
+                json=data,
+                timeout=timeout
+            )
+        response.raise_for_status()
+        # レスポンスボディを読み切って接続をプールに返す
+        response.content
+
+    def query_neighbors(self, query: dict, timeout: float = 1) -> dict:
+        """近隣エージェントを検索する（POST /api/edge/neighbors/_query）
+
+        Args:
+            query (dict): timestamp, neighborsNumber, changeDetection を持つ検索クエリ
+            timeout (float): タイムアウト（秒）
+
+        Returns:
+            dict: neighbors を含むレスポンス
+        """
+        response = self.session.post(
+            f"{self.edge_url}/api/edge/neighbors/_query",
+            json=query,
+            timeout=timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def close(self):
+        """プールしている接続をすべて閉じる"""
+        self.session.close()
+
+
+# Edge URLごとに共有するクライアント
+_clients: Dict[str, EdgeClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_edge_client(edge_url: str, pool_size: Optional[int] = None) -> EdgeClient:
+    """Edge URLに対応する共有クライアントを取得する
+
+    同じEdgeを使用するコンポーネント間で接続プールを共有する。
+    既存のクライアントより大きなプールが要求された場合は作り直す
+    （古いクライアントは使用中の可能性があるため閉じない）。
+
+    Args:
+        edge_url (str): ArkTwin EdgeのURL
+        pool_size (Optional[int]): 必要な同時接続数
+
+    Returns:
+        EdgeClient: 共有クライアント
+    """
+    key = edge_url.rstrip("/")
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None or (pool_size is not None and pool_size > client.pool_size):
+            client = EdgeClient(key, pool_size=pool_size or 4)
+            _clients[key] = client
+        return client
+
+
+def close_edge_clients():
+    """共有クライアントをすべて閉じる"""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+class AiohttpTransport:
+    """aiohttp を使用した非同期トランスポート
+
+    キープアライブ接続をプールした aiohttp.ClientSession を保持する。
+    セッションは実行中のイベントループ上で初回使用時に作成する。
+    """
+
+    def __init__(self, edge_url: str, pool_size: int = 4):
+        if aiohttp is None:
+            raise RuntimeError("非同期実行モードには aiohttp が必要です (pip install aiohttp)")
+        self.edge_url = edge_url.rstrip("/")
+        self.pool_size = pool_size
+        self.session = None
+
+    async def request(self, method: str, path: str, payload: Any, timeout: float) -> Any:
+        """リクエストを送信し、JSONレスポンスを返す
+
+        Args:
+            method (str): HTTPメソッド
+            path (str): APIパス
+            payload (Any): JSONとして送信するボディ（bytesの場合はエンコード済みのJSON）
+            timeout (float): タイムアウト（秒）
+
+        Returns:
+            Any: JSONレスポンス（ボディが空の場合はNone）
+        """
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30)
+            self.session = aiohttp.ClientSession(connector=connector)
+        if isinstance(payload, (bytes, bytearray)):
+            body = {"data": payload, "headers": JSON_HEADERS}
+        else:
+            body = {"json": payload}
+        async with self.session.request(
+            method,
+            f"{self.edge_url}{path}",
+            timeout=aiohttp.ClientTimeout(total=timeout),
+            **body
+        ) as response:
+            response.raise_for_status()
+            body = await response.read()
+            if not body:
+                return None
+            return await response.json(content_type=None)
+
+    async def close(self):
+        """プールしている接続をすべて閉じる"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class AsyncEdgeClient:
+    """ArkTwin Edge REST APIの非同期クライアント
+
+    transport には ``async request(method, path, payload, timeout)`` を持つ
+    任意のオブジェクトを指定できる。省略時は AiohttpTransport を使用する。
+    """
+
+    def __init__(self, edge_url: str, pool_size: int = 4, transport=None):
+        self.edge_url = edge_url.rstrip("/")
+        self.transport = transport or AiohttpTransport(self.edge_url, pool_size=pool_size)
+
+    async def register_agents(self, agents: List[dict], timeout: float = 5) -> List[dict]:
+        """エージェントを登録する（POST /api/edge/agents）"""
+        return await self.transport.request("POST", "/api/edge/agents", agents, timeout)
+
+    async def put_transforms(self, data: Union[dict, bytes], timeout: float = 1) -> None:
+        """エージェントの変換行列を送信する（PUT /api/edge/agents）"""
+        await self.transport.request("PUT", "/api/edge/agents", data, timeout)
+
+    async def query_neighbors(self, query: dict, timeout: float = 1) -> dict:
+        """近隣エージェントを検索する（POST /api/edge/neighbors/_query）"""
+        return await self.transport.request("POST", "/api/edge/neighbors/_query", query, timeout)
+
+    async def close(self):
+        """トランスポートを閉じる"""
+        await self.transport.close()
+
+
+async def gather_within_deadline(tasks: Dict[str, "asyncio.Future"], deadline: float) -> Dict[str, Any]:
+    """期限までに完了したタスクの結果のみを返す
+
+    期限に間に合わなかったタスクはキャンセルし、結果を破棄する。
+    待機中に呼び出し元がキャンセルされた場合も、すべてのタスクをキャンセルしてから終了する。
+    例外で終了したタスクは例外オブジェクトを結果として返す。
+
+    Args:
+        tasks (Dict[str, asyncio.Future]): 名前とタスクの対応
+        deadline (float): イベントループ時刻での期限
+
+    Returns:
+        Dict[str, Any]: 完了したタスクの名前と結果（または例外）
+    """
+    loop = asyncio.get_running_loop()
+    timeout = max(0.0, deadline - loop.time())
+    try:
+        done, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+    except asyncio.CancelledError:
+        # 呼び出し元が停止した場合も送信中のタスクを残さない
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+    for task in pending:
+        task.cancel()
+    if pending:
+        # キャンセルの完了を待ち、未回収の例外警告を防ぐ
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    results = {}
+    for name, task in tasks.items():
+        if task in done:
+            exception = task.exception()
+            results[name] = exception if exception is not None else task.result()
+    return results
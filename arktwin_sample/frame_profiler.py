@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+シミュレーションループのフレームプロファイラー
+
+フレームを名前付きの段階（登録、位置更新、JSON生成、送信、近隣受信、状態表示など）に区切って処理時間を計り、
+直近のフレームをリングバッファに保持する。更新間隔を超えたフレーム（期限超過）は回数と
+最も時間のかかった段階を記録する。
+
+- FrameProfiler: 段階ごとの処理時間と期限超過の集計（常に有効、1段階あたり perf_counter() 1回）
+- SamplingProfiler: シミュレーションのスレッドのスタックを一定間隔で採取する簡易サンプリングプロファイラー
+  （既定では停止しており、起動時または統計エンドポイントから開始・停止できる）
+- StatsServer: ローカルの統計エンドポイント（GET /stats, /frames, /profile と POST /profile/start, /profile/stop）
+- StatsDumper: 統計をJSONファイルに一定間隔で書き出す
+- summarize, environment: 統計とベンチマークのレポートで共通の集計と実行環境
+
+記録はシミュレーションのスレッドのみから行い、統計の読み出しはロックを取らずに配列をコピーする。
+読み出し中のフレームの値がわずかにずれることは許容する。
+"""
+
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+# 統計に出力するパーセンタイル
+PERCENTILES = (50, 90, 99)
+# フレームの外（待機中）のサンプルに付ける段階名
+IDLE_PHASE = "idle"
+
+
+class FrameProfiler:
+    """フレームごとの段階別処理時間と期限超過の集計
+
+    使用例::
+
+        profiler.start_frame()
+        profiler.phase("update")
+        update(dt)
+        profiler.phase("send")
+        send()
+        elapsed = profiler.end_frame()
+
+    phase() は前の段階を終えて次の段階を始める。段階は初めて使われた時点で追加される。
+    """
+
+    def __init__(self, budget: float = 0.1, history: int = 600):
+        """
+        Args:
+            budget (float): フレームの期限（秒、通常は更新間隔）
+            history (int): 保持する直近のフレーム数
+        """
+        self.budget = budget
+        self.history = history
+        self.phases: List[str] = []
+        self._index: Dict[str, int] = {}
+        # 直近のフレームの段階別処理時間（秒）とフレーム全体の処理時間
+        self._durations = np.zeros((history, 8))
+        self._totals = np.zeros(history)
+        self.frames = 0
+        self.overruns = 0
+        # 期限超過したフレームで最も時間のかかった段階ごとの回数
+        self.overruns_by_phase: Counter = Counter()
+        self.worst_frame: Optional[dict] = None
+        # 実行中の段階（サンプリングプロファイラーが参照する）
+        self.current_phase: Optional[str] = None
+        self._row: Optional[np.ndarray] = None
+        self._frame_started = 0.0
+        self._phase_started = 0.0
+
+    def start_frame(self):
+        """フレームを開始する"""
+        self._row = self._durations[self.frames % self.history]
+        self._row[:] = 0.0
+        self._frame_started = self._phase_started = time.perf_counter()
+        self.current_phase = None
+
+    def phase(self, name: str):
+        """実行中の段階を終え、name の段階を始める（フレームの外では何もしない）"""
+        if self._row is None:
+            return
+        now = time.perf_counter()
+        self._close_phase(now)
+        if name not in self._index:
+            self._add_phase(name)
+        self.current_phase = name
+        self._phase_started = now
+
+    def end_frame(self) -> float:
+        """フレームを終える
+
+        Returns:
+            float: フレーム全体の処理時間（秒）
+        """
+        now = time.perf_counter()
+        self._close_phase(now)
+        self.current_phase = None
+        row, self._row = self._row, None
+        elapsed = now - self._frame_started
+        self._totals[self.frames % self.history] = elapsed
+        self.frames += 1
+        if elapsed > self.budget:
+            self.overruns += 1
+            if self.phases:
+                self.overruns_by_phase[self.phases[int(np.argmax(row[:len(self.phases)]))]] += 1
+        if self.worst_frame is None or elapsed > self.worst_frame["total_ms"] / 1000.0:
+            self.worst_frame = self._frame_dict(self.frames - 1)
+        return elapsed
+
+    def _close_phase(self, now: float):
+        if self.current_phase is not None:
+            self._row[self._index[self.current_phase]] += now - self._phase_started
+
+    def _add_phase(self, name: str):
+        if len(self.phases) == self._durations.shape[1]:
+            self._durations = np.pad(self._durations, ((0, 0), (0, self._durations.shape[1])))
+            if self._row is not None:
+                self._row = self._durations[self.frames % self.history]
+        self._index[name] = len(self.phases)
+        self.phases.append(name)
+
+    def _frame_dict(self, frame: int) -> dict:
+        slot = frame % self.history
+        row = self._durations[slot]
+        return {
+            "frame": frame,
+            "total_ms": float(self._totals[slot] * 1000.0),
+            "overrun": bool(self._totals[slot] > self.budget),
+            "phases_ms": {name: float(row[i] * 1000.0) for i, name in enumerate(self.phases)},
+        }
+
+    def recent(self, limit: int = 50) -> List[dict]:
+        """直近のフレーム（古い順）"""
+        count = min(limit, self.frames, self.history)
+        return [self._frame_dict(frame) for frame in range(self.frames - count, self.frames)]
+
+    def stats(self) -> dict:
+        """直近のフレームの段階別の統計（ミリ秒）と期限超過の集計"""
+        count = min(self.frames, self.history)
+        durations = self._durations[:count, :len(self.phases)].copy()
+        totals = self._totals[:count].copy()
+        return {
+            "frames": self.frames,
+            "window": count,
+            "budget_ms": self.budget * 1000.0,
+            "overruns": self.overruns,
+            "overrun_rate": self.overruns / self.frames if self.frames else 0.0,
+            "recent_overrun_rate": float(np.mean(totals > self.budget)) if count else 0.0,
+            "overruns_by_phase": dict(self.overruns_by_phase),
+            "frame_ms": summarize(totals),
+            "phases_ms": {name: summarize(durations[:, i]) for i, name in enumerate(self.phases)},
+            "worst_frame": self.worst_frame,
+        }
+
+    def summary(self) -> str:
+        """終了時に表示する1行の要約"""
+        text = f"期限超過フレーム: {self.overruns}/{self.frames}"
+        if self.overruns_by_phase:
+            text += "（" + ", ".join(f"{name}: {count}" for name, count
+                                    in self.overruns_by_phase.most_common()) + "）"
+        return text
+
+
+def summarize(values) -> dict:
+    """処理時間（秒）の分布をミリ秒単位の統計量にまとめる（ベンチマークと共通）"""
+    if len(values) == 0:
+        return {}
+    ms = np.asarray(values) * 1000.0
+    summary = {f"p{p}": float(value) for p, value in zip(PERCENTILES, np.percentile(ms, PERCENTILES))}
+    summary["mean"] = float(ms.mean())
+    summary["max"] = float(ms.max())
+    return summary
+
+
+def environment() -> dict:
+    """ベンチマークのレポートに記録する実行環境"""
+    try:
+        import orjson  # noqa: F401
+        has_orjson = True
+    except ImportError:
+        has_orjson = False
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "orjson": has_orjson,
+    }
+
+
+class SamplingProfiler:
+    """対象スレッドのスタックを一定間隔で採取する簡易サンプリングプロファイラー
+
+    関数ごとに、スタックの先頭にあった回数（self）とスタックに含まれていた回数（total）を数え、
+    FrameProfiler の実行中の段階ごとのサンプル数も記録する。
+    """
+
+    def __init__(self, frame_profiler: Optional[FrameProfiler] = None, interval: float = 0.005,
+                 thread_id: Optional[int] = None, max_depth: int = 64):
+        """
+        Args:
+            frame_profiler (Optional[FrameProfiler]): 段階名を参照するフレームプロファイラー
+            interval (float): 採取間隔（秒）
+            thread_id (Optional[int]): 対象スレッドのID（省略時はメインスレッド）
+            max_depth (int): たどるスタックの深さの上限
+        """
+        self.frame_profiler = frame_profiler
+        self.interval = interval
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.max_depth = max_depth
+        self.samples = 0
+        self._self_counts: Counter = Counter()
+        self._total_counts: Counter = Counter()
+        self._phase_counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        """採取を開始する（実行中の場合は何もしない）"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """採取を停止する（結果は保持する）"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=1)
+        self._thread = None
+
+    def reset(self):
+        """採取した結果を破棄する"""
+        with self._lock:
+            self.samples = 0
+            self._self_counts.clear()
+            self._total_counts.clear()
+            self._phase_counts.clear()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            phase = None
+            if self.frame_profiler is not None:
+                phase = self.frame_profiler.current_phase or IDLE_PHASE
+            functions = []
+            depth = 0
+            while frame is not None and depth < self.max_depth:
+                code = frame.f_code
+                functions.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+                depth += 1
+            del frame
+            with self._lock:
+                self.samples += 1
+                if phase is not None:
+                    self._phase_counts[phase] += 1
+                if functions:
+                    self._self_counts[functions[0]] += 1
+                    self._total_counts.update(set(functions))
+
+    def report(self, limit: int = 30) -> dict:
+        """採取結果（self の多い順に limit 件の関数）"""
+        with self._lock:
+            samples = self.samples
+            self_counts = self._self_counts.copy()
+            total_counts = self._total_counts.copy()
+            phase_counts = dict(self._phase_counts)
+        functions = []
+        for key, count in self_counts.most_common(limit):
+            name, filename, line = key
+            functions.append({
+                "function": f"{name} ({os.path.basename(filename)}:{line})",
+                "self": count,
+                "total": total_counts[key],
+                "self_ratio": count / samples if samples else 0.0,
+                "total_ratio": total_counts[key] / samples if samples else 0.0,
+            })
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000.0,
+            "samples": samples,
+            "phases": phase_counts,
+            "functions": functions,
+        }
+
+
+def snapshot(profiler: FrameProfiler, sampler: Optional[SamplingProfiler] = None) -> dict:
+    """統計エンドポイントとファイル出力で共通の統計"""
+    data = {"stats": profiler.stats()}
+    if sampler is not None and (sampler.running or sampler.samples):
+        data["profile"] = sampler.report()
+    return data
+
+
+class StatsServer:
+    """フレームの統計を返すローカルのHTTPエンドポイント
+
+    - GET /stats: 段階別の統計と期限超過の集計（サンプリング中は採取結果も含む）
+    - GET /frames?limit=N: 直近のフレーム
+    - GET /profile: サンプリングプロファイラーの採取結果
+    - POST /profile/start, /profile/stop, /profile/reset: サンプリングプロファイラーの開始・停止・破棄
+    """
+
+    def __init__(self, profiler: FrameProfiler, sampler: Optional[SamplingProfiler] = None,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.profiler = profiler
+        self.sampler = sampler or SamplingProfiler(profiler)
+        self.host = host
+        self.port = port
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def start(self):
+        """別スレッドで待ち受けを開始する（port=0 の場合は空いているポートを使い、self.port に設定する）"""
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="stats-server", daemon=True).start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _handler(self):
+        stats_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/stats":
+                    self._json(snapshot(stats_server.profiler, stats_server.sampler))
+                elif url.path == "/frames":
+                    try:
+                        limit = int(parse_qs(url.query).get("limit", ["50"])[0])
+                    except ValueError:
+                        self._json({"error": "limit must be an integer"}, status=400)
+                        return
+                    self._json(stats_server.profiler.recent(limit))
+                elif url.path == "/profile":
+                    self._json(stats_server.sampler.report())
+                else:
+                    self._json({"error": "Not Found"}, status=404)
+
+            def do_POST(self):
+                sampler = stats_server.sampler
+                actions = {"/profile/start": sampler.start, "/profile/stop": sampler.stop,
+                           "/profile/reset": sampler.reset}
+                action = actions.get(urlparse(self.path).path)
+                if action is None:
+                    self._json({"error": "Not Found"}, status=404)
+                    return
+                action()
+                self._json({"running": sampler.running, "samples": sampler.samples})
+
+            def _json(self, data, status: int = 200):
+                body = json.dumps(data, ensure_ascii=False).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # シミュレーターのコンソール出力を妨げない
+                pass
+
+        return Handler
+
+
+class StatsDumper:
+    """フレームの統計をJSONファイルに一定間隔で書き出す（書き込み途中のファイルを読まれないよう置き換える）"""
+
+    def __init__(self, profiler: FrameProfiler, path: str, interval: float = 10.0,
+                 sampler: Optional[SamplingProfiler] = None):
+        self.profiler = profiler
+        self.path = path
+        self.interval = interval
+        self.sampler = sampler
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stats-dumper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """書き出しを停止し、最後の統計を書き出す"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+        self.dump()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(snapshot(self.profiler, self.sampler), f, ensure_ascii=False, indent=2)
+        os.replace(temporary, self.path)
+
+
+def start_reporting(profiler: FrameProfiler, stats_port: Optional[int] = None,
+                    dump_path: Optional[str] = None, dump_interval: float = 10.0,
+                    sampling: bool = False, sampling_interval: float = 0.005) -> List[object]:
+    """シミュレーターのコマンドライン引数に応じて統計エンドポイント・ファイル出力・サンプリングを開始する
+
+    Returns:
+        List[object]: 終了時に stop() を呼ぶもの
+    """
+    sampler = SamplingProfiler(profiler, interval=sampling_interval)
+    started: List[object] = []
+    if stats_port is not None:
+        server = StatsServer(profiler, sampler, port=stats_port)
+        server.start()
+        print(f"フレーム統計: http://127.0.0.1:{server.port}/stats")
+        started.append(server)
+    if dump_path:
+        dumper = StatsDumper(profiler, dump_path, dump_interval, sampler)
+        dumper.start()
+        print(f"フレーム統計の出力先: {dump_path}（{dump_interval:g}秒ごと）")
+        started.append(dumper)
+    if sampling:
+        sampler.start()
+        print(f"サンプリングプロファイラーを開始しました（{sampling_interval * 1000:g}ミリ秒間隔）")
+    started.append(sampler)
+    return started
@@ -0,0 +1,577 @@
+#!/usr/bin/env python3
+"""
+ArkTwin Edge の代替サーバー（負荷試験用）
+
+JVMのCenter・Edgeを起動せずに、シミュレーターとプロキシサーバーをローカルで
+負荷試験するための ArkTwin Edge REST API の代替実装。
+aiohttp の1つのイベントループで複数のEdgeを待ち受け、エージェントの状態（MockWorld）を全Edgeで共有する。
+各Edgeの近隣検索には、他のEdgeに送信された変換行列がそのまま返る。
+
+- POST /api/edge/agents: agentIdPrefix に連番を付けたagentIdを割り当てて登録
+- PUT /api/edge/agents: 登録済みエージェントの変換行列と状態を更新
+- POST /api/edge/neighbors/_query: 他のEdgeのエージェントのうち、自Edgeのエージェントとの
+  最短距離が maxDistance 以内のものを近い順に min(neighborsNumber, maxNeighborsNumber) 件まで返す。
+  changeDetection が有効な場合は前回の検索からの変化（Recognized, Updated, Unrecognized）を付ける
+- GET /health: 死活確認
+
+カリングの設定は edge-*.conf の culling から読み込める。
+HTTPを介さずに同じ処理を呼び出す AsyncEdgeClient 用のトランスポート（MockEdgeTransport）と、
+ベンチマークから別プロセスとして起動するための MockEdgeProcess も提供する。
+
+使用例:
+    python mock_edge.py                                   # edge-*.conf の設定
+    python mock_edge.py --config edge-vehicle.conf --config edge-pedestrian.conf
+    python mock_edge.py --edge vehicle=2237 --edge pedestrian=2238 --edge observer=2239
+"""
+
+import asyncio
+import glob
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from spatial_index import SpatialGrid
+from transform_serializer import dumps
+
+try:
+    from aiohttp import web
+except ImportError:  # 代替Edgeを使用しない場合は不要
+    web = None
+
+try:
+    import orjson
+except ImportError:  # 未インストールの場合は標準のjsonモジュールを使用
+    orjson = None
+
+# changeDetection 有効時の change の値
+CHANGE_RECOGNIZED = "Recognized"
+CHANGE_UPDATED = "Updated"
+CHANGE_UNRECOGNIZED = "Unrecognized"
+
+# 空間索引のセルの大きさの下限（メートル）
+_MIN_CELL_SIZE = 0.5
+
+
+def _loads(body: bytes):
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+@dataclass
+class MockEdgeConfig:
+    """代替Edgeの設定（edge-*.conf の culling に相当）
+
+    Attributes:
+        name (str): Edge名（ログとエージェントの所属に使用）
+        port (int): 待ち受けポート番号
+        host (str): 待ち受けアドレス
+        max_neighbors (int): 近隣検索で返す最大件数（culling.maxNeighborsNumber）
+        max_distance (float): 近隣検索で返す最大距離（culling.maxDistance、メートル）
+        culling (bool): カリングの有無（culling.enabled）。無効の場合は neighborsNumber のみで絞り込む
+    """
+    name: str
+    port: int
+    host: str = "127.0.0.1"
+    max_neighbors: int = 50
+    max_distance: float = 200.0
+    culling: bool = True
+
+
+def _conf_value(text: str, key: str) -> Optional[str]:
+    match = re.search(rf"^\s*{key}\s*[=:]\s*\"?([^\"\s#]+)\"?", text, re.MULTILINE)
+    return match.group(1) if match else None
+
+
+def load_edge_config(path: str) -> MockEdgeConfig:
+    """edge-*.conf から待ち受けアドレスとカリングの設定を読み込む
+
+    HOCONの完全な解析は行わず、arktwin.edge.static の host, port と
+    arktwin.edge.dynamic.culling の enabled, maxNeighborsNumber, maxDistance のみを読み取る。
+    Edge名はファイル名の edge- より後（edge-vehicle.conf の場合は vehicle）。
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    stem = os.path.splitext(os.path.basename(path))[0]
+    name = stem[len("edge-"):] if stem.startswith("edge-") else stem
+    port = _conf_value(text, "port")
+    if port is None:
+        raise ValueError(f"{path} に port がありません")
+    config = MockEdgeConfig(name, int(port), _conf_value(text, "host") or "127.0.0.1")
+    culling = re.search(r"culling\s*\{([^}]*)\}", text)
+    if culling:
+        block = culling.group(1)
+        enabled = _conf_value(block, "enabled")
+        max_neighbors = _conf_value(block, "maxNeighborsNumber")
+        max_distance = _conf_value(block, "maxDistance")
+        if enabled is not None:
+            config.culling = enabled.lower() == "true"
+        if max_neighbors is not None:
+            config.max_neighbors = int(max_neighbors)
+        if max_distance is not None:
+            config.max_distance = float(max_distance)
+    return config
+
+
+@dataclass
+class MockAgent:
+    """代替Edgeに登録されたエージェント"""
+    edge: str
+    kind: Optional[str]
+    status: dict = field(default_factory=dict)
+    assets: dict = field(default_factory=dict)
+    # 変換行列を受信するまではNone（近隣検索の対象外）
+    transform: Optional[dict] = None
+
+
+class MockWorld:
+    """全Edgeで共有するエージェントの状態
+
+    変換行列を受信したエージェントの位置をEdgeごとの空間索引（SpatialGrid）で管理し、
+    近隣検索では自Edgeのエージェントの位置から他のEdgeの空間索引を半径検索する。
+    空間索引のセルの大きさは、近隣検索のたびにエージェントの密度（1セルに1点程度）に合わせて調整する。
+    イベントループ上からのみ呼び出す前提で、ロックは取らない。
+
+    Attributes:
+        agents (Dict[str, MockAgent]): agentIdとエージェント
+        unknown_updates (int): 未登録または他のEdgeのエージェントへの更新要求の件数（無視した件数）
+    """
+
+    def __init__(self, cell_size: float = 10.0):
+        self.agents: Dict[str, MockAgent] = {}
+        self.unknown_updates = 0
+        self.cell_size = cell_size
+        self._grids: Dict[str, SpatialGrid] = {}
+        # changeDetection 有効時に前回返した近隣エージェント（Edge名 -> agentIdの集合）
+        self._recognized: Dict[str, Set[str]] = {}
+        self._serial = itertools.count(1)
+
+    def _grid(self, edge: str) -> SpatialGrid:
+        grid = self._grids.get(edge)
+        if grid is None:
+            grid = self._grids[edge] = SpatialGrid(self.cell_size)
+        return grid
+
+    def register(self, edge: str, requests: List[dict]) -> List[dict]:
+        """エージェントを登録し、割り当てたagentIdを返す（POST /api/edge/agents）"""
+        self._grid(edge)
+        response = []
+        for request in requests:
+            prefix = request["agentIdPrefix"]
+            agent_id = f"{prefix}-{next(self._serial):x}"
+            self.agents[agent_id] = MockAgent(edge, request.get("kind"), request.get("status") or {},
+                                              request.get("assets") or {})
+            response.append({"agentId": agent_id, "agentIdPrefix": prefix})
+        return response
+
+    def update(self, edge: str, data: dict):
+        """エージェントの変換行列と状態を更新する（PUT /api/edge/agents）
+
+        自Edgeに登録されていないエージェントへの更新は無視する。
+        """
+        agents = self.agents
+        grid = self._grid(edge)
+        for agent_id, body in data.get("agents", {}).items():
+            agent = agents.get(agent_id)
+            if agent is None or agent.edge != edge:
+                self.unknown_updates += 1
+                continue
+            transform = body.get("transform")
+            if transform is not None:
+                translation = transform["localTranslation"]
+                agent.transform = transform
+                grid.upsert(agent_id, float(translation["x"]), float(translation["y"]))
+            if "status" in body:
+                agent.status = body["status"]
+
+    def nearest(self, edge: str, number: int,
+                max_distance: Optional[float]) -> List[Tuple[str, float]]:
+        """他のEdgeのエージェントのうち、自Edgeのエージェントとの最短距離が近いものを求める
+
+        検索半径を小さく始めて倍々に広げ、number 件以上、または他のEdgeの全エージェントが
+        見つかった時点で打ち切る（見つかったエージェントより近い未発見のエージェントはないため）。
+        自Edgeのエージェントが変換行列を送信していない場合は原点からの距離を使う。
+
+        Args:
+            edge (str): 問い合わせたEdge
+            number (int): 最大件数
+            max_distance (Optional[float]): 最大距離（Noneの場合は制限なし）
+
+        Returns:
+            List[Tuple[str, float]]: agentIdと最短距離（近い順）
+        """
+        names = [name for name, grid in self._grids.items() if name != edge and len(grid)]
+        if number <= 0 or not names:
+            return []
+        own = self._grids.get(edge)
+        origins = own.positions if own is not None and len(own) else np.zeros((1, 2))
+
+        limit = max_distance
+        if limit is None:
+            # 全点を含む半径（これを超えて広げる必要はない）
+            points = np.concatenate([origins] + [self._grids[name].positions for name in names])
+            limit = max(float(np.hypot(*(points.max(axis=0) - points.min(axis=0)))), _MIN_CELL_SIZE)
+        others = [self._fit_cell_size(name, limit) for name in names]
+        # 最も密な索引のセルの大きさ（点の間隔の目安）から検索を始める
+        radius = min(limit, min(grid.cell_size for grid in others))
+        total = sum(len(grid) for grid in others)
+        while True:
+            found = []
+            for grid in others:
+                rows, slots = grid.query_radius_many(origins, radius)
+                if len(slots) == 0:
+                    continue
+                # 検索点（自Edgeのエージェント）ごとの距離から、エージェントごとの最短距離を求める
+                distance = np.hypot(*(grid.positions[slots] - origins[rows]).T)
+                best = np.full(len(grid), np.inf)
+                np.minimum.at(best, slots, distance)
+                hit = np.flatnonzero(np.isfinite(best))
+                found.append((grid, hit, best[hit]))
+            count = sum(len(hit) for _, hit, _ in found)
+            if count >= min(number, total) or radius >= limit:
+                break
+            radius = min(radius * 2.0, limit)
+
+        if not found:
+            return []
+        distance = np.concatenate([best for _, _, best in found])
+        slots = np.concatenate([hit for _, hit, _ in found])
+        owner = np.repeat(np.arange(len(found)), [len(hit) for _, hit, _ in found])
+        order = np.argsort(distance, kind="stable")[:number]
+        return [(found[grid][0].ids[slot], distance)
+                for grid, slot, distance in zip(owner[order].tolist(), slots[order].tolist(),
+                                                distance[order].tolist())]
+
+    def _fit_cell_size(self, edge: str, max_cell_size: float) -> SpatialGrid:
+        """Edgeの空間索引のセルの大きさを点の密度に合わせる（2倍以上ずれた場合のみ作り直す）"""
+        grid = self._grids[edge]
+        positions = grid.positions
+        extent = positions.max(axis=0) - positions.min(axis=0)
+        fitted = float(np.sqrt(max(float(extent[0] * extent[1]), 1.0) / len(grid)))
+        fitted = min(max(fitted, _MIN_CELL_SIZE), max_cell_size)
+        if grid.cell_size / 2 <= fitted <= grid.cell_size * 2:
+            return grid
+        resized = SpatialGrid(fitted, capacity=len(grid))
+        resized.reset(grid.ids, positions)
+        self._grids[edge] = resized
+        return resized
+
+    def neighbors(self, edge: str, number: int, max_distance: Optional[float],
+                  change_detection: bool = False) -> Dict[str, dict]:
+        """近隣検索のレスポンスの neighbors を作成
+
+        changeDetection が有効な場合は、Edgeごとに前回返したエージェントと比べて
+        新たに範囲に入ったものに Recognized、引き続き範囲内のものに Updated を付け、
+        範囲から外れたものを Unrecognized として加える。
+        無効の場合は change を付けず、前回の状態も更新しない。
+
+        Returns:
+            Dict[str, dict]: agentIdと近隣情報（近い順。Unrecognized は末尾）
+        """
+        result = {}
+        agents = self.agents
+        for agent_id, distance in self.nearest(edge, number, max_distance):
+            agent = agents[agent_id]
+            result[agent_id] = {
+                "transform": agent.transform,
+                "kind": agent.kind,
+                "status": agent.status,
+                "assets": agent.assets,
+                "nearestDistance": distance
+            }
+        if not change_detection:
+            return result
+
+        previous = self._recognized.get(edge, set())
+        for agent_id, item in result.items():
+            item["change"] = CHANGE_UPDATED if agent_id in previous else CHANGE_RECOGNIZED
+        current = set(result)
+        for agent_id in previous - current:
+            agent = agents[agent_id]
+            result[agent_id] = {
+                "transform": agent.transform,
+                "kind": agent.kind,
+                "status": agent.status,
+                "assets": agent.assets,
+                "change": CHANGE_UNRECOGNIZED
+            }
+        self._recognized[edge] = current
+        return result
+
+    def query(self, edge: MockEdgeConfig, query: dict) -> dict:
+        """近隣検索を行う（POST /api/edge/neighbors/_query）
+
+        件数は neighborsNumber とEdgeの maxNeighborsNumber の小さい方、
+        距離はEdgeの maxDistance で絞り込む（カリング無効時は neighborsNumber のみ）。
+        """
+        number = int(query.get("neighborsNumber") or edge.max_neighbors)
+        max_distance = None
+        if edge.culling:
+            number = min(number, edge.max_neighbors)
+            max_distance = edge.max_distance
+        return {
+            "timestamp": query.get("timestamp"),
+            "neighbors": self.neighbors(edge.name, number, max_distance,
+                                        bool(query.get("changeDetection")))
+        }
+
+    def call(self, edge: MockEdgeConfig, method: str, path: str, payload: Any) -> Any:
+        """REST APIの1回の呼び出しを処理する
+
+        Returns:
+            Any: レスポンスのボディ（ボディがない場合はNone）
+
+        Raises:
+            LookupError: 対応していないAPIの場合
+        """
+        if path == "/api/edge/agents":
+            if method == "POST":
+                return self.register(edge.name, payload)
+            if method == "PUT":
+                self.update(edge.name, payload)
+                return None
+        elif path == "/api/edge/neighbors/_query" and method == "POST":
+            return self.query(edge, payload or {})
+        raise LookupError(f"{method} {path}")
+
+
+class MockEdgeTransport:
+    """HTTPを介さずに MockWorld を呼び出す AsyncEdgeClient 用のトランスポート
+
+    シミュレーターの非同期クライアントを、ネットワークやサーバーの処理を含めずに
+    代替Edgeの状態と直接つなぐ（AsyncEdgeClient(url, transport=MockEdgeTransport(world, edge))）。
+    """
+
+    def __init__(self, world: MockWorld, edge: MockEdgeConfig):
+        self.world = world
+        self.edge = edge
+
+    async def request(self, method: str, path: str, payload: Any, timeout: float) -> Any:
+        if isinstance(payload, (bytes, bytearray)):
+            payload = _loads(payload)
+        return self.world.call(self.edge, method, path, payload)
+
+    async def close(self):
+        pass
+
+
+class MockEdgeServer:
+    """複数の代替Edgeを1つのイベントループで待ち受けるサーバー
+
+    Attributes:
+        world (MockWorld): 全Edgeで共有するエージェントの状態
+        edges (List[MockEdgeConfig]): 待ち受けるEdge
+        requests (int): 処理したリクエスト数
+    """
+
+    def __init__(self, edges: Optional[List[MockEdgeConfig]] = None, world: Optional[MockWorld] = None):
+        if web is None:
+            raise RuntimeError("代替Edgeサーバーには aiohttp が必要です (pip install aiohttp)")
+        self.edges = edges or [MockEdgeConfig("vehicle", 2237), MockEdgeConfig("pedestrian", 2238)]
+        self.world = world or MockWorld()
+        self.requests = 0
+        self._runners: List["web.ServerRunner"] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def create_handler(self, edge: MockEdgeConfig):
+        """1つのEdgeのREST APIを処理するハンドラーを作成
+
+        負荷試験でサーバー側の処理が律速にならないよう、aiohttp のルーターを使わずに
+        低レベルサーバーでメソッドとパスから直接振り分ける。
+        """
+        world = self.world
+
+        async def handle(request: "web.BaseRequest"):
+            self.requests += 1
+            if request.method == "GET" and request.path == "/health":
+                return web.Response(text="OK")
+            # request.read() は1MBを超える本文を拒否するため、大規模な変換行列の送信に備えて直接読み込む
+            body = await request.content.read()
+            try:
+                result = world.call(edge, request.method, request.path, _loads(body) if body else None)
+            except LookupError:
+                return web.Response(status=404, text="Not Found")
+            except (KeyError, TypeError, ValueError) as e:
+                return web.Response(status=400, text=f"不正なリクエストです: {e}")
+            if result is None:
+                return web.Response(status=202)
+            return self._json(result)
+
+        return handle
+
+    @staticmethod
+    def _json(data) -> "web.Response":
+        return web.Response(body=dumps(data), content_type="application/json")
+
+    async def start(self):
+        """全Edgeの待ち受けを開始（イベントループ上から呼び出す）"""
+        for edge in self.edges:
+            runner = web.ServerRunner(web.Server(self.create_handler(edge), access_log=None))
+            await runner.setup()
+            await web.TCPSite(runner, edge.host, edge.port).start()
+            self._runners.append(runner)
+
+    async def stop(self):
+        """全Edgeの待ち受けを終了"""
+        for runner in self._runners:
+            await runner.cleanup()
+        self._runners.clear()
+
+    def start_in_thread(self):
+        """専用スレッドのイベントループで待ち受けを開始（同期的なテストコードから使用）"""
+        started = threading.Event()
+        errors = []
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            try:
+                self._loop.run_until_complete(self.start())
+            except Exception as e:
+                errors.append(e)
+                return
+            finally:
+                started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="mock-edge", daemon=True)
+        self._thread.start()
+        started.wait()
+        if errors:
+            raise errors[0]
+
+    def stop_thread(self):
+        """start_in_thread() で開始した待ち受けを終了"""
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+
+class MockEdgeProcess:
+    """代替Edgeサーバーを別プロセスで起動する（with 文で使用）
+
+    呼び出し元と同じプロセスで動かすとGILを奪い合い、サーバーの処理が計測値に混ざるため、
+    ベンチマークでは別プロセスとして起動し、終了時に登録済みエージェントごと破棄する。
+    """
+
+    def __init__(self, ports: Dict[str, int], max_neighbors: Optional[int] = None,
+                 max_distance: Optional[float] = None, startup_timeout: float = 10.0):
+        self.ports = dict(ports)
+        self.max_neighbors = max_neighbors
+        self.max_distance = max_distance
+        self.startup_timeout = startup_timeout
+        self.process: Optional[subprocess.Popen] = None
+
+    def __enter__(self) -> "MockEdgeProcess":
+        command = [sys.executable, os.path.abspath(__file__)]
+        for name, port in self.ports.items():
+            command += ["--edge", f"{name}={port}"]
+        if self.max_neighbors is not None:
+            command += ["--max-neighbors", str(self.max_neighbors)]
+        if self.max_distance is not None:
+            command += ["--max-distance", str(self.max_distance)]
+        self.process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        deadline = time.monotonic() + self.startup_timeout
+        for port in self.ports.values():
+            while True:
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"代替Edgeサーバーが起動できません: {self.process.stderr.read().decode()}")
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=0.5).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        self.__exit__(None, None, None)
+                        raise RuntimeError(f"代替Edgeサーバー（ポート {port}）が応答しません")
+                    time.sleep(0.05)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+
+
+def parse_edge(spec: str, max_neighbors: int = 50, max_distance: float = 200.0) -> MockEdgeConfig:
+    """"name=port" または "name=host:port" 形式のEdge指定を解析"""
+    name, sep, address = spec.partition("=")
+    if not sep or not name:
+        raise ValueError(f"Edgeは name=port または name=host:port の形式で指定してください: {spec}")
+    host, _, port = address.rpartition(":")
+    return MockEdgeConfig(name, int(port), host or "127.0.0.1", max_neighbors, max_distance)
+
+
+def main(argv=None):
+    """メイン処理"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ArkTwin Edge 代替サーバー（負荷試験用）")
+    parser.add_argument("--edge", action="append", default=None,
+                        help="待ち受けるEdge（name=port または name=host:port 形式、複数指定可）")
+    parser.add_argument("--config", action="append", default=None,
+                        help="待ち受けアドレスとカリングの設定を読み込むEdgeの設定ファイル（複数指定可）。"
+                             "--edge と --config が未指定時は同じディレクトリの edge-*.conf、"
+                             "それもなければ vehicle=2237 と pedestrian=2238")
+    parser.add_argument("--max-neighbors", type=int, default=None,
+                        help="近隣検索で返す最大件数（設定ファイルの maxNeighborsNumber より優先） (デフォルト: 50)")
+    parser.add_argument("--max-distance", type=float, default=None,
+                        help="近隣検索で返す最大距離（メートル、設定ファイルの maxDistance より優先） "
+                             "(デフォルト: 200.0)")
+    args = parser.parse_args(argv)
+
+    configs = args.config
+    if configs is None and args.edge is None:
+        configs = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "edge-*.conf")))
+    edges = [load_edge_config(path) for path in configs or []]
+    edges += [parse_edge(spec) for spec in args.edge or []]
+    if not edges:
+        edges = [MockEdgeConfig("vehicle", 2237), MockEdgeConfig("pedestrian", 2238)]
+    for edge in edges:
+        if args.max_neighbors is not None:
+            edge.max_neighbors = args.max_neighbors
+        if args.max_distance is not None:
+            edge.max_distance = args.max_distance
+    server = MockEdgeServer(edges)
+
+    print("ArkTwin Edge 代替サーバー")
+    print("=" * 50)
+    for edge in edges:
+        culling = (f"maxNeighborsNumber={edge.max_neighbors}, maxDistance={edge.max_distance}"
+                   if edge.culling else "カリング無効")
+        print(f"{edge.name}: http://{edge.host}:{edge.port} ({culling})")
+    print("Ctrl+C で終了")
+
+    async def serve():
+        await server.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("\nサーバーを停止します...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+近隣エージェントキャッシュ
+
+近隣エージェント検索（changeDetection有効）のレスポンスを差分として適用し、
+他のシミュレーターのエージェント情報を保持する。
+
+レスポンスの各エージェントの change に応じて追加・更新・削除を行い、
+kind ごと・IDプレフィックスごとの索引を維持する。
+利用側は毎周期すべての近隣エージェントを走査せずに、
+特定の種類のエージェントや今回変化したエージェントのみを参照できる。
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+# change の値（ArkTwinのバージョンによる表記の違いを両方受け付ける）
+CHANGE_ADDED = frozenset({"Added", "Recognized"})
+CHANGE_REMOVED = frozenset({"Removed", "Unrecognized"})
+
+_EMPTY: frozenset = frozenset()
+
+
+def id_prefix(agent_id: str) -> str:
+    """エージェントIDの先頭部分（最初の '-' より前、例: "pedestrian"）を取得する"""
+    return agent_id.split("-", 1)[0]
+
+
+@dataclass
+class NeighborDelta:
+    """1回のレスポンスで変化したエージェントID
+
+    Attributes:
+        added (Set[str]): 新たに認識したエージェント
+        updated (Set[str]): 状態が更新されたエージェント
+        removed (Set[str]): 認識しなくなったエージェント
+    """
+    added: Set[str] = field(default_factory=set)
+    updated: Set[str] = field(default_factory=set)
+    removed: Set[str] = field(default_factory=set)
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.updated) + len(self.removed)
+
+
+class NeighborCache:
+    """差分で更新する近隣エージェント情報と、kind・IDプレフィックスの索引
+
+    Attributes:
+        agents (Dict[str, dict]): エージェントIDと近隣情報（transform, kind, status など）
+        last_delta (NeighborDelta): 直前の apply() で変化したエージェント
+    """
+
+    def __init__(self):
+        self.agents: Dict[str, dict] = {}
+        self.last_delta = NeighborDelta()
+        self._by_kind: Dict[str, Set[str]] = {}
+        self._by_prefix: Dict[str, Set[str]] = {}
+        self._kind_of: Dict[str, Optional[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.agents)
+
+    def __contains__(self, agent_id: str) -> bool:
+        return agent_id in self.agents
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.agents)
+
+    def get(self, agent_id: str, default=None):
+        return self.agents.get(agent_id, default)
+
+    def items(self):
+        return self.agents.items()
+
+    def _index(self, agent_id: str, kind: Optional[str]):
+        self._kind_of[agent_id] = kind
+        if kind is not None:
+            self._by_kind.setdefault(kind, set()).add(agent_id)
+        self._by_prefix.setdefault(id_prefix(agent_id), set()).add(agent_id)
+
+    def _unindex(self, agent_id: str):
+        kind = self._kind_of.pop(agent_id, None)
+        if kind is not None:
+            self._discard(self._by_kind, kind, agent_id)
+        self._discard(self._by_prefix, id_prefix(agent_id), agent_id)
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[str]], key: str, agent_id: str):
+        members = index.get(key)
+        if members is not None:
+            members.discard(agent_id)
+            if not members:
+                del index[key]
+
+    def apply(self, neighbors: Dict[str, dict], complete: bool = False) -> NeighborDelta:
+        """近隣エージェント検索のレスポンスを適用する
+
+        change が追加（Added/Recognized）または未指定のエージェントは追加・更新し、
+        削除（Removed/Unrecognized）のエージェントは取り除く。
+
+        Args:
+            neighbors (Dict[str, dict]): レスポンスの neighbors
+            complete (bool): Trueの場合はレスポンスを全件とみなし、含まれないエージェントを削除する
+                             （changeDetection無効時）
+
+        Returns:
+            NeighborDelta: 変化したエージェント
+        """
+        delta = NeighborDelta()
+        agents = self.agents
+        for agent_id, item in neighbors.items():
+            change = item.get("change")
+            if change in CHANGE_REMOVED:
+                if agent_id in agents:
+                    del agents[agent_id]
+                    self._unindex(agent_id)
+                    delta.removed.add(agent_id)
+                continue
+
+            kind = item.get("kind")
+            if agent_id in agents:
+                if self._kind_of.get(agent_id) != kind:
+                    self._unindex(agent_id)
+                    self._index(agent_id, kind)
+                delta.updated.add(agent_id)
+            else:
+                self._index(agent_id, kind)
+                delta.added.add(agent_id)
+            agents[agent_id] = item
+
+        if complete and len(agents) > len(neighbors):
+            for agent_id in [agent_id for agent_id in agents if agent_id not in neighbors]:
+                del agents[agent_id]
+                self._unindex(agent_id)
+                delta.removed.add(agent_id)
+
+        self.last_delta = delta
+        return delta
+
+    def clear(self):
+        """保持しているすべてのエージェントを削除する"""
+        self.agents.clear()
+        self._by_kind.clear()
+        self._by_prefix.clear()
+        self._kind_of.clear()
+        self.last_delta = NeighborDelta()
+
+    def by_kind(self, kind: str) -> frozenset:
+        """指定した kind のエージェントID（参照専用、変更しないこと）"""
+        return self._by_kind.get(kind, _EMPTY)
+
+    def by_prefix(self, prefix: str) -> frozenset:
+        """指定したIDプレフィックス（例: "pedestrian"）のエージェントID（参照専用、変更しないこと）"""
+        return self._by_prefix.get(prefix, _EMPTY)
+
+    def prefixes(self) -> Iterator[Tuple[str, Set[str]]]:
+        """IDプレフィックスとエージェントIDの組を列挙する"""
+        return iter(self._by_prefix.items())
+
+    def changed(self, prefix: Optional[str] = None) -> NeighborDelta:
+        """直前の apply() で変化したエージェントを取得する
+
+        Args:
+            prefix (Optional[str]): 指定した場合はこのIDプレフィックスのエージェントのみ
+
+        Returns:
+            NeighborDelta: 変化したエージェント
+        """
+        if prefix is None:
+            return self.last_delta
+        delta = self.last_delta
+        return NeighborDelta(
+            added={agent_id for agent_id in delta.added if id_prefix(agent_id) == prefix},
+            updated={agent_id for agent_id in delta.updated if id_prefix(agent_id) == prefix},
+            removed={agent_id for agent_id in delta.removed if id_prefix(agent_id) == prefix},
+        )
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+ポーリングの周期制御
+
+プロキシサーバーがEdgeを一定の周期で問い合わせるための補助クラス。
+
+- PollScheduler: 予定時刻を基準に待ち時間を求め、問い合わせにかかった時間を差し引いて周期を保つ
+- Backoff: 失敗が続くEdgeの問い合わせ間隔をジッター付きの指数バックオフで広げる
+"""
+
+import random
+from typing import Optional
+
+
+class PollScheduler:
+    """問い合わせにかかった時間を差し引いて一定の周期を保つ
+
+    周期に間に合わなかった場合は遅れを取り戻すための連続実行をせず、
+    現在時刻から次の周期を数え直す。
+
+    Attributes:
+        overruns (int): 周期に間に合わなかった回数
+    """
+
+    def __init__(self):
+        self.overruns = 0
+        self._next: Optional[float] = None
+
+    def reset(self):
+        """予定時刻を破棄する（一時停止から再開する場合）"""
+        self._next = None
+
+    def delay(self, now: float, interval: float) -> float:
+        """次の問い合わせまでの待ち時間を求める
+
+        Args:
+            now (float): 現在時刻（time.monotonic() など単調増加の時刻）
+            interval (float): 周期（秒）
+
+        Returns:
+            float: 待ち時間（秒）
+        """
+        if self._next is None:
+            self._next = now
+        self._next += interval
+        if self._next < now:
+            self.overruns += 1
+            self._next = now
+        return self._next - now
+
+
+class Backoff:
+    """失敗が続く問い合わせ先のジッター付き指数バックオフ
+
+    失敗のたびに待ち時間を base から2倍ずつ maximum まで広げ、
+    そのうち後半の半分を乱数にする（複数のプロキシや問い合わせ先が同時に再試行しないようにする）。
+
+    Attributes:
+        failures (int): 連続した失敗の回数
+        next_attempt (float): 次に問い合わせてよい時刻
+    """
+
+    def __init__(self, base: float = 0.5, maximum: float = 30.0):
+        self.base = base
+        self.maximum = maximum
+        self.failures = 0
+        self.next_attempt = 0.0
+
+    def ready(self, now: float) -> bool:
+        """問い合わせてよい時刻になっているか"""
+        return now >= self.next_attempt
+
+    def failure(self, now: float) -> float:
+        """失敗を記録し、次に問い合わせてよい時刻までの待ち時間を返す"""
+        self.failures += 1
+        delay = min(self.maximum, self.base * 2 ** min(self.failures - 1, 30))
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        self.next_attempt = now + delay
+        return delay
+
+    def success(self):
+        """成功を記録し、待ち時間を戻す"""
+        self.failures = 0
+        self.next_attempt = 0.0
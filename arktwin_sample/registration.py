@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+エージェント登録パイプライン
+
+多数のエージェントをArkTwin Edgeに登録するため、登録要求を一定数ごとのチャンクに分け、
+複数のチャンクを並行して送信する。失敗したチャンクは再試行し、それでも失敗した
+登録要求は呼び出し元に返して次の機会に再登録できるようにする。
+
+シミュレーション実行中の登録は RegistrationQueue で行う。登録待ちの要求をチャンク単位で保持し、
+フレームごとに1回だけ、再試行や待機をせずに短いタイムアウトで送信する。
+失敗したチャンクはチャンクごとの指数バックオフ（poll_scheduler.Backoff）で次の送信時刻を決める。
+
+Edgeが割り当てたagentIdは、ハッシュ索引でagentIdPrefixと対応付け、
+行番号を共有する双方向の対応表（AgentIdTable）に保存する。
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import requests
+
+from edge_client import EdgeClient
+from poll_scheduler import Backoff
+
+
+class AgentIdTable:
+    """agentIdPrefix と Edgeが割り当てたagentId の双方向対応表
+
+    行番号はエージェント状態ストア（AgentStore）の行番号と一致させる。
+    未登録の行は agentId の代わりにプレフィックスを保持する。
+
+    Attributes:
+        prefixes (List[str]): 行番号順のagentIdPrefix
+        agent_ids (List[str]): 行番号順のagentId（未登録の行はプレフィックス）
+    """
+
+    def __init__(self):
+        self.prefixes: List[str] = []
+        self.agent_ids: List[str] = []
+        self._prefix_row: Dict[str, int] = {}
+        self._agent_row: Dict[str, int] = {}
+        # 行ごとの登録済みフラグ
+        self._bound = np.zeros(0, dtype=bool)
+
+    def __len__(self) -> int:
+        """登録済みのエージェント数"""
+        return len(self._agent_row)
+
+    def __contains__(self, prefix: str) -> bool:
+        """プレフィックスが登録済みかどうか"""
+        row = self._prefix_row.get(prefix)
+        return row is not None and self.agent_ids[row] in self._agent_row
+
+    def add_prefixes(self, prefixes: Iterable[str]):
+        """未登録のプレフィックスを行として追加する"""
+        start = len(self.prefixes)
+        prefixes = list(prefixes)
+        self.prefixes.extend(prefixes)
+        self.agent_ids.extend(prefixes)
+        self._prefix_row.update(zip(prefixes, range(start, start + len(prefixes))))
+        self._bound = np.concatenate((self._bound, np.zeros(len(prefixes), dtype=bool)))
+
+    def row_of_prefix(self, prefix: str) -> Optional[int]:
+        return self._prefix_row.get(prefix)
+
+    def row_of_agent_id(self, agent_id: str) -> Optional[int]:
+        return self._agent_row.get(agent_id)
+
+    def bind(self, prefix: str, agent_id: str):
+        """プレフィックスにagentIdを対応付ける"""
+        row = self._prefix_row.get(prefix)
+        if row is None:
+            row = len(self.prefixes)
+            self.add_prefixes([prefix])
+        previous = self.agent_ids[row]
+        if self._agent_row.get(previous) == row:
+            del self._agent_row[previous]
+        self.agent_ids[row] = agent_id
+        self._agent_row[agent_id] = row
+        self._bound[row] = True
+
+    def bound_mask(self, size: int) -> np.ndarray:
+        """先頭から size 行の登録済みフラグ（表にない行は未登録）"""
+        if size <= len(self._bound):
+            return self._bound[:size]
+        return np.concatenate((self._bound, np.zeros(size - len(self._bound), dtype=bool)))
+
+    def get(self, prefix: str, default: Optional[str] = None) -> Optional[str]:
+        """プレフィックスに対応するagentIdを取得する（未登録の場合はdefault）"""
+        row = self._prefix_row.get(prefix)
+        if row is None:
+            return default
+        agent_id = self.agent_ids[row]
+        return agent_id if agent_id in self._agent_row else default
+
+    def prefix_of(self, agent_id: str) -> Optional[str]:
+        """agentIdに対応するプレフィックスを取得する"""
+        row = self._agent_row.get(agent_id)
+        return None if row is None else self.prefixes[row]
+
+    def reconcile(self, requests_sent: List[dict], response: List[dict]) -> List[dict]:
+        """登録要求とレスポンスを対応付けて保存する
+
+        agentIdは「プレフィックス + '-' + 接尾辞」の形式で割り当てられるため、
+        末尾から '-' で区切った候補をハッシュ索引で引いて対応するプレフィックスを求める。
+        一致しない場合はリクエストと同じ位置のプレフィックスに対応付ける。
+
+        Args:
+            requests_sent (List[dict]): 送信した登録要求
+            response (List[dict]): Edgeのレスポンス
+
+        Returns:
+            List[dict]: レスポンスに含まれなかった登録要求
+        """
+        pending = {request["agentIdPrefix"]: request for request in requests_sent}
+        for position, agent_data in enumerate(response):
+            agent_id = agent_data["agentId"]
+            prefix = agent_data.get("agentIdPrefix")
+            if prefix not in pending:
+                prefix = None
+                candidate = agent_id
+                while "-" in candidate:
+                    candidate = candidate.rsplit("-", 1)[0]
+                    if candidate in pending:
+                        prefix = candidate
+                        break
+            if prefix is None and position < len(requests_sent):
+                prefix = requests_sent[position]["agentIdPrefix"]
+                if prefix not in pending:
+                    continue
+            if prefix is None:
+                continue
+            self.bind(prefix, agent_id)
+            del pending[prefix]
+        return list(pending.values())
+
+
+@dataclass
+class RegistrationResult:
+    """登録パイプラインの実行結果
+
+    Attributes:
+        registered (int): 登録できたエージェント数
+        failed (List[dict]): 再試行後も登録できなかった登録要求
+        errors (List[str]): 失敗したチャンクのエラー内容
+    """
+    registered: int = 0
+    failed: List[dict] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+
+class RegistrationPipeline:
+    """チャンク分割・並行送信・再試行を行うエージェント登録パイプライン"""
+
+    def __init__(self, client: EdgeClient, table: AgentIdTable, chunk_size: int = 1000,
+                 concurrency: int = 4, retries: int = 2, backoff: float = 0.5,
+                 timeout: float = 5):
+        self.client = client
+        self.table = table
+        self.chunk_size = max(1, chunk_size)
+        self.concurrency = max(1, concurrency)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.timeout = timeout
+
+    def split(self, registrations: List[dict]) -> List[List[dict]]:
+        """登録要求をチャンクに分ける"""
+        return [registrations[i:i + self.chunk_size]
+                for i in range(0, len(registrations), self.chunk_size)]
+
+    def _send_chunk(self, chunk: List[dict], retries: int, timeout: float) -> List[dict]:
+        """1チャンクを送信する（失敗時は指数バックオフで再試行）"""
+        for attempt in range(retries + 1):
+            try:
+                return self.client.register_agents(chunk, timeout=timeout)
+            except requests.RequestException:
+                if attempt == retries:
+                    raise
+                time.sleep(self.backoff * (2 ** attempt))
+
+    def send_chunks(self, chunks: List[List[dict]], retries: Optional[int] = None,
+                    timeout: Optional[float] = None) -> Iterator[Tuple[int, List[dict], Optional[str]]]:
+        """チャンクを並行に送信し、完了した順にチャンクごとの結果を返す
+
+        Args:
+            chunks (List[List[dict]]): 送信するチャンク
+            retries (Optional[int]): 再試行回数（省略時は self.retries）
+            timeout (Optional[float]): タイムアウト（秒、省略時は self.timeout）
+
+        Yields:
+            Tuple[int, List[dict], Optional[str]]: チャンクの番号、登録できなかった要求、エラー内容
+        """
+        if not chunks:
+            return
+        retries = self.retries if retries is None else retries
+        timeout = self.timeout if timeout is None else timeout
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(chunks))) as executor:
+            futures = {executor.submit(self._send_chunk, chunk, retries, timeout): index
+                       for index, chunk in enumerate(chunks)}
+            # レスポンスの対応付けは呼び出し元のスレッドでのみ行う
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    response = future.result()
+                except requests.RequestException as e:
+                    yield index, chunks[index], str(e)
+                    continue
+                yield index, self.table.reconcile(chunks[index], response), None
+
+    def register(self, registrations: List[dict]) -> RegistrationResult:
+        """登録要求をチャンクに分けて並行に送信する（失敗したチャンクは待機して再試行する）
+
+        Args:
+            registrations (List[dict]): agentIdPrefix, kind, status, assets を持つ登録要求
+
+        Returns:
+            RegistrationResult: 登録結果
+        """
+        result = RegistrationResult()
+        chunks = self.split(registrations)
+        for index, missing, error in self.send_chunks(chunks):
+            result.registered += len(chunks[index]) - len(missing)
+            result.failed.extend(missing)
+            if error is not None:
+                result.errors.append(error)
+        return result
+
+
+class _PendingChunk:
+    """登録待ちのチャンクと次に送信してよい時刻"""
+
+    def __init__(self, requests_: List[dict], backoff: Backoff):
+        self.requests = requests_
+        self.backoff = backoff
+
+
+class RegistrationQueue:
+    """登録待ちの要求をチャンク単位で保持し、フレームごとに1回だけ送信する
+
+    step() は送信してよい時刻になったチャンクを並行送信数まで選び、再試行も待機もせずに
+    短いタイムアウトで1回だけ送信する。失敗したチャンクはチャンクごとの Backoff で
+    次に送信してよい時刻を決めて保持するため、Edgeが停止していてもフレームを止めない。
+    """
+
+    def __init__(self, pipeline: RegistrationPipeline, timeout: float = 1.0,
+                 backoff_base: float = 0.5, backoff_max: float = 30.0):
+        """
+        Args:
+            pipeline (RegistrationPipeline): チャンク分割と送信に使用する登録パイプライン
+            timeout (float): 1回の送信のタイムアウト（秒）
+            backoff_base (float): 失敗したチャンクの最初の待ち時間（秒）
+            backoff_max (float): 失敗したチャンクの待ち時間の上限（秒）
+        """
+        self.pipeline = pipeline
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._chunks: List[_PendingChunk] = []
+
+    def __len__(self) -> int:
+        """登録待ちの要求の数"""
+        return sum(len(chunk.requests) for chunk in self._chunks)
+
+    def add(self, registrations: List[dict]):
+        """登録要求を追加する（次の step() で送信する）"""
+        for chunk in self.pipeline.split(registrations):
+            self._chunks.append(_PendingChunk(chunk, Backoff(self.backoff_base, self.backoff_max)))
+
+    def add_failed(self, registrations: List[dict], now: float):
+        """登録に失敗した要求を追加する（バックオフの待ち時間が過ぎるまで送信しない）"""
+        for chunk in self.pipeline.split(registrations):
+            pending = _PendingChunk(chunk, Backoff(self.backoff_base, self.backoff_max))
+            pending.backoff.failure(now)
+            self._chunks.append(pending)
+
+    def drain(self) -> List[dict]:
+        """登録待ちの要求をすべて取り出す"""
+        registrations = [request for chunk in self._chunks for request in chunk.requests]
+        self._chunks = []
+        return registrations
+
+    def next_attempt(self) -> Optional[float]:
+        """最も早く送信できるチャンクの時刻（登録待ちがなければNone）"""
+        if not self._chunks:
+            return None
+        return min(chunk.backoff.next_attempt for chunk in self._chunks)
+
+    def take_ready(self, now: float) -> List[_PendingChunk]:
+        """送信してよい時刻になったチャンクを並行送信数まで取り出す"""
+        ready = [chunk for chunk in self._chunks if chunk.backoff.ready(now)]
+        ready = ready[:self.pipeline.concurrency]
+        if ready:
+            self._chunks = [chunk for chunk in self._chunks if chunk not in ready]
+        return ready
+
+    def _settle(self, pending: _PendingChunk, missing: List[dict], error: Optional[str],
+                now: float, result: RegistrationResult):
+        """送信したチャンクの結果を記録し、登録できなかった要求をバックオフ付きで戻す"""
+        result.registered += len(pending.requests) - len(missing)
+        if error is not None:
+            result.errors.append(error)
+        if missing:
+            pending.requests = missing
+            pending.backoff.failure(now)
+            self._chunks.append(pending)
+            result.failed.extend(missing)
+
+    def step(self, now: float) -> RegistrationResult:
+        """送信してよい時刻になったチャンクを1回だけ送信する
+
+        Args:
+            now (float): 現在時刻（time.monotonic()）
+
+        Returns:
+            RegistrationResult: 今回の送信の結果（failed は再び登録待ちになった要求）
+        """
+        result = RegistrationResult()
+        ready = self.take_ready(now)
+        sent = self.pipeline.send_chunks([chunk.requests for chunk in ready],
+                                         retries=0, timeout=self.timeout)
+        for index, missing, error in sent:
+            self._settle(ready[index], missing, error, now, result)
+        return result
+
+    async def step_async(self, client, now: float) -> RegistrationResult:
+        """step() の asyncio 版（AsyncEdgeClient で送信し、イベントループを止めない）
+
+        Args:
+            client (AsyncEdgeClient): 非同期Edgeクライアント
+            now (float): 現在時刻（time.monotonic()）
+
+        Returns:
+            RegistrationResult: 今回の送信の結果（failed は再び登録待ちになった要求）
+        """
+        result = RegistrationResult()
+        ready = self.take_ready(now)
+        responses = await asyncio.gather(
+            *(client.register_agents(chunk.requests, timeout=self.timeout) for chunk in ready),
+            return_exceptions=True)
+        now = time.monotonic()
+        for pending, response in zip(ready, responses):
+            if isinstance(response, Exception):
+                self._settle(pending, pending.requests, str(response) or type(response).__name__,
+                             now, result)
+            else:
+                missing = self.pipeline.table.reconcile(pending.requests, response)
+                self._settle(pending, missing, None, now, result)
+        return result
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+シナリオローダー
+
+エージェントの母集団・出現ルール・経路ライブラリをシナリオファイルで定義し、
+シミュレーターのコードを変更せずに大規模なシナリオを実行できるようにする。
+
+対応形式:
+- JSON / YAML（YAMLはPyYAMLがインストールされている場合のみ）
+- arktwin_firststep/*_agents.json と同じ登録要求のリスト
+- コンパクトなバイナリ形式（NumPy構造化配列の .npy をメモリマップで読み込み）
+
+シナリオの例::
+
+    {
+      "routes": {
+        "straight_ew": {"waypoints": [[-25, -1.5], [25, -1.5]], "speed": 8.0, "cycle_time": 12.0}
+      },
+      "agents": [
+        {"agentIdPrefix": "vehicle-001", "kind": "vehicle", "status": {}, "assets": {},
+         "route": "straight_ew", "position": [0.0, 0.0, 0.5]}
+      ],
+      "populations": [
+        {"agentIdPrefix": "vehicle-bulk", "kind": "vehicle", "count": 10000,
+         "routes": ["straight_ew"], "spawn": {"start": 0.0, "rate": 1000.0},
+         "phaseSpread": 24.0, "speedJitter": 0.1, "seed": 1}
+      ],
+      "agentFiles": [
+        {"path": "vehicles.npy", "agentIdPrefix": "vehicle-bin", "kind": "vehicle"}
+      ]
+    }
+
+母集団とバイナリファイルのエージェントはすべてをPythonオブジェクトとして保持せず、
+出現時刻の順にNumPy配列のバッチとして順次生成する。
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+try:
+    import yaml
+except ImportError:  # YAML形式のシナリオを使用しない場合は不要
+    yaml = None
+
+
+# バイナリ形式のエージェント表（出現時刻の昇順に並べる）
+AGENT_DTYPE = np.dtype([
+    ("x", "<f4"),
+    ("y", "<f4"),
+    ("z", "<f4"),
+    ("speed", "<f4"),    # NaNの場合は経路の速さを使用
+    ("phase", "<f4"),    # 経路上の時刻のずらし量（秒）
+    ("spawn", "<f4"),    # 出現時刻（秒）
+    ("route", "<i4"),    # 経路番号（routes の定義順、-1は経路なし）
+])
+
+# 1バッチあたりのエージェント数の既定値
+DEFAULT_BATCH_SIZE = 10000
+
+
+@dataclass
+class AgentBatch:
+    """同時に生成されたエージェントのまとまり
+
+    Attributes:
+        prefixes (List[str]): エージェントIDプレフィックス（登録要求のagentIdPrefix）
+        kind (str): エージェント種別
+        positions (np.ndarray): 初期位置 (n, 3)
+        route (np.ndarray): 経路番号 (n,)（-1は経路なし）
+        speed (np.ndarray): 速さ (n,)（NaNは経路の速さ）
+        phase (np.ndarray): 経路上の時刻のずらし量 (n,)
+        spawn (np.ndarray): 出現時刻 (n,)
+        status (List[dict]): 登録時のstatus
+        assets (List[dict]): 登録時のassets
+        speed_scale (np.ndarray): 速さの倍率 (n,)（speedJitter の個体差、省略時は1）
+    """
+    prefixes: List[str]
+    kind: str
+    positions: np.ndarray
+    route: np.ndarray
+    speed: np.ndarray
+    phase: np.ndarray
+    spawn: np.ndarray
+    status: List[dict]
+    assets: List[dict]
+    speed_scale: Optional[np.ndarray] = None
+
+    def __post_init__(self):
+        if self.speed_scale is None:
+            self.speed_scale = np.ones(len(self.prefixes))
+
+    def __len__(self) -> int:
+        return len(self.prefixes)
+
+    def split(self, count: int):
+        """先頭count件とそれ以外に分割する"""
+        def part(s: slice) -> "AgentBatch":
+            return AgentBatch(self.prefixes[s], self.kind, self.positions[s], self.route[s],
+                              self.speed[s], self.phase[s], self.spawn[s],
+                              self.status[s], self.assets[s], self.speed_scale[s])
+        return part(slice(None, count)), part(slice(count, None))
+
+    def registrations(self) -> List[dict]:
+        """ArkTwin Edgeへのエージェント登録要求を生成する"""
+        return [
+            {"agentIdPrefix": prefix, "kind": self.kind, "status": status, "assets": assets}
+            for prefix, status, assets in zip(self.prefixes, self.status, self.assets)
+        ]
+
+
+class Scenario:
+    """シナリオ定義
+
+    Attributes:
+        routes (Dict[str, dict]): 経路名から経路定義（waypoints, speed, cycle_time, mode）
+        route_names (List[str]): 経路番号順の経路名
+    """
+
+    def __init__(self, data, base_dir: str = "."):
+        # arktwin_firststep/*_agents.json 形式（登録要求のリスト）
+        if isinstance(data, list):
+            data = {"agents": data}
+        self.base_dir = base_dir
+        self.routes: Dict[str, dict] = dict(data.get("routes", {}))
+        self.route_names: List[str] = list(self.routes.keys())
+        self._route_index = {name: i for i, name in enumerate(self.route_names)}
+        self.agents: List[dict] = list(data.get("agents", []))
+        self.populations: List[dict] = list(data.get("populations", []))
+        self.agent_files: List[dict] = list(data.get("agentFiles", []))
+        for spec in self.agents:
+            self._check_route(spec.get("route"))
+        for spec in self.populations:
+            for name in spec.get("routes", []):
+                self._check_route(name)
+
+    def _check_route(self, name: Optional[str]):
+        if name is not None and name not in self._route_index:
+            raise ValueError(f"未定義の経路です: {name}")
+
+    @classmethod
+    def from_dict(cls, data, base_dir: str = ".") -> "Scenario":
+        return cls(data, base_dir=base_dir)
+
+    def route_start(self, route_index: np.ndarray) -> np.ndarray:
+        """経路番号ごとの始点 (n, 2) を返す（経路なしは原点）"""
+        starts = np.array([self.routes[name]["waypoints"][0] for name in self.route_names]
+                          + [(0.0, 0.0)], dtype=float).reshape(-1, 2)
+        return starts[route_index]
+
+    def iter_sources(self, kind: Optional[str] = None,
+                     batch_size: int = DEFAULT_BATCH_SIZE) -> List[Iterator[AgentBatch]]:
+        """エージェントの供給元ごとのバッチイテレーターを返す
+
+        各イテレーターは出現時刻の昇順にバッチを生成する。
+
+        Args:
+            kind (Optional[str]): 指定した種別のエージェントのみを対象にする
+            batch_size (int): 1バッチあたりの最大エージェント数
+        """
+        sources = []
+        agents = [spec for spec in self.agents if kind is None or spec.get("kind") == kind]
+        if agents:
+            sources.append(self._iter_explicit(agents))
+        for spec in self.populations:
+            if kind is None or spec.get("kind") == kind:
+                sources.append(self._iter_population(spec, batch_size))
+        for spec in self.agent_files:
+            if kind is None or spec.get("kind") == kind:
+                sources.append(self._iter_binary(spec, batch_size))
+        return sources
+
+    def _iter_explicit(self, agents: List[dict]) -> Iterator[AgentBatch]:
+        """agents に列挙されたエージェントを種別ごとに1バッチずつ生成する"""
+        agents = sorted(agents, key=lambda spec: spec.get("spawn", 0.0))
+        kinds = list(dict.fromkeys(spec.get("kind", "unknown") for spec in agents))
+        batches = []
+        for kind in kinds:
+            specs = [spec for spec in agents if spec.get("kind", "unknown") == kind]
+            route = np.array([self._route_index.get(spec.get("route"), -1) for spec in specs],
+                             dtype=np.int32)
+            positions = np.zeros((len(specs), 3))
+            positions[:, :2] = self.route_start(route)
+            for i, spec in enumerate(specs):
+                if "position" in spec:
+                    position = list(spec["position"]) + [0.0] * (3 - len(spec["position"]))
+                    positions[i] = position[:3]
+            batches.append(AgentBatch(
+                prefixes=[spec["agentIdPrefix"] for spec in specs],
+                kind=kind,
+                positions=positions,
+                route=route,
+                speed=np.array([spec.get("speed", np.nan) for spec in specs], dtype=float),
+                phase=np.array([spec.get("phase", 0.0) for spec in specs], dtype=float),
+                spawn=np.array([spec.get("spawn", 0.0) for spec in specs], dtype=float),
+                status=[spec.get("status", {}) for spec in specs],
+                assets=[spec.get("assets", {}) for spec in specs],
+            ))
+        # 種別が混在する場合も出現時刻の昇順を保つ
+        batches.sort(key=lambda batch: batch.spawn[0])
+        yield from batches
+
+    def _iter_population(self, spec: dict, batch_size: int) -> Iterator[AgentBatch]:
+        """母集団の定義からエージェントを順次生成する
+
+        spawn.rate（体/秒）を指定した場合は spawn.start から一定間隔で出現させる。
+        """
+        count = int(spec["count"])
+        prefix = spec["agentIdPrefix"]
+        kind = spec.get("kind", "unknown")
+        rng = np.random.default_rng(spec.get("seed"))
+        spawn_rule = spec.get("spawn", {})
+        spawn_start = float(spawn_rule.get("start", 0.0))
+        spawn_rate = spawn_rule.get("rate")
+        routes = np.array([self._route_index[name] for name in spec.get("routes", [])], dtype=np.int32)
+        area = spec.get("area")
+        height = float(spec.get("z", 0.0))
+        speed_jitter = float(spec.get("speedJitter", 0.0))
+        phase_spread = float(spec.get("phaseSpread", 0.0))
+        status = spec.get("status", {})
+        assets = spec.get("assets", {})
+
+        for start in range(0, count, batch_size):
+            n = min(batch_size, count - start)
+            index = np.arange(start, start + n)
+            if len(routes):
+                route = routes[rng.integers(0, len(routes), n)]
+            else:
+                route = np.full(n, -1, dtype=np.int32)
+            positions = np.full((n, 3), height)
+            if area is not None:
+                min_x, min_y, max_x, max_y = area
+                positions[:, 0] = rng.uniform(min_x, max_x, n)
+                positions[:, 1] = rng.uniform(min_y, max_y, n)
+            else:
+                positions[:, :2] = self.route_start(route)
+            if "speed" in spec:
+                speed = np.full(n, float(spec["speed"]))
+            else:
+                speed = np.full(n, np.nan)
+            # 個体差は倍率として持ち、経路の速さを使う（NaN）かどうかは変えない
+            if speed_jitter:
+                speed_scale = 1.0 + rng.uniform(-speed_jitter, speed_jitter, n)
+            else:
+                speed_scale = np.ones(n)
+            if spawn_rate:
+                spawn = spawn_start + index / float(spawn_rate)
+            else:
+                spawn = np.full(n, spawn_start)
+            yield AgentBatch(
+                prefixes=[f"{prefix}-{i:06d}" for i in index],
+                kind=kind,
+                positions=positions,
+                route=route,
+                speed=speed,
+                phase=rng.uniform(0.0, phase_spread, n) if phase_spread else np.zeros(n),
+                spawn=spawn,
+                status=[status] * n,
+                assets=[assets] * n,
+                speed_scale=speed_scale,
+            )
+
+    def _iter_binary(self, spec: dict, batch_size: int) -> Iterator[AgentBatch]:
+        """バイナリ形式のエージェント表をメモリマップで少しずつ読み込む"""
+        path = os.path.join(self.base_dir, spec["path"])
+        table = np.load(path, mmap_mode="r")
+        if table.dtype != AGENT_DTYPE:
+            raise ValueError(f"エージェント表の形式が不正です: {path}")
+        prefix = spec["agentIdPrefix"]
+        kind = spec.get("kind", "unknown")
+        status = spec.get("status", {})
+        assets = spec.get("assets", {})
+        for start in range(0, len(table), batch_size):
+            rows = np.array(table[start:start + batch_size])
+            n = len(rows)
+            yield AgentBatch(
+                prefixes=[f"{prefix}-{i:06d}" for i in range(start, start + n)],
+                kind=kind,
+                positions=np.stack([rows["x"], rows["y"], rows["z"]], axis=1).astype(float),
+                route=rows["route"].astype(np.int32),
+                speed=rows["speed"].astype(float),
+                phase=rows["phase"].astype(float),
+                spawn=rows["spawn"].astype(float),
+                status=[status] * n,
+                assets=[assets] * n,
+            )
+
+
+class SpawnStream:
+    """シナリオのエージェントを出現時刻に従って順次取り出す
+
+    供給元ごとに次のバッチを1つだけ先読みし、due(t) で時刻t までに
+    出現すべきエージェントのみを返す。
+    """
+
+    def __init__(self, scenario: Scenario, kind: Optional[str] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE):
+        self._sources = scenario.iter_sources(kind=kind, batch_size=batch_size)
+        self._pending: List[Optional[AgentBatch]] = [None] * len(self._sources)
+
+    @property
+    def exhausted(self) -> bool:
+        return not self._sources
+
+    def due(self, t: float) -> List[AgentBatch]:
+        """時刻tまでに出現するエージェントのバッチを取り出す"""
+        batches = []
+        finished = []
+        for i, source in enumerate(self._sources):
+            while True:
+                batch = self._pending[i]
+                if batch is None:
+                    batch = next(source, None)
+                    if batch is None:
+                        finished.append(i)
+                        break
+                # バッチ内は出現時刻の昇順
+                count = int(np.searchsorted(batch.spawn, t, side="right"))
+                if count == 0:
+                    self._pending[i] = batch
+                    break
+                if count < len(batch):
+                    ready, rest = batch.split(count)
+                    batches.append(ready)
+                    self._pending[i] = rest
+                    break
+                batches.append(batch)
+                self._pending[i] = None
+        for i in reversed(finished):
+            del self._sources[i]
+            del self._pending[i]
+        return batches
+
+
+def load_scenario(path: str) -> Scenario:
+    """シナリオファイルを読み込む
+
+    拡張子が .yaml / .yml の場合はYAML、それ以外はJSONとして読み込む。
+
+    Args:
+        path (str): シナリオファイルのパス
+
+    Returns:
+        Scenario: シナリオ
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise RuntimeError("YAML形式のシナリオには PyYAML が必要です (pip install pyyaml)")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    return Scenario.from_dict(data, base_dir=os.path.dirname(os.path.abspath(path)))
+
+
+def save_agent_table(path: str, table: np.ndarray):
+    """エージェント表をバイナリ形式で保存する（出現時刻の昇順に並べ替える）
+
+    Args:
+        path (str): 保存先（.npy）
+        table (np.ndarray): AGENT_DTYPE の構造化配列
+    """
+    table = np.asarray(table, dtype=AGENT_DTYPE)
+    np.save(path, table[np.argsort(table["spawn"], kind="stable")])
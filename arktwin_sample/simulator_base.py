@@ -0,0 +1,788 @@
+#!/usr/bin/env python3
+"""
+シミュレーターの共通処理
+
+車両シミュレーターと歩行者シミュレーターに共通する処理をまとめた基底クラスとコマンドライン。
+エージェントの出現と登録、軌道による位置更新、変換行列の送信、近隣情報の受信、
+同期実行ループと asyncio 実行ループ、コマンドライン引数の解析を提供する。
+
+各シミュレーターはエージェントの種別と表示名、既定のシナリオ、
+近隣情報を受信した後の処理（車両の制動距離内の歩行者検索など）のみを定義する。
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+import requests
+
+from agent_store import AgentStore
+from edge_client import AsyncEdgeClient, gather_within_deadline, get_edge_client
+from frame_profiler import FrameProfiler, start_reporting
+from neighbor_cache import NeighborCache
+from registration import AgentIdTable, RegistrationPipeline, RegistrationQueue, RegistrationResult
+from scenario import AgentBatch, Scenario, SpawnStream, load_scenario
+from trajectory import MODE_PING_PONG, TrajectorySet
+from transform_publisher import TransformPublisher
+from transform_serializer import TransformSerializer, create_serializer
+
+
+# 状態表示で個別に表示するエージェント数の上限
+STATUS_DISPLAY_LIMIT = 10
+
+# シミュレーション更新間隔: 100ms（10Hz）
+UPDATE_INTERVAL = 0.1
+
+# 変更検出を使わずに近隣情報を全件取得し直す間隔（シミュレーション時間の秒）
+NEIGHBOR_REFRESH_INTERVAL = 5.0
+
+
+class SimulatorBase:
+    """シミュレーターの基底クラス
+
+    ArkTwin Edgeを通じてエージェントの位置情報を管理し、
+    他のシミュレーターとの近隣情報を共有する。
+
+    サブクラスは次のクラス属性を定義する。
+
+    Attributes:
+        KIND (str): 管理するエージェントの種別（agentIdPrefix の先頭）
+        LABEL (str): 管理するエージェントの表示名
+        UNIT (str): 管理するエージェントの数え方
+        OTHER_KIND (str): 主に検出する他のエージェントの種別
+        OTHER_LABEL (str): 主に検出する他のエージェントの表示名
+        OTHER_UNIT (str): 主に検出する他のエージェントの数え方
+        HEIGHT (float): エージェントの高さ（メートル）
+        DEFAULT_PORT (int): ArkTwin Edgeの既定のポート番号
+        DEFAULT_SCENARIO (dict): 既定のシナリオ（--scenario 未指定時）
+    """
+
+    KIND = ""
+    LABEL = ""
+    UNIT = ""
+    OTHER_KIND = ""
+    OTHER_LABEL = ""
+    OTHER_UNIT = ""
+    HEIGHT = 0.0
+    DEFAULT_PORT = 2237
+    DEFAULT_SCENARIO: dict = {"routes": {}, "agents": []}
+
+    def __init__(self, edge_port: Optional[int] = None, pool_size: int = 4,
+                 scenario: Optional[Scenario] = None, register_chunk_size: int = 1000,
+                 register_concurrency: int = 4, register_retries: int = 2,
+                 publisher: Optional[TransformPublisher] = None,
+                 serializer: Optional[TransformSerializer] = None,
+                 profiler: Optional[FrameProfiler] = None, request_timeout: float = 1.0):
+        # ArkTwin EdgeのREST APIエンドポイント
+        self.edge_url = f"http://127.0.0.1:{edge_port or self.DEFAULT_PORT}"
+        # キープアライブ接続をプールしたEdgeクライアント（Edgeごとに共有）
+        # 登録チャンクの並行送信数以上の接続を確保する
+        self.edge_client = get_edge_client(self.edge_url,
+                                           pool_size=max(pool_size, register_concurrency))
+        # 非同期実行モードで使用する接続プールの大きさ
+        self.pool_size = pool_size
+        # 管理しているエージェントの状態（NumPy配列で一括管理）
+        self.agents = AgentStore()
+        # 近隣エージェント情報（他のシミュレーターからの情報、変更検出の差分で更新）
+        self.neighbors = NeighborCache()
+        # 近隣情報のレスポンスを失い、Edgeの変更検出の基準とずれている可能性があるか
+        # （Trueの場合は次の近隣検索で全件を取得し直す。起動時もEdgeの基準が不明なため全件から始める）
+        self.neighbors_desynced = True
+        # 最後に近隣情報を全件取得したシミュレーション時刻
+        self._neighbors_refreshed_at = -np.inf
+        # シミュレーション経過時間（秒）
+        self.simulation_time = 0.0
+        # シミュレーション実行状態フラグ
+        self.running = False
+        # エージェント登録時の実際のIDマッピング（prefix <-> actual_id、行番号はagentsと共通）
+        self.registered_agent_ids = AgentIdTable()
+        # チャンク分割・並行送信・再試行を行う登録パイプライン
+        self.registration = RegistrationPipeline(
+            self.edge_client,
+            self.registered_agent_ids,
+            chunk_size=register_chunk_size,
+            concurrency=register_concurrency,
+            retries=register_retries
+        )
+        # 差分送信の状態（Noneの場合は毎周期すべてのエージェントを送信）
+        self.publisher = publisher
+        # 変換行列送信用のリクエストボディを生成するシリアライザー
+        self.serializer = serializer or create_serializer()
+        # フレームの段階ごとの処理時間と期限超過の集計
+        self.profiler = profiler or FrameProfiler()
+        # 非同期実行モードで期限に間に合わず破棄したレスポンス数
+        self.dropped_responses = 0
+        # 変換行列送信と近隣検索のタイムアウト（秒）
+        self.request_timeout = request_timeout
+        # 変換行列送信・近隣情報受信のエラー数と、送信した変換行列のリクエスト数・バイト数
+        self.send_errors = 0
+        self.receive_errors = 0
+        self.sent_payloads = 0
+        self.sent_bytes = 0
+        # 非同期実行モードで送信中の登録（フレームはその完了を待たない）
+        self._registration_task: Optional[asyncio.Future] = None
+        # エージェントの配置と経路を定義するシナリオ
+        self.scenario = scenario or Scenario.from_dict(self.DEFAULT_SCENARIO)
+
+        # エージェントを初期化
+        self._initialize_agents()
+
+    def _initialize_agents(self):
+        """エージェントの初期配置
+
+        シナリオの経路を一度だけコンパイルし、時刻0に出現するエージェントを配置する。
+        以降に出現するエージェントはシミュレーション中に順次追加する。
+        """
+        self.agents = AgentStore()
+        self.trajectories = TrajectorySet()
+        # 経路番号から軌道エンジンの経路番号への対応
+        self._route_paths = [
+            self.trajectories.add_path(self.scenario.routes[name]["waypoints"])
+            for name in self.scenario.route_names
+        ]
+        self.spawner = SpawnStream(self.scenario, kind=self.KIND)
+        self.registered_agent_ids = AgentIdTable()
+        self.registration.table = self.registered_agent_ids
+        # 出現済みでArkTwin Edgeに未登録のエージェントの登録要求（失敗したチャンクは次の送信時刻まで待つ）
+        self.registration_queue = RegistrationQueue(self.registration)
+        self._spawn_agents()
+
+    def _spawn_agents(self) -> int:
+        """現在時刻までに出現するエージェントを追加
+
+        Returns:
+            int: 追加したエージェント数
+        """
+        added = 0
+        for batch in self.spawner.due(self.simulation_time):
+            rows = self.agents.add_many(batch.prefixes, batch.positions,
+                                        np.nan_to_num(batch.speed) * batch.speed_scale)
+            self._assign_routes(rows, batch)
+            self.registered_agent_ids.add_prefixes(batch.prefixes)
+            self.registration_queue.add(batch.registrations())
+            added += len(batch)
+        return added
+
+    def _assign_routes(self, rows: np.ndarray, batch: AgentBatch):
+        """出現したエージェントに経路を割り当てる
+
+        個別の速さが指定されたエージェントは経路の全長÷速さを周期とし、
+        それ以外は経路定義の速さと周期を使用する。
+        速さの倍率（speedJitter の個体差）は速さに掛け、経路定義の周期は倍率で割る。
+        """
+        for route_index in np.unique(batch.route):
+            if route_index < 0:
+                continue
+            route = self.scenario.routes[self.scenario.route_names[route_index]]
+            selected = batch.route == route_index
+            own_speed = batch.speed[selected]
+            scale = batch.speed_scale[selected]
+            uses_route_speed = np.isnan(own_speed)
+            self.trajectories.assign(
+                rows[selected],
+                self._route_paths[route_index],
+                np.where(uses_route_speed, route["speed"], own_speed) * scale,
+                mode=route.get("mode", MODE_PING_PONG),
+                cycle_time=np.where(uses_route_speed, route.get("cycle_time", np.nan) / scale, np.nan),
+                phase=batch.phase[selected]
+            )
+
+    def _register_pending_agents(self) -> RegistrationResult:
+        """出現済みで未登録のエージェントをArkTwin Edgeに登録（実行開始前）
+
+        登録要求をチャンクに分けて並行に送信し、実際に割り当てられた
+        エージェントIDを保存する。失敗したチャンクは待機して再試行し、
+        それでも登録できなかったエージェントは実行中に再登録する。
+
+        Returns:
+            RegistrationResult: 登録結果
+        """
+        pending = self.registration_queue.drain()
+        result = self.registration.register(pending)
+        self.registration_queue.add_failed(result.failed, time.monotonic())
+
+        if len(pending) <= STATUS_DISPLAY_LIMIT:
+            for request in pending:
+                prefix = request["agentIdPrefix"]
+                agent_id = self.registered_agent_ids.get(prefix)
+                if agent_id is not None:
+                    print(f"{self.LABEL} {prefix} -> エージェントID: {agent_id}")
+        self._print_registration(result)
+        return result
+
+    def _print_registration(self, result: RegistrationResult):
+        """登録結果を表示"""
+        for error in result.errors:
+            print(f"エージェント登録エラー: {error}")
+        if result.registered or not result.failed:
+            print(f"{self.LABEL}エージェント登録完了: {len(self.registered_agent_ids)}{self.UNIT}")
+        next_attempt = self.registration_queue.next_attempt()
+        if result.failed and next_attempt is not None:
+            delay = max(0.0, next_attempt - time.monotonic())
+            print(f"未登録の{self.LABEL}: {len(self.registration_queue)}{self.UNIT}（{delay:.1f}秒後に再登録）")
+
+    def _spawn_and_register(self):
+        """新たに出現したエージェントを追加し、ArkTwin Edgeに登録
+
+        フレームを止めないよう、送信してよい時刻になった登録待ちのチャンクを
+        再試行や待機をせずに1回だけ送信する。
+        """
+        self._spawn_agents()
+        if len(self.registration_queue):
+            result = self.registration_queue.step(time.monotonic())
+            if result.registered or result.errors:
+                self._print_registration(result)
+
+    async def _spawn_and_register_async(self, client: AsyncEdgeClient):
+        """新たに出現したエージェントを追加し、ArkTwin Edgeに登録（asyncioモード）
+
+        登録は AsyncEdgeClient でバックグラウンドのタスクとして送信し、フレームはその完了を待たない。
+        前のフレームまでに送信した登録が完了していれば結果を反映し、次の登録を送信する。
+        """
+        self._spawn_agents()
+        self._collect_registration()
+        if self._registration_task is None and len(self.registration_queue):
+            self._registration_task = asyncio.ensure_future(
+                self.registration_queue.step_async(client, time.monotonic()))
+
+    def _collect_registration(self):
+        """完了した非同期の登録の結果を表示"""
+        task = self._registration_task
+        if task is None or not task.done():
+            return
+        self._registration_task = None
+        result = task.result()
+        if result.registered or result.errors:
+            self._print_registration(result)
+
+    def setup_edge_connection(self):
+        """ArkTwin Edgeへの接続設定
+
+        座標系設定をスキップし、エージェントをArkTwin Edgeに登録する。
+
+        Returns:
+            bool: 接続と登録（少なくとも一部）が成功した場合True
+        """
+        try:
+            # 座標系設定は既に設定済みと仮定してスキップ
+            # 本来は座標系設定APIを呼び出す必要があるが、
+            # 設定ファイルで既に設定されているためここではスキップ
+            print("座標系設定をスキップ（既存設定を使用）")
+
+            # エージェント登録API呼び出し
+            result = self._register_pending_agents()
+
+        except requests.RequestException as e:
+            print(f"ArkTwin Edge接続エラー: {e}")
+            return False
+
+        # 一部のエージェントのみ登録できた場合は、残りを実行中に再登録する
+        return result.registered > 0 or not result.failed
+
+    def update_agents(self, dt: float):
+        """エージェント位置更新（交差点シミュレーション）
+
+        時間経過に応じてエージェントを経路に沿って移動させる。
+
+        Args:
+            dt (float): 前回更新からの経過時間（秒）
+        """
+        # 全エージェントの軌道を一括評価（経路は初期化時にコンパイル済み）
+        rows, x, y, direction, speed = self.trajectories.evaluate(self.simulation_time)
+        if len(rows):
+            self.agents.set_motion(rows, x, y, direction, speed, z=self.HEIGHT)
+
+    def _build_timestamp(self) -> dict:
+        """シミュレーション時刻をタイムスタンプ形式に変換"""
+        return {
+            "seconds": int(self.simulation_time),
+            "nanos": int((self.simulation_time % 1) * 1e9)
+        }
+
+    def _select_transform_rows(self) -> Optional[np.ndarray]:
+        """変換行列を送信するエージェントの行番号を選択
+
+        Edgeに未登録のエージェントは実際のIDがないため送信しない
+        （差分送信時は未送信のまま残り、登録後の最初の送信に含まれる）。
+
+        Returns:
+            Optional[np.ndarray]: 送信するエージェントの行番号（全エージェントを送信する場合はNone）
+        """
+        bound = self.registered_agent_ids.bound_mask(len(self.agents))
+        if self.publisher is None:
+            return None if bound.all() else np.flatnonzero(bound)
+        return self.publisher.select(self.agents.position, self.agents.heading_degrees(),
+                                     self.agents.velocity, self.simulation_time, eligible=bound)
+
+    def _build_transforms_payload(self, rows: Optional[np.ndarray] = None) -> bytes:
+        """変換行列送信用のリクエストボディを構築
+
+        Args:
+            rows (Optional[np.ndarray]): 送信するエージェントの行番号（省略時は全エージェント）
+
+        Returns:
+            bytes: timestamp と agents を持つ更新要求のJSON
+        """
+        timestamp = self._build_timestamp()
+
+        # 各エージェントの変換行列データを構築
+        # 実際に登録されたエージェントIDを使用
+        # プレフィックスではなく、Edge側で生成された実際のIDを使用する（行番号はagentsと共通）
+        agent_ids = self.registered_agent_ids.agent_ids
+        positions = self.agents.position
+        rotations = self.agents.heading_degrees()
+        velocities = self.agents.velocity
+        if rows is not None:
+            agent_ids = [agent_ids[row] for row in rows.tolist()]
+            positions = positions[rows]
+            rotations = rotations[rows]
+            velocities = velocities[rows]
+        # 定数部分はシリアライザーのテンプレートを使い、配列から直接JSONを生成する
+        return self.serializer.serialize(timestamp, agent_ids, positions, rotations, velocities)
+
+    def build_transforms(self) -> Optional[bytes]:
+        """送信する変換行列のリクエストボディを生成
+
+        Returns:
+            Optional[bytes]: リクエストボディ（送信するエージェントがなければNone）
+        """
+        rows = self._select_transform_rows()
+        if rows is not None and len(rows) == 0:
+            # 登録済みのエージェントがない、または差分送信時に変化したエージェントがなければ送信しない
+            return None
+        return self._build_transforms_payload(rows)
+
+    def put_transforms(self, data: bytes):
+        """生成した変換行列をArkTwin Edgeに送信
+
+        Args:
+            data (bytes): build_transforms() で生成したリクエストボディ
+        """
+        try:
+            self.edge_client.put_transforms(data, timeout=self.request_timeout)
+        except requests.RequestException as e:
+            self.send_errors += 1
+            print(f"変換行列送信エラー: {e}")
+            return
+        self.sent_payloads += 1
+        self.sent_bytes += len(data)
+        if self.publisher is not None:
+            self.publisher.commit()
+
+    def send_transforms(self):
+        """ArkTwinに変換行列を送信
+
+        各エージェントの現在位置、回転、速度情報をArkTwin Edgeに送信し、
+        他のシミュレーターが近隣情報として受信できるようにする。
+        """
+        data = self.build_transforms()
+        if data is not None:
+            self.put_transforms(data)
+
+    def _build_neighbor_query(self) -> dict:
+        """近隣エージェント検索クエリを構築
+
+        Edgeは応答のたびに変更検出の基準（前回返したエージェント）を進めるため、
+        レスポンスを失うとその差分（Unrecognized など）は二度と届かない。
+        レスポンスを失った後と一定間隔ごとは変更検出を無効にして全件を取得し直す。
+        """
+        refresh = (self.neighbors_desynced or
+                   self.simulation_time - self._neighbors_refreshed_at >= NEIGHBOR_REFRESH_INTERVAL)
+        return {
+            "timestamp": self._build_timestamp(),
+            "neighborsNumber": 50,          # 最大50個のエージェントを取得
+            "changeDetection": not refresh  # 全件を取得し直す場合以外は変更検出を有効にする
+        }
+
+    def _handle_neighbors_response(self, data: dict, complete: bool = False):
+        """近隣エージェント検索のレスポンスを反映
+
+        Args:
+            data (dict): 近隣エージェント検索のレスポンス
+            complete (bool): 変更検出を無効にした全件のレスポンスかどうか
+        """
+        if "neighbors" in data:
+            # 変更検出の結果（追加・更新・削除）を差分として適用
+            # 全件のレスポンスの場合は含まれないエージェントを削除する
+            self.neighbors.apply(data["neighbors"], complete=complete)
+            if complete:
+                self.neighbors_desynced = False
+                self._neighbors_refreshed_at = self.simulation_time
+            # 他のシミュレーターからのエージェント情報を表示
+            # 他の種別のIDで始まるエージェントを索引から取得
+            others = self.neighbors.by_prefix(self.OTHER_KIND)
+            if others:
+                print(f"[{self.LABEL}] 検出した{self.OTHER_LABEL}: {len(others)}{self.OTHER_UNIT}")
+
+    def _handle_neighbors_failure(self):
+        """近隣エージェント検索のレスポンスを失った（エラー・タイムアウト・期限超過で破棄）
+
+        Edgeが応答済みで変更検出の基準を進めている可能性があるため、次の検索で全件を取得し直す。
+        """
+        self.neighbors_desynced = True
+
+    def receive_neighbors(self):
+        """近隣エージェント情報を受信
+
+        ArkTwin Edgeから近隣のエージェント情報を取得し、
+        他のシミュレーターのエージェントの存在を認識できるようにする。
+        """
+        query = self._build_neighbor_query()
+
+        try:
+            data = self.edge_client.query_neighbors(query, timeout=self.request_timeout)
+            self._handle_neighbors_response(data, complete=not query["changeDetection"])
+
+        except requests.RequestException as e:
+            self.receive_errors += 1
+            self._handle_neighbors_failure()
+            print(f"近隣情報受信エラー: {e}")
+
+    def local_stages(self) -> List[Tuple[str, Callable[[], object]]]:
+        """近隣情報の受信後に毎フレーム実行する処理（段階名と処理の組、既定はなし）"""
+        return []
+
+    def _status_label(self, row: int, prefix: str) -> str:
+        """状態表示でエージェントを示す文字列"""
+        return prefix
+
+    def print_status(self):
+        """シミュレーション状態表示
+
+        現在のシミュレーション時刻、各エージェントの状態、
+        検出された近隣エージェント情報をコンソールに表示する。
+        """
+        # シミュレーション状態のヘッダー表示
+        print(f"\n=== {self.LABEL}シミュレーター [停止テスト] (時刻: {self.simulation_time:.1f}s) ===")
+        # 各エージェントの状態を表示（数が多い場合は先頭のみ）
+        positions = self.agents.position
+        speeds = self.agents.speed
+        for row, prefix in enumerate(self.agents.ids[:STATUS_DISPLAY_LIMIT]):
+            print(f"{self._status_label(row, prefix)}: 位置({positions[row, 0]:.1f}, {positions[row, 1]:.1f}) "
+                  f"速度:{speeds[row]:.1f}m/s")
+        if len(self.agents) > STATUS_DISPLAY_LIMIT:
+            print(f"... 他 {len(self.agents) - STATUS_DISPLAY_LIMIT}{self.UNIT}")
+
+        # 近隣エージェント情報の表示
+        if self.neighbors:
+            # 自分と同じ種別以外のエージェントを表示
+            other_agents = [agent_id for prefix, agent_ids in self.neighbors.prefixes()
+                            if prefix != self.KIND for agent_id in agent_ids]
+            if other_agents:
+                print(f"他のエージェント: {len(other_agents)}個")
+                for agent_id in sorted(other_agents)[:STATUS_DISPLAY_LIMIT]:
+                    print(f"  - {agent_id}")
+                if len(other_agents) > STATUS_DISPLAY_LIMIT:
+                    print(f"  ... 他 {len(other_agents) - STATUS_DISPLAY_LIMIT}個")
+            else:
+                print("他のエージェント: なし")
+        else:
+            print("近隣情報: なし")
+
+    def _status_due(self, dt: float) -> bool:
+        """1秒毎の状態表示の時刻かどうか"""
+        return int(self.simulation_time) % 1 == 0 and self.simulation_time % 1 < dt
+
+    def _print_summary(self):
+        """実行終了時の集計を表示"""
+        if self.profiler.frames:
+            print(self.profiler.summary())
+        if self.dropped_responses:
+            print(f"期限超過で破棄したレスポンス: {self.dropped_responses}件")
+        if self.send_errors or self.receive_errors:
+            print(f"送信エラー: {self.send_errors}件 / 受信エラー: {self.receive_errors}件")
+        if self.publisher is not None:
+            print(f"差分送信の送信率: {self.publisher.send_ratio:.1%}")
+
+    def step(self, dt: float) -> float:
+        """1フレームを実行
+
+        登録、位置更新、変換行列の生成と送信、近隣情報の受信、近隣情報を使う処理、
+        状態表示を順に行い、段階ごとの処理時間をプロファイラーに記録する。
+
+        Args:
+            dt (float): シミュレーション更新間隔（秒）
+
+        Returns:
+            float: フレーム全体の処理時間（秒）
+        """
+        profiler = self.profiler
+        profiler.start_frame()
+        profiler.phase("register")
+        self._spawn_and_register()         # 新たに出現したエージェントを登録
+        profiler.phase("update")
+        self.update_agents(dt)             # エージェント位置更新
+        profiler.phase("serialize")
+        data = self.build_transforms()     # 送信する変換行列を生成
+        if data is not None:
+            profiler.phase("send")
+            self.put_transforms(data)      # 位置情報をArkTwinに送信
+        profiler.phase("receive")
+        self.receive_neighbors()           # 近隣情報を受信
+        for name, stage in self.local_stages():
+            profiler.phase(name)
+            stage()
+
+        # 1秒毎に状態表示（デバッグ用）
+        if self._status_due(dt):
+            profiler.phase("status")
+            self.print_status()
+
+        self.simulation_time += dt
+        return profiler.end_frame()
+
+    def run(self):
+        """シミュレーション実行
+
+        メインのシミュレーションループ。
+        ArkTwin Edgeへの接続、エージェント登録を行った後、
+        定期的な位置更新と近隣情報受信を実行する。
+        """
+        # ArkTwin Edgeへの接続とエージェント登録
+        if not self.setup_edge_connection():
+            print("ArkTwin Edge接続に失敗しました")
+            return
+
+        self.running = True
+        dt = UPDATE_INTERVAL
+        profiler = self.profiler
+        profiler.budget = dt
+
+        print(f"{self.LABEL}シミュレーション開始（テスト用：停止状態）...")
+        print("Ctrl+Cで停止")
+
+        try:
+            while self.running:
+                # 1フレームを実行（段階ごとの処理時間を記録し、フレームレート制御にも使用）
+                elapsed = self.step(dt)
+
+                # フレームレート制御（指定された更新間隔を維持）
+                sleep_time = max(0, dt - elapsed)
+                time.sleep(sleep_time)
+
+        except KeyboardInterrupt:
+            print("\nシミュレーション停止")
+        finally:
+            self.running = False
+            self._print_summary()
+
+    async def _exchange_async(self, client: AsyncEdgeClient, deadline: float):
+        """変換行列送信と近隣検索を並行して実行
+
+        PUTと近隣検索のPOSTを同時に送信し、フレームの期限までに
+        届いたレスポンスのみを反映する。期限を過ぎたリクエストは
+        キャンセルし、次のフレームを遅らせない。
+
+        Args:
+            client (AsyncEdgeClient): 非同期Edgeクライアント
+            deadline (float): イベントループ時刻でのフレーム期限
+        """
+        query = self._build_neighbor_query()
+        tasks = {
+            "neighbors": asyncio.ensure_future(
+                client.query_neighbors(query, timeout=self.request_timeout)),
+        }
+        data = self.build_transforms()
+        if data is not None:
+            tasks["transforms"] = asyncio.ensure_future(
+                client.put_transforms(data, timeout=self.request_timeout))
+        results = await gather_within_deadline(tasks, deadline)
+        self.dropped_responses += len(tasks) - len(results)
+
+        transforms_result = results.get("transforms")
+        if isinstance(transforms_result, Exception):
+            self.send_errors += 1
+            print(f"変換行列送信エラー: {transforms_result}")
+        elif "transforms" in results:
+            self.sent_payloads += 1
+            self.sent_bytes += len(data)
+            if self.publisher is not None:
+                # 期限内に送信が完了した場合のみ送信済みとして記録する
+                self.publisher.commit()
+
+        neighbors_result = results.get("neighbors")
+        if isinstance(neighbors_result, Exception):
+            self.receive_errors += 1
+            self._handle_neighbors_failure()
+            print(f"近隣情報受信エラー: {neighbors_result}")
+        elif "neighbors" in results:
+            self._handle_neighbors_response(neighbors_result, complete=not query["changeDetection"])
+        else:
+            # 期限に間に合わず破棄した
+            self._handle_neighbors_failure()
+
+    async def step_async(self, client: AsyncEdgeClient, dt: float, deadline: float) -> float:
+        """1フレームを実行（asyncioモード）
+
+        step() と同じ順序で処理し、変換行列送信と近隣情報受信は期限まで並行して行う。
+
+        Args:
+            client (AsyncEdgeClient): 非同期Edgeクライアント
+            dt (float): シミュレーション更新間隔（秒）
+            deadline (float): イベントループ時刻でのフレーム期限
+
+        Returns:
+            float: フレーム全体の処理時間（秒）
+        """
+        profiler = self.profiler
+        profiler.start_frame()
+        profiler.phase("register")
+        await self._spawn_and_register_async(client)
+        profiler.phase("update")
+        self.update_agents(dt)
+        profiler.phase("exchange")
+        await self._exchange_async(client, deadline)
+        self._collect_registration()
+        for name, stage in self.local_stages():
+            profiler.phase(name)
+            stage()
+
+        # 1秒毎に状態表示（デバッグ用）
+        if self._status_due(dt):
+            profiler.phase("status")
+            self.print_status()
+
+        self.simulation_time += dt
+        return profiler.end_frame()
+
+    async def run_async(self, transport=None):
+        """シミュレーション実行（asyncioモード）
+
+        run() と同じ更新サイクルを asyncio 上で実行する。
+        変換行列送信と近隣情報受信を並行して行い、各フレームの期限
+        （更新間隔）を超えたレスポンスは破棄する。実行中の登録はバックグラウンドで送信し、
+        フレームはその完了を待たない。
+
+        Args:
+            transport: AsyncEdgeClient のトランスポート（省略時はaiohttp）
+        """
+        # ArkTwin Edgeへの接続とエージェント登録（イベントループを止めないよう別スレッドで実行）
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, self.setup_edge_connection):
+            print("ArkTwin Edge接続に失敗しました")
+            return
+
+        client = AsyncEdgeClient(self.edge_url, pool_size=self.pool_size, transport=transport)
+        self.running = True
+        dt = UPDATE_INTERVAL
+        profiler = self.profiler
+        profiler.budget = dt
+
+        print(f"{self.LABEL}シミュレーション開始（asyncioモード）...")
+        print("Ctrl+Cで停止")
+
+        try:
+            while self.running:
+                # フレーム開始時刻と期限を記録
+                start_time = loop.time()
+                deadline = start_time + dt
+
+                # シミュレーション更新サイクル
+                await self.step_async(client, dt, deadline)
+
+                # 次のフレーム開始まで待機
+                await asyncio.sleep(max(0, deadline - loop.time()))
+
+        except asyncio.CancelledError:
+            print("\nシミュレーション停止")
+        finally:
+            self.running = False
+            if self._registration_task is not None:
+                self._registration_task.cancel()
+                await asyncio.gather(self._registration_task, return_exceptions=True)
+                self._registration_task = None
+            await client.close()
+            self._print_summary()
+
+
+def create_arg_parser(simulator_class) -> argparse.ArgumentParser:
+    """シミュレーター共通のコマンドライン引数の解析設定を作成
+
+    Args:
+        simulator_class: SimulatorBase のサブクラス（表示名と既定値を参照する）
+    """
+    label = simulator_class.LABEL
+    port = simulator_class.DEFAULT_PORT
+    default_count = f"{len(simulator_class.DEFAULT_SCENARIO.get('agents', []))}{simulator_class.UNIT}"
+
+    parser = argparse.ArgumentParser(description=f"ArkTwin{label}シミュレーター")
+    parser.add_argument("--port", type=int, default=port,
+                       help=f"ArkTwin Edgeポート番号 (デフォルト: {port})")
+    parser.add_argument("--pool-size", type=int, default=4,
+                       help="Edgeへのキープアライブ接続プールの大きさ (デフォルト: 4)")
+
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                       help="asyncioモードで実行（変換行列送信と近隣検索を並行実行）")
+
+    parser.add_argument("--scenario", type=str, default=None,
+                       help=f"シナリオファイル (JSON/YAML)。未指定時は既定の{default_count}")
+
+    parser.add_argument("--register-chunk-size", type=int, default=1000,
+                       help=f"1回の登録リクエストに含める{label}数 (デフォルト: 1000)")
+    parser.add_argument("--register-concurrency", type=int, default=4,
+                       help="並行して送信する登録リクエスト数 (デフォルト: 4)")
+    parser.add_argument("--register-retries", type=int, default=2,
+                       help="登録リクエスト失敗時の再試行回数 (デフォルト: 2)")
+
+    parser.add_argument("--delta", action="store_true",
+                       help=f"位置・回転が変化した{label}のみ変換行列を送信する")
+    parser.add_argument("--position-epsilon", type=float, default=0.01,
+                       help="差分送信の位置のしきい値（メートル） (デフォルト: 0.01)")
+    parser.add_argument("--rotation-epsilon", type=float, default=0.5,
+                       help="差分送信の回転のしきい値（度） (デフォルト: 0.5)")
+    parser.add_argument("--full-refresh", type=float, default=1.0,
+                       help="差分送信時に変化がなくても再送する間隔（秒） (デフォルト: 1.0)")
+    parser.add_argument("--serializer", choices=["template", "dict"], default="template",
+                       help="変換行列のJSON生成方法 (デフォルト: template)")
+
+    parser.add_argument("--stats-port", type=int, default=None,
+                       help="フレームの段階別統計（/stats, /frames, /profile）を返すローカルのポート。0で空きポート")
+    parser.add_argument("--stats-dump", type=str, default=None,
+                       help="フレームの段階別統計を一定間隔で書き出すJSONファイル")
+    parser.add_argument("--stats-dump-interval", type=float, default=10.0,
+                       help="フレームの段階別統計を書き出す間隔（秒） (デフォルト: 10.0)")
+    parser.add_argument("--profile", action="store_true",
+                       help="サンプリングプロファイラーを起動時に開始する（--stats-port の POST /profile/start でも開始可）")
+    parser.add_argument("--profile-interval", type=float, default=0.005,
+                       help="サンプリングプロファイラーの採取間隔（秒） (デフォルト: 0.005)")
+    return parser
+
+
+def run_main(simulator_class):
+    """コマンドライン引数を解析し、シミュレーターを起動する
+
+    Args:
+        simulator_class: 起動する SimulatorBase のサブクラス
+    """
+    args = create_arg_parser(simulator_class).parse_args()
+
+    # シミュレーター作成と実行
+    scenario = load_scenario(args.scenario) if args.scenario else None
+    publisher = None
+    if args.delta:
+        publisher = TransformPublisher(position_epsilon=args.position_epsilon,
+                                       rotation_epsilon=args.rotation_epsilon,
+                                       full_refresh_interval=args.full_refresh)
+    simulator = simulator_class(edge_port=args.port, pool_size=args.pool_size,
+                                scenario=scenario,
+                                register_chunk_size=args.register_chunk_size,
+                                register_concurrency=args.register_concurrency,
+                                register_retries=args.register_retries,
+                                publisher=publisher,
+                                serializer=create_serializer(args.serializer))
+    reporters = start_reporting(simulator.profiler, stats_port=args.stats_port,
+                                dump_path=args.stats_dump, dump_interval=args.stats_dump_interval,
+                                sampling=args.profile, sampling_interval=args.profile_interval)
+    try:
+        if args.use_async:
+            try:
+                asyncio.run(simulator.run_async())
+            except KeyboardInterrupt:
+                print("\nシミュレーション停止")
+        else:
+            simulator.run()
+    finally:
+        for reporter in reporters:
+            reporter.stop()
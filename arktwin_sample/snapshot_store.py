@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+スナップショットストア
+
+プロキシの更新スレッドが統合したエージェント情報と統計情報を、
+変更しないスナップショットとしてバージョン番号付きで公開する。
+
+公開は参照の置き換え1回で行うため、HTTP・WebSocketのハンドラーは
+ロックなしで常に一貫した（同じ更新周期の）状態を読み出せる。
+スナップショットのJSONは最初に要求された時に1回だけ生成してキャッシュし、
+同じバージョンへの同時リクエストで同じ状態を繰り返し変換しない。
+新しいスナップショットを待つ読み出し側（ロングポーリング）は公開時に起こされる。
+"""
+
+import copy
+import threading
+import time
+from typing import List, Optional
+
+from transform_serializer import dumps
+
+
+class Snapshot:
+    """ある更新周期のエージェント情報と統計情報（生成後は変更しない）
+
+    Attributes:
+        version (int): 公開ごとに増えるバージョン番号（0は未取得）
+        timestamp (Optional[float]): データの更新時刻
+        vehicles (List[dict]): 車両エージェント
+        pedestrians (List[dict]): 歩行者エージェント
+        stats (dict): 統計情報
+        etag (str): HTTPのETag（ストアの識別子とバージョン番号。プロセスを再起動すると変わる）
+    """
+
+    __slots__ = ("version", "timestamp", "vehicles", "pedestrians", "stats", "etag",
+                 "_json", "_json_lock")
+
+    def __init__(self, version: int, timestamp: Optional[float], vehicles: List[dict],
+                 pedestrians: List[dict], stats: dict, store_id: str = ""):
+        self.version = version
+        self.etag = f"{store_id}-{version}"
+        self.timestamp = timestamp
+        self.vehicles = vehicles
+        self.pedestrians = pedestrians
+        self.stats = stats
+        self._json: Optional[bytes] = None
+        self._json_lock = threading.Lock()
+
+    def agents(self) -> List[dict]:
+        """全エージェント（車両、歩行者の順）"""
+        return self.vehicles + self.pedestrians
+
+    def to_dict(self) -> dict:
+        """/api/data と data_update の形式の辞書"""
+        return {
+            "timestamp": self.timestamp,
+            "version": self.version,
+            "vehicles": self.vehicles,
+            "pedestrians": self.pedestrians,
+            "stats": self.stats
+        }
+
+    def json(self) -> bytes:
+        """to_dict() のJSONバイト列（バージョンごとに1回だけ生成）"""
+        if self._json is None:
+            with self._json_lock:
+                if self._json is None:
+                    self._json = dumps(self.to_dict())
+        return self._json
+
+
+class SnapshotStore:
+    """最新のスナップショットを保持し、更新スレッドから差し替える
+
+    Attributes:
+        current (Snapshot): 最新のスナップショット（読み出し側はこの参照を1回だけ取得して使う）
+    """
+
+    def __init__(self, stats: Optional[dict] = None):
+        # 再起動前のバージョン番号のETagと一致しないよう、起動時刻をETagに含める
+        self.store_id = format(time.time_ns() // 1000, "x")
+        self.current = Snapshot(0, None, [], [], copy.deepcopy(stats or {}), self.store_id)
+        self._published = threading.Condition()
+
+    @property
+    def version(self) -> int:
+        return self.current.version
+
+    def publish(self, timestamp: Optional[float], vehicles: dict, pedestrians: dict,
+                stats: dict) -> Snapshot:
+        """更新スレッドの作業中の状態を複製してスナップショットとして公開する
+
+        エージェント情報の辞書は更新ごとに作り直され変更されないため、
+        一覧のみを複製して共有する。統計情報は入れ子の値も更新されるため深く複製する。
+
+        Args:
+            timestamp (Optional[float]): データの更新時刻
+            vehicles (dict): エージェントIDと車両エージェント
+            pedestrians (dict): エージェントIDと歩行者エージェント
+            stats (dict): 統計情報
+
+        Returns:
+            Snapshot: 公開したスナップショット
+        """
+        snapshot = Snapshot(self.current.version + 1, timestamp, list(vehicles.values()),
+                            list(pedestrians.values()), copy.deepcopy(stats), self.store_id)
+        with self._published:
+            self.current = snapshot
+            self._published.notify_all()
+        return snapshot
+
+    def wait_for(self, since: int, timeout: float) -> Snapshot:
+        """バージョン since より新しいスナップショットが公開されるまで待つ
+
+        since が最新のバージョンと異なる場合（再起動前のバージョンを含む）はすぐに返す。
+
+        Args:
+            since (int): 読み出し側が持っているバージョン
+            timeout (float): 待つ最大秒数
+
+        Returns:
+            Snapshot: 最新のスナップショット（期限切れの場合はバージョン since のまま）
+        """
+        if self.current.version != since:
+            return self.current
+        with self._published:
+            self._published.wait_for(lambda: self.current.version != since, timeout)
+            return self.current
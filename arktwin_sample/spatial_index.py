@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+空間索引（一様グリッド）
+
+近隣エージェントの位置を一様グリッドで管理し、
+半径検索とk近傍検索をEdgeへの問い合わせなしにプロセス内で行う。
+
+点の追加・移動・削除は配列を直接更新し、セル順に並べた索引
+（セルキーの昇順配列と各セルの開始位置）は次の検索時にまとめて再構築する。
+複数の検索点に対する半径検索はベクトル化して一括で処理する。
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+# セルキーの計算でY方向のセル番号を非負にするためのオフセット
+_CELL_OFFSET = 1 << 31
+
+
+class SpatialGrid:
+    """2次元の一様グリッド空間索引
+
+    Attributes:
+        cell_size (float): セルの一辺の長さ（メートル）。検索半径と同程度にする
+        ids (List[str]): スロット番号順のエージェントID
+    """
+
+    def __init__(self, cell_size: float = 10.0, capacity: int = 64):
+        if cell_size <= 0:
+            raise ValueError("cell_size は正の値を指定してください")
+        self.cell_size = float(cell_size)
+        self.ids: List[str] = []
+        self._slot: Dict[str, int] = {}
+        self._xy = np.zeros((max(1, capacity), 2))
+        self._dirty = True
+        self._order = np.zeros(0, dtype=np.intp)
+        self._cell_keys = np.zeros(0, dtype=np.int64)
+        self._cell_start = np.zeros(1, dtype=np.intp)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, agent_id: str) -> bool:
+        return agent_id in self._slot
+
+    @property
+    def positions(self) -> np.ndarray:
+        """スロット番号順の位置 (n, 2) のビュー"""
+        return self._xy[:len(self.ids)]
+
+    def position(self, agent_id: str) -> Tuple[float, float]:
+        x, y = self._xy[self._slot[agent_id]]
+        return float(x), float(y)
+
+    def _cells(self, xy: np.ndarray) -> np.ndarray:
+        return np.floor(xy / self.cell_size).astype(np.int64)
+
+    @staticmethod
+    def _keys(cx: np.ndarray, cy: np.ndarray) -> np.ndarray:
+        return (cx << 32) + (cy + _CELL_OFFSET)
+
+    def upsert(self, agent_id: str, x: float, y: float):
+        """点を追加する（既に存在する場合は移動する）"""
+        slot = self._slot.get(agent_id)
+        if slot is None:
+            slot = len(self.ids)
+            if slot == len(self._xy):
+                grown = np.zeros((len(self._xy) * 2, 2))
+                grown[:slot] = self._xy[:slot]
+                self._xy = grown
+            self.ids.append(agent_id)
+            self._slot[agent_id] = slot
+        self._xy[slot] = (x, y)
+        self._dirty = True
+
+    def update_many(self, agent_ids: Iterable[str], xy: np.ndarray):
+        """複数の点をまとめて追加・移動する"""
+        for agent_id, (x, y) in zip(agent_ids, np.asarray(xy, dtype=float).reshape(-1, 2).tolist()):
+            self.upsert(agent_id, x, y)
+
+    def remove(self, agent_id: str) -> bool:
+        """点を削除する（末尾の点を空いたスロットに移す）
+
+        Returns:
+            bool: 削除した場合True
+        """
+        slot = self._slot.pop(agent_id, None)
+        if slot is None:
+            return False
+        last = len(self.ids) - 1
+        if slot != last:
+            moved = self.ids[last]
+            self.ids[slot] = moved
+            self._slot[moved] = slot
+            self._xy[slot] = self._xy[last]
+        self.ids.pop()
+        self._dirty = True
+        return True
+
+    def clear(self):
+        self.ids.clear()
+        self._slot.clear()
+        self._dirty = True
+
+    def reset(self, agent_ids: List[str], xy: np.ndarray):
+        """すべての点をまとめて置き換える（スロット番号は agent_ids の順）"""
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        self.ids = list(agent_ids)
+        self._slot = dict(zip(self.ids, range(len(self.ids))))
+        if len(self._xy) < len(xy):
+            self._xy = np.zeros((max(len(xy), len(self._xy) * 2), 2))
+        self._xy[:len(xy)] = xy
+        self._dirty = True
+
+    def apply_neighbors(self, neighbors: Dict[str, dict], added: Iterable[str],
+                        updated: Iterable[str], removed: Iterable[str]):
+        """近隣エージェントキャッシュの差分を反映する
+
+        Args:
+            neighbors (Dict[str, dict]): エージェントIDと近隣情報（NeighborCache.agents）
+            added, updated, removed: 変化したエージェントID（NeighborDelta）
+        """
+        for agent_id in removed:
+            self.remove(agent_id)
+        for changed in (added, updated):
+            for agent_id in changed:
+                translation = neighbors[agent_id].get("transform", {}).get("localTranslation")
+                if translation is None:
+                    continue
+                self.upsert(agent_id, translation.get("x", 0.0), translation.get("y", 0.0))
+
+    def _rebuild(self):
+        """点をセル順に並べた索引を再構築する"""
+        cells = self._cells(self.positions)
+        keys = self._keys(cells[:, 0], cells[:, 1])
+        self._order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[self._order]
+        # 並べ替え済みのキーが変わる位置が各セルの開始位置
+        starts = np.flatnonzero(np.diff(sorted_keys, prepend=sorted_keys[:1] - 1))
+        self._cell_keys = sorted_keys[starts]
+        self._cell_start = np.append(starts, len(sorted_keys)).astype(np.intp)
+        self._dirty = False
+
+    def query_radius_many(self, points: np.ndarray, radius) -> Tuple[np.ndarray, np.ndarray]:
+        """複数の検索点について半径内の点を一括で求める
+
+        Args:
+            points (np.ndarray): 検索点 (m, 2)
+            radius: 検索半径（スカラーまたは検索点ごとの配列 (m,)）
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: 検索点の番号と、半径内にある点のスロット番号の組
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        radius = np.broadcast_to(np.asarray(radius, dtype=float), (len(points),))
+        empty = np.zeros(0, dtype=np.intp)
+        if not self.ids or len(points) == 0:
+            return empty, empty
+        if self._dirty:
+            self._rebuild()
+
+        # セルキーはX方向のセル番号が同じならY方向に連続するため、
+        # 近傍セルをX方向の列ごとに1つの範囲として二分探索する
+        reach = int(np.ceil(radius.max() / self.cell_size))
+        query_cells = self._cells(points)
+        column = query_cells[:, :1] + np.arange(-reach, reach + 1)
+        low = np.searchsorted(self._cell_keys,
+                              self._keys(column, query_cells[:, 1:] - reach).ravel(), side="left")
+        high = np.searchsorted(self._cell_keys,
+                               self._keys(column, query_cells[:, 1:] + reach).ravel(), side="right")
+        start = self._cell_start[low]
+        counts = self._cell_start[high] - start
+        total = int(counts.sum())
+        if total == 0:
+            return empty, empty
+
+        # 各範囲 [start, start + count) の点を連結する
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        query_index = np.repeat(np.repeat(np.arange(len(points)), column.shape[1]), counts)
+        slots = self._order[np.repeat(start, counts) + offsets]
+        delta = self._xy[slots] - points[query_index]
+        inside = np.einsum("ij,ij->i", delta, delta) <= radius[query_index] ** 2
+        return query_index[inside], slots[inside]
+
+    def query_box(self, min_x: float, min_y: float, max_x: float, max_y: float) -> np.ndarray:
+        """矩形範囲内にある点のスロット番号を求める
+
+        範囲に重なるX方向の列ごとに、Y方向に連続するセルを1つの範囲として二分探索する。
+        """
+        if not self.ids or min_x > max_x or min_y > max_y:
+            return np.zeros(0, dtype=np.intp)
+        if self._dirty:
+            self._rebuild()
+        (x0, y0), (x1, y1) = self._cells(np.array([[min_x, min_y], [max_x, max_y]]))
+        # 点のあるX方向のセル番号の範囲に絞る（セルキーはX方向のセル番号の順）
+        x0 = max(x0, int(self._cell_keys[0] >> 32))
+        x1 = min(x1, int(self._cell_keys[-1] >> 32))
+        # Y方向のセル番号がキーの下位32ビットからあふれないようにする
+        y0 = max(int(y0), -_CELL_OFFSET)
+        y1 = min(int(y1), _CELL_OFFSET - 1)
+        column = np.arange(x0, x1 + 1, dtype=np.int64)
+        low = np.searchsorted(self._cell_keys, self._keys(column, np.int64(y0)), side="left")
+        high = np.searchsorted(self._cell_keys, self._keys(column, np.int64(y1)), side="right")
+        start = self._cell_start[low]
+        counts = self._cell_start[high] - start
+        total = int(counts.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.intp)
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        slots = self._order[np.repeat(start, counts) + offsets]
+        xy = self._xy[slots]
+        inside = ((xy[:, 0] >= min_x) & (xy[:, 0] <= max_x)
+                  & (xy[:, 1] >= min_y) & (xy[:, 1] <= max_y))
+        return slots[inside]
+
+    def query_radius(self, x: float, y: float, radius: float) -> List[str]:
+        """点 (x, y) から半径内にあるエージェントIDを求める"""
+        _, slots = self.query_radius_many(np.array([[x, y]]), radius)
+        return [self.ids[slot] for slot in slots.tolist()]
+
+    def knn(self, x: float, y: float, k: int,
+            max_radius: Optional[float] = None) -> List[Tuple[str, float]]:
+        """点 (x, y) に近いk個のエージェントを距離の昇順で求める
+
+        検索半径をセルの大きさから倍々に広げ、k個以上見つかった時点で打ち切る。
+
+        Args:
+            x, y (float): 検索点
+            k (int): 取得する個数
+            max_radius (Optional[float]): 検索半径の上限（省略時は全体）
+
+        Returns:
+            List[Tuple[str, float]]: エージェントIDと距離の組
+        """
+        if k <= 0 or not self.ids:
+            return []
+        point = np.array([x, y])
+        positions = self.positions
+        # 全点を含む半径（これを超えて広げる必要はない）
+        extent = float(np.sqrt((np.maximum(np.abs(positions.min(axis=0) - point),
+                                           np.abs(positions.max(axis=0) - point)) ** 2).sum()))
+        limit = extent if max_radius is None else min(extent, max_radius)
+        radius = min(self.cell_size, limit)
+        while True:
+            _, slots = self.query_radius_many(point[None, :], radius)
+            if len(slots) >= k or radius >= limit:
+                break
+            radius = min(radius * 2.0, limit)
+        distances = np.hypot(*(self._xy[slots] - point).T)
+        nearest = np.argsort(distances, kind="stable")[:k]
+        return [(self.ids[slot], float(distance))
+                for slot, distance in zip(slots[nearest].tolist(), distances[nearest].tolist())]
@@ -27,7 +27,8 @@ def start_proxy_server():
     """プロキシサーバーを起動"""
     print("プロキシサーバーを起動中...")
     from arktwin_proxy_server import main
-    main()
+    # このスクリプトのコマンドライン引数はプロキシサーバーに渡さない
+    main([])
 
 def start_mock_servers():
     """モックサーバーを起動"""
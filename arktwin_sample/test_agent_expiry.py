@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+エージェント有効期限テストスクリプト
+
+ExpiryQueue が期限切れのエージェントを期限の早い順に取り除くこと、
+再観測（touch）で期限が延びること、削除後に再追加したエージェントが以前の期限で
+取り除かれないこと、上限数を超えた分は最も古いエージェントから取り除くこと、
+実行中にTTLを変更した場合も最後に観測した時刻から判定することを検証する。
+最後に、全件を走査する単純な実装とランダムな操作列で結果を比較する。
+"""
+
+import random
+
+from agent_expiry import ExpiryQueue
+
+
+def test_expiry_order():
+    """期限の早い順に取り除かれることを検証"""
+    print("=== 期限切れの順序 ===")
+    queue = ExpiryQueue(ttl=5.0)
+    for agent_id, seen in (("c", 3.0), ("a", 1.0), ("b", 2.0), ("d", 4.0)):
+        queue.touch(agent_id, seen)
+    assert queue.expire(5.5) == []
+    assert queue.expire(7.0) == ["a", "b"]
+    assert queue.expire(20.0) == ["c", "d"]
+    assert len(queue) == 0
+    print("取り除いた順: a, b → c, d")
+
+
+def test_retouch():
+    """再観測で期限が延び、削除・再追加で以前の期限が無効になることを検証"""
+    print("\n=== 再観測と再追加 ===")
+    queue = ExpiryQueue(ttl=5.0)
+    queue.touch("a", 0.0)
+    queue.touch("b", 1.0)
+    # a を再観測すると b より後に期限切れになる
+    queue.touch("a", 4.0)
+    assert queue.expire(6.0) == ["b"]
+    assert "a" in queue
+    assert queue.expire(9.0) == ["a"]
+
+    # 削除後に再追加したエージェントは、以前の追加で積んだ期限では取り除かれない
+    queue.touch("c", 10.0)
+    queue.discard("c")
+    queue.touch("c", 13.0)
+    assert queue.expire(16.0) == []
+    assert queue.expire(18.0) == ["c"]
+    print("再観測: 期限を延長 / 再追加: 以前の期限を無効化")
+
+
+def test_max_agents():
+    """上限数を超えた分が最も古いエージェントから取り除かれることを検証"""
+    print("\n=== 上限数 ===")
+    queue = ExpiryQueue(ttl=None, max_agents=3)
+    for i, agent_id in enumerate("abcde"):
+        queue.touch(agent_id, float(i))
+    # a を再観測すると最も新しい扱いになる
+    queue.touch("a", 10.0)
+    assert queue.expire(10.0) == ["b", "c"]
+    assert [agent_id for agent_id in "abcde" if agent_id in queue] == ["a", "d", "e"]
+    print("上限3で取り除いた順: b, c")
+
+
+def test_ttl_change():
+    """実行中にTTLを有効化・変更しても、最後に観測した時刻から判定することを検証"""
+    print("\n=== TTLの変更 ===")
+    queue = ExpiryQueue(ttl=None)
+    queue.touch("a", 0.0)
+    queue.touch("b", 0.9)
+    assert queue.expire(1.0) == []
+    # /api/config でTTLを有効にしても、観測から5秒経つまでは取り除かない
+    queue.ttl = 5.0
+    assert queue.expire(1.0) == []
+    assert queue.expire(5.5) == ["a"]
+    # TTLを短くすると、その時点で期限切れの判定が変わる
+    queue.touch("c", 5.5)
+    queue.ttl = 1.0
+    assert queue.expire(6.0) == ["b"]
+    assert queue.expire(6.6) == ["c"]
+    print("TTLなし → 5秒: a のみ期限切れ / 5秒 → 1秒: b, c の順に期限切れ")
+
+
+def test_against_brute_force():
+    """全件を走査する実装とランダムな操作列で結果を比較"""
+    print("\n=== 全件走査との比較 ===")
+    rng = random.Random(5)
+    ttl, max_agents = 3.0, 40
+    queue = ExpiryQueue(ttl=ttl, max_agents=max_agents)
+    last_seen = {}
+    now = 0.0
+    evicted_total = 0
+    for _ in range(2000):
+        now += rng.uniform(0.0, 0.2)
+        for _ in range(rng.randint(0, 5)):
+            agent_id = f"agent-{rng.randrange(100)}"
+            if rng.random() < 0.1:
+                queue.discard(agent_id)
+                last_seen.pop(agent_id, None)
+            else:
+                queue.touch(agent_id, now)
+                last_seen[agent_id] = now
+
+        evicted = queue.expire(now)
+        # 期限切れを期限の早い順に、続いて上限数を超えた分を最も古いものから
+        oldest_first = sorted(last_seen, key=last_seen.get)
+        expected = [agent_id for agent_id in oldest_first if last_seen[agent_id] <= now - ttl]
+        remaining = [agent_id for agent_id in oldest_first if agent_id not in expected]
+        expected += remaining[:max(0, len(remaining) - max_agents)]
+        assert evicted == expected, f"時刻{now:.2f}: {evicted} != {expected}"
+        for agent_id in evicted:
+            del last_seen[agent_id]
+        assert len(queue) == len(last_seen)
+        evicted_total += len(evicted)
+    print(f"2000回の操作、取り除いたエージェント {evicted_total}件: 一致")
+
+
+if __name__ == "__main__":
+    # メイン処理: エージェント有効期限テストを実行
+    test_expiry_order()
+    test_retouch()
+    test_max_agents()
+    test_ttl_change()
+    test_against_brute_force()
+    print("\n=== テスト完了 ===")
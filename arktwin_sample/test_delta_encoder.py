@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+差分配信エンコーダーテストスクリプト
+
+DeltaEncoder のキーフレームと差分を、ブラウザのクライアントと同じ手順で復号し、
+エージェントの追加・移動・削除を繰り返しても復号結果が送信側の状態と一致することを検証する。
+途中で接続したクライアントはキーフレームから、フレームを取りこぼしたクライアントは再同期で復元する。
+"""
+
+import random
+
+from delta_encoder import DeltaEncoder
+
+
+class DeltaDecoder:
+    """クライアント側の復号（visualization.html と同じ手順）"""
+
+    def __init__(self):
+        self.seq = None
+        self.agents = {}
+        self.resyncs = 0
+
+    def apply_keyframe(self, frame):
+        self.seq = frame["seq"]
+        self.agents = {row[0]: row for row in frame["agents"]}
+
+    def apply_delta(self, frame):
+        """差分を適用する（base が一致しない場合は False を返し、再同期が必要）"""
+        if frame["base"] != self.seq:
+            self.resyncs += 1
+            return False
+        for row in frame["upserts"]:
+            self.agents[row[0]] = row
+        for agent_id in frame["removed"]:
+            self.agents.pop(agent_id, None)
+        self.seq = frame["seq"]
+        return True
+
+    def positions(self, encoder):
+        """量子化を戻した位置と向き"""
+        scale = encoder.position_scale
+        return {agent_id: (x / scale, y / scale, z / scale, rotation / encoder.rotation_scale)
+                for agent_id, (_, _, x, y, z, rotation) in self.agents.items()}
+
+
+def make_agent(agent_id, rng):
+    return {"id": agent_id, "kind": agent_id.split("-")[0],
+            "x": rng.uniform(-100, 100), "y": rng.uniform(-100, 100), "z": 0.0,
+            "rotation": {"z": rng.uniform(-180, 180)}}
+
+
+def step_agents(agents, rng, frame):
+    """エージェントの一部を移動・削除し、新しいエージェントを追加する"""
+    for agent in agents.values():
+        if rng.random() < 0.5:
+            agent["x"] += rng.uniform(-1, 1)
+            agent["y"] += rng.uniform(-1, 1)
+            agent["rotation"] = {"z": agent["rotation"]["z"] + rng.uniform(-5, 5)}
+        elif rng.random() < 0.1:
+            # 量子化の刻みより小さい移動は差分に含まれない
+            agent["x"] += 0.001
+    for agent_id in rng.sample(sorted(agents), min(len(agents), 2)):
+        del agents[agent_id]
+    for i in range(rng.randint(0, 4)):
+        kind = rng.choice(["vehicle", "pedestrian"])
+        agent_id = f"{kind}-{frame:03d}-{i}"
+        agents[agent_id] = make_agent(agent_id, rng)
+
+
+def test_round_trip():
+    """キーフレームと差分の復号結果が送信側と一致することを検証"""
+    print("=== キーフレーム + 差分の復号 ===")
+    rng = random.Random(3)
+    encoder = DeltaEncoder()
+    agents = {f"vehicle-{i:03d}": make_agent(f"vehicle-{i:03d}", rng) for i in range(50)}
+    clients = {"initial": DeltaDecoder(), "late": DeltaDecoder(), "lossy": DeltaDecoder()}
+    clients["initial"].apply_keyframe(encoder.keyframe())
+
+    upserts = 0
+    previous = {}
+    for frame in range(1, 101):
+        step_agents(agents, rng, frame)
+        delta = encoder.encode(agents.values())
+        assert delta["seq"] == delta["base"] + 1
+        upserts += len(delta["upserts"])
+        expected = {agent_id: encoder.quantize(agent) for agent_id, agent in agents.items()}
+        # 量子化後の値が変化したエージェントのみが差分に含まれる
+        changed = {agent_id for agent_id, row in expected.items() if previous.get(agent_id) != row}
+        assert {row[0] for row in delta["upserts"]} == changed
+        assert set(delta["removed"]) == set(previous) - set(expected)
+        previous = expected
+
+        if frame == 30:
+            # 途中で接続したクライアントはキーフレームから始める
+            clients["late"].apply_keyframe(encoder.keyframe())
+        elif frame > 30:
+            clients["late"].apply_delta(delta)
+
+        # 10フレームごとに差分を取りこぼすクライアントは再同期する
+        lossy = clients["lossy"]
+        if frame % 10 != 0 and not lossy.apply_delta(delta):
+            lossy.apply_keyframe(encoder.keyframe())
+
+        assert clients["initial"].apply_delta(delta)
+        for name, client in clients.items():
+            if (name == "late" and frame < 30) or (name == "lossy" and frame % 10 == 0):
+                # 接続前と、取りこぼした直後（次の差分で再同期する）は比較しない
+                continue
+            assert client.agents == expected, f"{name} フレーム{frame}"
+            assert client.seq == encoder.seq
+
+    # 量子化の誤差の範囲で元の値に戻ること
+    decoded = clients["initial"].positions(encoder)
+    for agent_id, agent in agents.items():
+        x, y, z, rotation = decoded[agent_id]
+        assert abs(x - agent["x"]) <= 0.5 / encoder.position_scale
+        assert abs(y - agent["y"]) <= 0.5 / encoder.position_scale
+        assert abs(rotation - agent["rotation"]["z"]) <= 0.5 / encoder.rotation_scale
+    print(f"100フレーム、エージェント{len(agents)}体、差分 {upserts}件: 一致")
+    print(f"再同期: {clients['lossy'].resyncs}回")
+    assert clients["lossy"].resyncs == 10
+
+
+def test_reset():
+    """reset() 後の差分に全エージェントが含まれることを検証"""
+    print("\n=== 状態の破棄 ===")
+    rng = random.Random(4)
+    encoder = DeltaEncoder()
+    agents = [make_agent(f"pedestrian-{i}", rng) for i in range(10)]
+    encoder.encode(agents)
+    assert encoder.encode(agents)["upserts"] == []
+    encoder.reset()
+    delta = encoder.encode(agents)
+    assert len(delta["upserts"]) == len(agents) and delta["removed"] == []
+    print("reset() 後の差分: 全エージェント")
+
+
+if __name__ == "__main__":
+    # メイン処理: 差分配信エンコーダーテストを実行
+    test_round_trip()
+    test_reset()
+    print("\n=== テスト完了 ===")
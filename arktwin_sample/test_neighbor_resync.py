@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+近隣情報の再同期テストスクリプト
+
+変更検出（changeDetection）の近隣検索でレスポンスを1回失った場合に、
+車両シミュレーターが次の検索で全件を取得し直し、範囲外に移動した歩行者を
+近隣情報・空間索引・制動距離内の歩行者から取り除くことを検証する。
+Edgeには代替Edgeサーバー（mock_edge.py）の MockWorld をプロセス内で使用する。
+"""
+
+from mock_edge import MockEdgeConfig, MockWorld
+from neighbor_cache import NeighborCache
+from simulator_base import NEIGHBOR_REFRESH_INTERVAL
+from vehicle_simulator import VehicleSimulator
+
+# 近隣検索で返す最大距離（メートル）
+MAX_DISTANCE = 50.0
+
+
+def move(world, edge, agent_id, x, y):
+    """代替Edgeのエージェントの位置を更新する"""
+    transform = {"localTranslation": {"x": x, "y": y, "z": 0.0}}
+    world.update(edge, {"agents": {agent_id: {"transform": transform}}})
+
+
+def create_world(x, y):
+    """車両1台と、その近くの歩行者1人を登録した代替Edgeを作成する"""
+    world = MockWorld()
+    vehicle_id = world.register("vehicle", [{"agentIdPrefix": "vehicle-001", "kind": "vehicle"}])[0]["agentId"]
+    pedestrian_id = world.register("pedestrian",
+                                   [{"agentIdPrefix": "pedestrian-001", "kind": "pedestrian"}])[0]["agentId"]
+    move(world, "vehicle", vehicle_id, x, y)
+    move(world, "pedestrian", pedestrian_id, x + 10.0, y)
+    return world, pedestrian_id
+
+
+def frame(world, edge, simulator, lost=False):
+    """1フレーム分の近隣検索を行う（lost=True の場合はEdgeが応答したレスポンスを失う）"""
+    query = simulator._build_neighbor_query()
+    response = world.query(edge, query)
+    if lost:
+        simulator._handle_neighbors_failure()
+    else:
+        simulator._handle_neighbors_response(response, complete=not query["changeDetection"])
+    simulator.find_pedestrians_in_braking_distance()
+    simulator.simulation_time += 0.1
+    return query
+
+
+def test_incremental_only():
+    """変更検出の差分のみを適用し続けると、失ったレスポンスの削除が反映されないことを確認"""
+    print("=== 差分のみの適用（以前の動作） ===")
+    edge = MockEdgeConfig("vehicle", 0, max_distance=MAX_DISTANCE)
+    world, pedestrian_id = create_world(0.0, 0.0)
+    cache = NeighborCache()
+    query = {"neighborsNumber": 50, "changeDetection": True}
+    cache.apply(world.query(edge, query)["neighbors"])
+    move(world, "pedestrian", pedestrian_id, 500.0, 0.0)
+    world.query(edge, query)  # Unrecognized を含むレスポンスを失う
+    for _ in range(3):
+        cache.apply(world.query(edge, query)["neighbors"])
+    assert pedestrian_id in cache.by_prefix("pedestrian")
+    print(f"範囲外に移動した {pedestrian_id} が残る")
+
+
+def test_resync_after_lost_response():
+    """レスポンスを失った後の検索で全件を取得し直すことを検証"""
+    print("\n=== レスポンスを失った後の再同期 ===")
+    edge = MockEdgeConfig("vehicle", 0, max_distance=MAX_DISTANCE)
+    simulator = VehicleSimulator(edge_port=1)
+    simulator._spawn_agents()
+    simulator.update_agents(0.0)
+    x, y = simulator.vehicles.position[0, :2]
+    world, pedestrian_id = create_world(float(x), float(y))
+
+    # 起動直後は全件、以降は変更検出
+    assert frame(world, edge, simulator)["changeDetection"] is False
+    assert frame(world, edge, simulator)["changeDetection"] is True
+    assert pedestrian_id in simulator.neighbors.by_prefix("pedestrian")
+    assert pedestrian_id in simulator.pedestrian_index
+    assert any(pedestrian_id in ids for ids in simulator.pedestrians_in_braking_distance.values())
+
+    # 歩行者が範囲外に移動した直後のレスポンスを失う
+    move(world, "pedestrian", pedestrian_id, 500.0, 0.0)
+    frame(world, edge, simulator, lost=True)
+    assert simulator.neighbors_desynced
+
+    queries = [frame(world, edge, simulator) for _ in range(3)]
+    assert [query["changeDetection"] for query in queries] == [False, True, True]
+    assert not simulator.neighbors_desynced
+    assert pedestrian_id not in simulator.neighbors.by_prefix("pedestrian")
+    assert pedestrian_id not in simulator.pedestrian_index
+    assert not simulator.pedestrians_in_braking_distance
+
+    # 再び範囲内に戻ると変更検出の差分で認識する
+    move(world, "pedestrian", pedestrian_id, float(x) + 10.0, float(y))
+    frame(world, edge, simulator)
+    assert pedestrian_id in simulator.pedestrian_index
+    print(f"{pedestrian_id}: 全件の再取得で削除、範囲内に戻ると再認識")
+
+
+def test_periodic_refresh():
+    """レスポンスを失わなくても一定間隔で全件を取得し直すことを検証"""
+    print("\n=== 定期的な全件取得 ===")
+    edge = MockEdgeConfig("vehicle", 0, max_distance=MAX_DISTANCE)
+    simulator = VehicleSimulator(edge_port=1)
+    world, _ = create_world(0.0, 0.0)
+    interval_frames = round(NEIGHBOR_REFRESH_INTERVAL / 0.1)
+    frames = interval_frames * 2 + 10
+    complete = [index for index in range(frames)
+                if not frame(world, edge, simulator)["changeDetection"]]
+    # 時刻の加算誤差で1フレーム遅れることがある
+    assert len(complete) == 3 and complete[0] == 0
+    assert all(interval_frames <= b - a <= interval_frames + 1 for a, b in zip(complete, complete[1:]))
+    print(f"{frames}フレーム中の全件取得: {complete}")
+
+
+if __name__ == "__main__":
+    # メイン処理: 近隣情報の再同期テストを実行
+    test_incremental_only()
+    test_resync_after_lost_response()
+    test_periodic_refresh()
+    print("\n=== テスト完了 ===")
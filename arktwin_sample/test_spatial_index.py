@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+空間索引テストスクリプト
+
+SpatialGrid の半径検索（query_radius_many）とk近傍検索（knn）の結果を
+全点との距離を直接計算した結果（総当たり）と比較する。
+点の追加・移動・削除を繰り返した後の索引でも同じ結果になることを検証する。
+"""
+
+import numpy as np
+
+from spatial_index import SpatialGrid
+
+
+def build_grid(rng, count=500, area=200.0, cell_size=10.0):
+    """ランダムな点を登録し、一部を移動・削除した空間索引を作成"""
+    grid = SpatialGrid(cell_size=cell_size, capacity=8)
+    positions = {}
+    for i in range(count):
+        agent_id = f"agent-{i:04d}"
+        x, y = rng.uniform(-area / 2, area / 2, 2)
+        grid.upsert(agent_id, x, y)
+        positions[agent_id] = (x, y)
+    # 一部の点を移動（索引の再構築が必要になる）
+    for agent_id in rng.choice(sorted(positions), count // 5, replace=False):
+        x, y = rng.uniform(-area / 2, area / 2, 2)
+        grid.upsert(agent_id, x, y)
+        positions[agent_id] = (x, y)
+    # 一部の点を削除（スロットの詰め替えが起きる）
+    for agent_id in rng.choice(sorted(positions), count // 10, replace=False):
+        assert grid.remove(agent_id)
+        del positions[agent_id]
+    return grid, positions
+
+
+def brute_force_radius(positions, point, radius):
+    """半径内にあるエージェントIDを総当たりで求める"""
+    return {agent_id for agent_id, (x, y) in positions.items()
+            if (x - point[0]) ** 2 + (y - point[1]) ** 2 <= radius ** 2}
+
+
+def test_query_radius_many():
+    """query_radius_many の結果が総当たりと一致することを検証"""
+    print("=== 半径検索（query_radius_many） ===")
+    rng = np.random.default_rng(1)
+    grid, positions = build_grid(rng)
+    points = rng.uniform(-120.0, 120.0, (200, 2))
+
+    # 検索点ごとに異なる半径（セルより小さい半径から数セルにまたがる半径まで）
+    for radius in (5.0, 25.0, rng.uniform(0.5, 40.0, len(points))):
+        rows, slots = grid.query_radius_many(points, radius)
+        radii = np.broadcast_to(radius, (len(points),))
+        found = [set() for _ in points]
+        for row, slot in zip(rows.tolist(), slots.tolist()):
+            found[row].add(grid.ids[slot])
+        for i, point in enumerate(points):
+            expected = brute_force_radius(positions, point, radii[i])
+            assert found[i] == expected, f"検索点{i}: {sorted(found[i] ^ expected)}"
+        # 同じ点が重複して返らないこと
+        assert len(set(zip(rows.tolist(), slots.tolist()))) == len(rows)
+        print(f"半径 {'検索点ごと' if np.ndim(radius) else radius}: {len(rows)}件 一致")
+
+    # 空の索引・検索点なし
+    empty_rows, _ = SpatialGrid().query_radius_many(points, 10.0)
+    assert len(empty_rows) == 0
+    no_points, _ = grid.query_radius_many(np.zeros((0, 2)), 10.0)
+    assert len(no_points) == 0
+
+
+def test_knn():
+    """knn の結果が総当たりの距離順と一致することを検証"""
+    print("\n=== k近傍検索（knn） ===")
+    rng = np.random.default_rng(2)
+    grid, positions = build_grid(rng)
+    ids = sorted(positions)
+    xy = np.array([positions[agent_id] for agent_id in ids])
+
+    for x, y in rng.uniform(-150.0, 150.0, (100, 2)):
+        distances = np.hypot(xy[:, 0] - x, xy[:, 1] - y)
+        order = np.argsort(distances)
+        for k in (1, 5, 50, len(ids) + 10):
+            result = grid.knn(x, y, k)
+            expected = [ids[i] for i in order[:k]]
+            assert [agent_id for agent_id, _ in result] == expected
+            assert np.allclose([distance for _, distance in result], distances[order[:k]])
+
+        # 検索半径の上限を指定した場合は上限内の点のみ
+        max_radius = 15.0
+        result = grid.knn(x, y, 10, max_radius=max_radius)
+        expected = [ids[i] for i in order[:10] if distances[i] <= max_radius]
+        assert [agent_id for agent_id, _ in result] == expected
+    print("100点 × k=1, 5, 50, 全件超過, 上限付き: 一致")
+
+    assert grid.knn(0.0, 0.0, 0) == []
+    assert SpatialGrid().knn(0.0, 0.0, 3) == []
+
+
+if __name__ == "__main__":
+    # メイン処理: 空間索引テストを実行
+    test_query_radius_many()
+    test_knn()
+    print("\n=== テスト完了 ===")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+軌道エンジンテストスクリプト
+
+TrajectorySet.evaluate() が求める位置・向き・速さを、ウェイポイントを先頭から順にたどる
+以前の車両シミュレーターの位置計算（往復移動）と比較する。
+一方向移動（once）と繰り返し（loop）も同じ計算で移動の割合を変えて比較する。
+"""
+
+import math
+
+import numpy as np
+
+from trajectory import MODE_LOOP, MODE_ONCE, MODE_PING_PONG, TrajectorySet
+
+
+# 以前の車両シミュレーターの移動パターン
+PATTERNS = [
+    {"waypoints": [(-25, -1.5), (25, -1.5)], "speed": 8.0, "cycle_time": 12.0},
+    {"waypoints": [(1.5, -25), (1.5, 25)], "speed": 7.0, "cycle_time": 14.0},
+    {"waypoints": [(1.5, -25), (1.5, -3), (3, -1.5), (25, -1.5)], "speed": 5.0, "cycle_time": 18.0},
+]
+
+
+def baseline_position(waypoints, fraction):
+    """経路上の割合 fraction（0〜1）の位置と進行方向（以前の実装と同じ区間の探索）"""
+    total_distance = 0
+    for i in range(len(waypoints) - 1):
+        dx = waypoints[i+1][0] - waypoints[i][0]
+        dy = waypoints[i+1][1] - waypoints[i][1]
+        total_distance += math.sqrt(dx*dx + dy*dy)
+    distance_traveled = fraction * total_distance
+
+    current_distance = 0
+    for i in range(len(waypoints) - 1):
+        dx = waypoints[i+1][0] - waypoints[i][0]
+        dy = waypoints[i+1][1] - waypoints[i][1]
+        segment_distance = math.sqrt(dx*dx + dy*dy)
+        if current_distance + segment_distance >= distance_traveled:
+            t = (distance_traveled - current_distance) / segment_distance
+            return waypoints[i][0] + t * dx, waypoints[i][1] + t * dy, math.atan2(dy, dx)
+        current_distance += segment_distance
+    x, y = waypoints[-1]
+    return x, y, math.atan2(waypoints[-1][1] - waypoints[-2][1], waypoints[-1][0] - waypoints[-2][0])
+
+
+def baseline_state(pattern, mode, elapsed):
+    """以前の実装の位置計算で、移動モードごとの位置・向き・速さを求める"""
+    cycle_time = pattern["cycle_time"]
+    speed = pattern["speed"]
+    if mode == MODE_PING_PONG:
+        # 以前の実装と同じ往復（後半は終点から始点へ戻る）
+        cycle_progress = (elapsed % (cycle_time * 2)) / cycle_time
+        if cycle_progress <= 1.0:
+            return (*baseline_position(pattern["waypoints"], cycle_progress), speed)
+        x, y, direction = baseline_position(pattern["waypoints"], 2.0 - cycle_progress)
+        return x, y, math.atan2(-math.sin(direction), -math.cos(direction)), speed
+    if mode == MODE_LOOP:
+        return (*baseline_position(pattern["waypoints"], (elapsed % cycle_time) / cycle_time), speed)
+    # 一方向移動は終点で停止する
+    fraction = min(max(elapsed / cycle_time, 0.0), 1.0)
+    return (*baseline_position(pattern["waypoints"], fraction), 0.0 if elapsed >= cycle_time else speed)
+
+
+def angle_difference(a, b):
+    return abs((a - b + math.pi) % (2 * math.pi) - math.pi)
+
+
+def test_modes_against_baseline():
+    """3つの移動モードで以前の実装と同じ位置・向き・速さになることを検証"""
+    trajectories = TrajectorySet()
+    modes = (MODE_PING_PONG, MODE_LOOP, MODE_ONCE)
+    phases = (0.0, 3.7)
+    cases = []
+    for mode in modes:
+        for phase in phases:
+            for pattern in PATTERNS:
+                row = len(cases)
+                path_index = trajectories.add_path(pattern["waypoints"])
+                trajectories.assign(row, path_index, pattern["speed"], mode=mode,
+                                    cycle_time=pattern["cycle_time"], phase=phase)
+                cases.append((mode, phase, pattern))
+    # 同じウェイポイント列の経路は1回だけコンパイルされる
+    assert len(trajectories.paths) == len(PATTERNS)
+
+    rng = np.random.default_rng(6)
+    times = np.concatenate((rng.uniform(0.0, 100.0, 300), [0.0, 6.0, 12.0, 13.0, 18.0, 36.0]))
+    worst = {mode: 0.0 for mode in modes}
+    for t in times:
+        rows, x, y, heading, speed = trajectories.evaluate(float(t))
+        for row, (mode, phase, pattern) in zip(rows.tolist(), cases):
+            bx, by, bheading, bspeed = baseline_state(pattern, mode, t + phase)
+            error = math.hypot(x[row] - bx, y[row] - by)
+            assert error < 1e-9, f"{mode} t={t:.3f}: ({x[row]}, {y[row]}) != ({bx}, {by})"
+            assert speed[row] == bspeed, f"{mode} t={t:.3f}: 速さ {speed[row]} != {bspeed}"
+            # 区間の境界ではどちらの区間の向きでもよい
+            at_waypoint = any(math.hypot(bx - wx, by - wy) < 1e-6 for wx, wy in pattern["waypoints"])
+            assert at_waypoint or angle_difference(heading[row], bheading) < 1e-9, \
+                f"{mode} t={t:.3f}: 向き {heading[row]} != {bheading}"
+            assert -math.pi < heading[row] <= math.pi
+            worst[mode] = max(worst[mode], error)
+
+    print("=== 以前の実装との比較 ===")
+    for mode in modes:
+        print(f"{mode}: {len(times)}時刻 × {len(PATTERNS) * len(phases)}エージェント  最大誤差 {worst[mode]:.2e}m")
+
+
+def test_derived_cycle_time():
+    """周期を省略した場合に全長÷速さで移動し、速さ0では始点に留まることを検証"""
+    trajectories = TrajectorySet()
+    path_index = trajectories.add_path([(0, 0), (30, 40)])
+    trajectories.assign([0, 1], path_index, [5.0, 0.0], mode=MODE_LOOP, cycle_time=[np.nan, np.nan])
+    _, x, y, _, speed = trajectories.evaluate(4.0)
+    # 全長50m、5m/sで4秒後は20m進んだ位置
+    assert np.allclose([x[0], y[0]], [12.0, 16.0])
+    assert (x[1], y[1], speed[1]) == (0.0, 0.0, 0.0)
+    print("\n=== 周期の省略 ===")
+    print("全長÷速さの周期: 一致 / 速さ0: 始点に停止")
+
+
+if __name__ == "__main__":
+    # メイン処理: 軌道エンジンテストを実行
+    test_modes_against_baseline()
+    test_derived_cycle_time()
+    print("\n=== テスト完了 ===")
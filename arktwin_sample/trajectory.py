@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+軌道エンジン
+
+移動パターン（直進・往復・複数ウェイポイント）を一度だけコンパイルし、
+累積弧長テーブルを使って多数のエージェントの位置を一括で求める。
+
+各経路は区間の始点・単位方向ベクトル・累積弧長に変換され、
+全経路の表を1本に連結した上で二分探索（np.searchsorted）により
+エージェントの走行距離から区間を特定する。
+1エージェントあたりの評価はO(log 区間数)で、毎フレームの平方根計算は不要。
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+# 移動モード
+MODE_ONCE = "once"            # 始点から終点まで一度だけ移動し、終点で停止
+MODE_LOOP = "loop"            # 終点に着いたら始点から繰り返す
+MODE_PING_PONG = "ping_pong"  # 始点と終点の間を往復する
+
+_MODE_CODES = {MODE_ONCE: 0, MODE_LOOP: 1, MODE_PING_PONG: 2}
+
+
+class CompiledPath:
+    """累積弧長テーブルにコンパイルされた折れ線経路
+
+    Attributes:
+        origins (np.ndarray): 各区間の始点 (segments, 2)
+        directions (np.ndarray): 各区間の単位方向ベクトル (segments, 2)
+        headings (np.ndarray): 各区間の向き（ラジアン）
+        cumulative (np.ndarray): 各区間の始点までの累積弧長 (segments,)
+        length (float): 経路の全長（メートル）
+    """
+
+    def __init__(self, waypoints: Sequence[Sequence[float]]):
+        points = np.asarray(waypoints, dtype=float).reshape(-1, 2)
+        if len(points) == 0:
+            raise ValueError("経路には少なくとも1つのウェイポイントが必要です")
+
+        delta = np.diff(points, axis=0)
+        lengths = np.hypot(delta[:, 0], delta[:, 1])
+        # 長さ0の区間（重複したウェイポイント）は除外する
+        keep = lengths > 0.0
+        if not keep.any():
+            # 停止地点のみの経路は長さ0の区間1つで表す
+            self.origins = points[:1].copy()
+            self.directions = np.zeros((1, 2))
+            self.headings = np.zeros(1)
+            self.cumulative = np.zeros(1)
+            self.length = 0.0
+            return
+
+        lengths = lengths[keep]
+        delta = delta[keep]
+        self.origins = points[:-1][keep]
+        self.directions = delta / lengths[:, None]
+        self.headings = np.arctan2(delta[:, 1], delta[:, 0])
+        self.cumulative = np.concatenate(([0.0], np.cumsum(lengths)[:-1]))
+        self.length = float(lengths.sum())
+
+    @property
+    def segment_count(self) -> int:
+        return len(self.headings)
+
+
+class TrajectorySet:
+    """多数のエージェントの軌道を一括で評価する
+
+    経路は add_path() でコンパイルしてキャッシュし、assign() でエージェントの行番号に
+    経路・速さ・移動モード・周期を割り当てる。evaluate() は割り当て済みの全エージェントの
+    位置・向き・速さを配列で返す。
+    """
+
+    def __init__(self):
+        self.paths: List[CompiledPath] = []
+        self._path_keys: Dict[Tuple[Tuple[float, float], ...], int] = {}
+        # エージェントごとの割り当て（assign() のたびに追加）
+        self._rows: List[np.ndarray] = []
+        self._path_index: List[np.ndarray] = []
+        self._speed: List[np.ndarray] = []
+        self._cycle: List[np.ndarray] = []
+        self._mode: List[np.ndarray] = []
+        self._phase: List[np.ndarray] = []
+        self._compiled = False
+
+    def __len__(self) -> int:
+        return sum(len(rows) for rows in self._rows)
+
+    def add_path(self, waypoints: Sequence[Sequence[float]]) -> int:
+        """経路をコンパイルして登録する（同じウェイポイント列は再利用する）
+
+        Args:
+            waypoints: ウェイポイント列 [(x, y), ...]
+
+        Returns:
+            int: 経路番号
+        """
+        key = tuple((float(x), float(y)) for x, y in waypoints)
+        path_index = self._path_keys.get(key)
+        if path_index is None:
+            path_index = len(self.paths)
+            self.paths.append(CompiledPath(key))
+            self._path_keys[key] = path_index
+            self._compiled = False
+        return path_index
+
+    def assign(self, rows, path_index, speed, mode: str = MODE_PING_PONG,
+               cycle_time=None, phase=0.0):
+        """エージェントに経路を割り当てる
+
+        Args:
+            rows: エージェントの行番号（スカラーまたは配列）
+            path_index: 経路番号（スカラーまたは配列）
+            speed: 速さ（m/s）
+            mode (str): 移動モード（once / loop / ping_pong）
+            cycle_time: 一方向の移動にかかる時間（秒）。省略時・NaNの場合は全長÷速さ
+            phase: 時刻のずらし量（秒）
+        """
+        if mode not in _MODE_CODES:
+            raise ValueError(f"未知の移動モードです: {mode}")
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.intp))
+        count = len(rows)
+        path_index = np.broadcast_to(np.asarray(path_index, dtype=np.intp), (count,))
+        speed = np.broadcast_to(np.asarray(speed, dtype=float), (count,))
+        lengths = np.array([path.length for path in self.paths])[path_index]
+        derived = np.where(speed > 0, lengths / np.where(speed > 0, speed, 1.0), np.inf)
+        if cycle_time is None:
+            cycle = derived
+        else:
+            cycle = np.broadcast_to(np.asarray(cycle_time, dtype=float), (count,))
+            cycle = np.where(np.isnan(cycle), derived, cycle)
+
+        self._rows.append(rows)
+        self._path_index.append(np.array(path_index))
+        self._speed.append(np.array(speed))
+        self._cycle.append(np.array(cycle, dtype=float))
+        self._mode.append(np.full(count, _MODE_CODES[mode], dtype=np.int8))
+        self._phase.append(np.array(np.broadcast_to(np.asarray(phase, dtype=float), (count,))))
+        self._compiled = False
+
+    def compile(self):
+        """全経路の区間表を連結し、評価用の配列を構築する"""
+        if not self.paths:
+            self.rows = np.zeros(0, dtype=np.intp)
+            self._compiled = True
+            return
+        path_lengths = np.array([path.length for path in self.paths])
+        segment_counts = np.array([path.segment_count for path in self.paths], dtype=np.intp)
+        # 経路ごとに弧長の基準値をずらして1本の表に並べる
+        self._path_base = np.concatenate(([0.0], np.cumsum(path_lengths)[:-1]))
+        self._path_length = path_lengths
+        self._first_segment = np.concatenate(([0], np.cumsum(segment_counts)[:-1])).astype(np.intp)
+        self._last_segment = self._first_segment + segment_counts - 1
+        self._segment_start = np.concatenate(
+            [path.cumulative + base for path, base in zip(self.paths, self._path_base)])
+        self._segment_origin = np.concatenate([path.origins for path in self.paths])
+        self._segment_direction = np.concatenate([path.directions for path in self.paths])
+        self._segment_heading = np.concatenate([path.headings for path in self.paths])
+
+        self.rows = np.concatenate(self._rows) if self._rows else np.zeros(0, dtype=np.intp)
+        self.path_index = np.concatenate(self._path_index) if self._rows else np.zeros(0, dtype=np.intp)
+        self.speed = np.concatenate(self._speed) if self._rows else np.zeros(0)
+        self.cycle = np.concatenate(self._cycle) if self._rows else np.zeros(0)
+        self.mode = np.concatenate(self._mode) if self._rows else np.zeros(0, dtype=np.int8)
+        self.phase = np.concatenate(self._phase) if self._rows else np.zeros(0)
+        # エージェントごとの経路情報を事前に展開しておく
+        self._agent_length = self._path_length[self.path_index]
+        self._agent_base = self._path_base[self.path_index]
+        self._agent_first = self._first_segment[self.path_index]
+        self._agent_last = self._last_segment[self.path_index]
+        self._compiled = True
+
+    def evaluate(self, t: float):
+        """時刻tにおける全エージェントの状態を一括で求める
+
+        Args:
+            t (float): シミュレーション時刻（秒）
+
+        Returns:
+            Tuple[np.ndarray, ...]: (rows, x, y, heading, speed)
+        """
+        if not self._compiled:
+            self.compile()
+        if len(self.rows) == 0:
+            empty = np.zeros(0)
+            return self.rows, empty, empty, empty, empty
+
+        length = self._agent_length
+        speed = self.speed.copy()
+        reverse = np.zeros(len(self.rows), dtype=bool)
+
+        local_time = t + self.phase
+        cycle = self.cycle
+        finite = np.isfinite(cycle) & (cycle > 0)
+        safe_cycle = np.where(finite, cycle, 1.0)
+        fraction = np.zeros(len(self.rows))
+
+        once = self.mode == _MODE_CODES[MODE_ONCE]
+        loop = self.mode == _MODE_CODES[MODE_LOOP]
+        ping_pong = self.mode == _MODE_CODES[MODE_PING_PONG]
+
+        fraction[once] = np.clip(local_time[once] / safe_cycle[once], 0.0, 1.0)
+        fraction[loop] = (local_time[loop] % safe_cycle[loop]) / safe_cycle[loop]
+        progress = (local_time[ping_pong] % (safe_cycle[ping_pong] * 2)) / safe_cycle[ping_pong]
+        # 往復の後半は終点から始点へ戻る
+        backward = progress > 1.0
+        fraction[ping_pong] = np.where(backward, 2.0 - progress, progress)
+        reverse[ping_pong] = backward
+
+        # 終点に到着した一方向移動のエージェントは停止する
+        speed[once & (local_time >= safe_cycle)] = 0.0
+        # 周期が定義されない（速さ0など）エージェントは始点に留まる
+        fraction[~finite] = 0.0
+        speed[~finite] = 0.0
+        distance = fraction * length
+
+        speed[length == 0.0] = 0.0
+
+        # 連結した区間表を二分探索して区間を特定する
+        key = self._agent_base + distance
+        segment = np.searchsorted(self._segment_start, key, side="right") - 1
+        segment = np.clip(segment, self._agent_first, self._agent_last)
+        offset = key - self._segment_start[segment]
+
+        origin = self._segment_origin[segment]
+        direction = self._segment_direction[segment]
+        x = origin[:, 0] + offset * direction[:, 0]
+        y = origin[:, 1] + offset * direction[:, 1]
+        heading = self._segment_heading[segment]
+        # 逆方向に移動中は向きを反転し、(-π, π] に正規化する
+        heading = np.where(reverse, np.where(heading > 0.0, heading - np.pi, heading + np.pi), heading)
+        return self.rows, x, y, heading, speed
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+差分送信（変換行列）
+
+エージェントごとに最後に送信した位置・回転・速度を保持し、
+しきい値を超えて変化したエージェントのみをPUTの対象とする。
+停止しているエージェントが多い場合に、送信データ量とEdgeの処理量を削減する。
+
+変化していないエージェントも一定間隔（full_refresh_interval）ごとに再送し、
+Edge側の状態が古くならないようにする。再送の時期は行番号ごとにずらし、
+全エージェントの再送が同じ周期に集中しないようにする。
+"""
+
+from typing import Optional
+
+import numpy as np
+
+
+# 再送時期をずらすための低食い違い数列の係数
+_GOLDEN_RATIO = 0.6180339887498949
+
+
+class TransformPublisher:
+    """変化したエージェントのみを選択する差分送信の状態管理
+
+    select() で送信対象の行番号を求め、送信に成功した場合のみ commit() で
+    送信済みの状態を更新する。送信に失敗した行は次の周期で再び対象になる。
+
+    Attributes:
+        position_epsilon (float): 位置のしきい値（メートル）
+        rotation_epsilon (float): 回転のしきい値（度）
+        speed_epsilon (float): 速度のしきい値（m/s）
+        full_refresh_interval (float): 変化がなくても再送する間隔（秒）
+    """
+
+    def __init__(self, position_epsilon: float = 0.01, rotation_epsilon: float = 0.5,
+                 speed_epsilon: float = 0.01, full_refresh_interval: float = 1.0):
+        self.position_epsilon = position_epsilon
+        self.rotation_epsilon = rotation_epsilon
+        self.speed_epsilon = speed_epsilon
+        self.full_refresh_interval = full_refresh_interval
+        self._position = np.zeros((0, 3))
+        self._rotation = np.zeros(0)
+        self._velocity = np.zeros((0, 3))
+        # 最後に送信した時刻（未送信の行は -inf）
+        self._sent_time = np.zeros(0)
+        # select() で選択し、commit() を待っている送信内容
+        self._candidate: Optional[tuple] = None
+        # 統計情報（送信を完了した周期の送信エージェント数と全エージェント数の累計）
+        self.sent_agents = 0
+        self.total_agents = 0
+
+    def _resize(self, size: int):
+        """エージェント数の増加に合わせて状態配列を拡張する"""
+        current = len(self._sent_time)
+        if size <= current:
+            return
+        grow = size - current
+        self._position = np.concatenate((self._position, np.zeros((grow, 3))))
+        self._rotation = np.concatenate((self._rotation, np.zeros(grow)))
+        self._velocity = np.concatenate((self._velocity, np.zeros((grow, 3))))
+        self._sent_time = np.concatenate((self._sent_time, np.full(grow, -np.inf)))
+
+    def select(self, position: np.ndarray, rotation: np.ndarray, velocity: np.ndarray,
+               now: float, eligible: Optional[np.ndarray] = None) -> np.ndarray:
+        """送信対象のエージェントの行番号を求める
+
+        Args:
+            position (np.ndarray): 現在の位置 (n, 3)
+            rotation (np.ndarray): 現在の向き (n,)（度）
+            velocity (np.ndarray): 現在の速度 (n, 3)
+            now (float): 現在のシミュレーション時刻（秒）
+            eligible (Optional[np.ndarray]): 送信できる行（Edgeに登録済みの行）のフラグ (n,)。
+                対象外の行は未送信のまま残り、送信できるようになった最初の周期で送信する
+
+        Returns:
+            np.ndarray: 送信対象の行番号
+        """
+        size = len(position)
+        self._resize(size)
+        last_position = self._position[:size]
+        moved = np.einsum("ij,ij->i", position - last_position, position - last_position) \
+            > self.position_epsilon ** 2
+        # 回転は -180〜180度に折り返して比較する
+        turned = np.abs((rotation - self._rotation[:size] + 180.0) % 360.0 - 180.0) \
+            > self.rotation_epsilon
+        # Edgeは速度で位置を補間するため、停止・発進も送信対象とする
+        accelerated = np.abs(velocity - self._velocity[:size]).max(axis=1) > self.speed_epsilon
+        stale = now - self._sent_time[:size] >= self.full_refresh_interval
+
+        selected = moved | turned | accelerated | stale
+        if eligible is not None:
+            selected &= eligible
+            size = int(np.count_nonzero(eligible))
+        rows = np.flatnonzero(selected)
+        if len(rows) == 0:
+            # 送信するものがない周期は送信せずに完了するため、ここで集計する
+            self._candidate = None
+            self.total_agents += size
+            return rows
+        self._candidate = (rows, position[rows].copy(), rotation[rows].copy(),
+                           velocity[rows].copy(), now, size)
+        return rows
+
+    def commit(self):
+        """直前に select() した内容を送信済みとして記録する"""
+        if self._candidate is None:
+            return
+        rows, position, rotation, velocity, now, size = self._candidate
+        # 送信に成功した周期のみ集計する（失敗・期限超過の周期は送信率に含めない）
+        self.sent_agents += len(rows)
+        self.total_agents += size
+        self._position[rows] = position
+        self._rotation[rows] = rotation
+        self._velocity[rows] = velocity
+        # 初回送信時は再送時期を行番号ごとに [0, full_refresh_interval) の範囲でずらす
+        first = np.isinf(self._sent_time[rows])
+        stagger = (rows * _GOLDEN_RATIO % 1.0) * self.full_refresh_interval
+        self._sent_time[rows] = np.where(first, now - stagger, now)
+        self._candidate = None
+
+    def reset(self):
+        """全エージェントを未送信に戻す（次の select() で全件を送信する）"""
+        self._sent_time[:] = -np.inf
+        self._candidate = None
+
+    @property
+    def send_ratio(self) -> float:
+        """送信を完了した周期で、全エージェントのうち実際に送信した割合"""
+        return self.sent_agents / self.total_agents if self.total_agents else 1.0
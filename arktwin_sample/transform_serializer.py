@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+変換行列送信用のシリアライザー
+
+PUT /api/edge/agents のリクエストボディを、エージェント状態の配列から
+直接JSONバイト列として生成する。
+
+- DictTransformSerializer: エージェントごとに入れ子の辞書を組み立ててJSONに変換する（従来の方法）
+- TemplateTransformSerializer: 定数部分（parentAgentId: null、単位スケールなど）を
+  テンプレートとして事前に用意し、数値とエージェントIDのみを差し込む
+
+orjson がインストールされている場合は数値の文字列化とJSON変換に使用する。
+"""
+
+import json
+import re
+from abc import ABC, abstractmethod
+from typing import Dict, Sequence
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # 未インストールの場合は標準のjsonモジュールを使用
+    orjson = None
+
+
+# 標準の repr の指数表記を orjson と同じ表記にそろえる
+# orjson は 1e-5 以上 1e-4 未満を小数で表記し（1.5e-05 -> 0.000015）、それ以外の指数の + と先頭の0を省く（1e+16 -> 1e16）
+_EXPONENT_MINUS_5 = re.compile(r"(\d)(?:\.(\d+))?e-05")
+_EXPONENT = re.compile(r"e\+?(-?)0*(?=\d)")
+
+
+def _orjson_exponents(text: str) -> str:
+    """repr で連結した数値の指数表記を orjson の表記に変換する"""
+    text = _EXPONENT_MINUS_5.sub(lambda m: "0.0000" + m.group(1) + (m.group(2) or ""), text)
+    return _EXPONENT.sub(r"e\1", text)
+
+
+def dumps(obj) -> bytes:
+    """オブジェクトをJSONバイト列に変換する（orjsonがあれば使用）"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+class TransformSerializer(ABC):
+    """変換行列送信用のリクエストボディを生成するシリアライザーの基底クラス
+
+    NaN・無限大の数値は orjson と同じく null として出力する。
+    """
+
+    @abstractmethod
+    def serialize(self, timestamp: dict, agent_ids: Sequence[str], position: np.ndarray,
+                  rotation: np.ndarray, velocity: np.ndarray) -> bytes:
+        """リクエストボディを生成する
+
+        Args:
+            timestamp (dict): seconds と nanos を持つタイムスタンプ
+            agent_ids (Sequence[str]): エージェントID
+            position (np.ndarray): 位置 (n, 3)
+            rotation (np.ndarray): 向き (n,)（度、EulerAngles.z）
+            velocity (np.ndarray): 速度 (n, 3)
+
+        Returns:
+            bytes: timestamp と agents を持つ更新要求のJSON
+        """
+
+
+def _json_list(values: np.ndarray) -> list:
+    """配列をJSON用のリストに変換する（NaN・無限大は None）"""
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values)
+    if finite.all():
+        return values.tolist()
+    return np.where(finite, values, None).tolist()
+
+
+class DictTransformSerializer(TransformSerializer):
+    """エージェントごとに入れ子の辞書を組み立ててJSONに変換する"""
+
+    def serialize(self, timestamp, agent_ids, position, rotation, velocity) -> bytes:
+        transforms = {}
+        for agent_id, (x, y, z), rotation_z, (speed_x, speed_y, speed_z) in zip(
+                agent_ids, _json_list(position), _json_list(rotation), _json_list(velocity)):
+            transforms[agent_id] = {
+                "transform": {
+                    "parentAgentId": None,
+                    "globalScale": {
+                        "x": 1.0,
+                        "y": 1.0,
+                        "z": 1.0
+                    },
+                    "localRotation": {
+                        "EulerAngles": {
+                            "x": 0.0,
+                            "y": 0.0,
+                            "z": rotation_z
+                        }
+                    },
+                    "localTranslation": {
+                        "x": x,  # 東方向位置（メートル）
+                        "y": y,  # 北方向位置（メートル）
+                        "z": z   # 上方向位置（メートル）
+                    },
+                    "localTranslationSpeed": {
+                        "x": speed_x,  # X方向速度
+                        "y": speed_y,  # Y方向速度
+                        "z": speed_z   # Z方向速度
+                    }
+                },
+                "status": {}
+            }
+        return dumps({
+            "timestamp": timestamp,
+            "agents": transforms
+        })
+
+
+# 1エージェント分のJSONの定数部分（数値の前後に置く断片）
+_AGENT_FRAGMENTS = (
+    b':{"transform":{"parentAgentId":null,"globalScale":{"x":1.0,"y":1.0,"z":1.0},'
+    b'"localRotation":{"EulerAngles":{"x":0.0,"y":0.0,"z":',
+    b'}},"localTranslation":{"x":',
+    b',"y":',
+    b',"z":',
+    b'},"localTranslationSpeed":{"x":',
+    b',"y":',
+    b',"z":',
+    b'}},"status":{}}',
+)
+# 断片表の列: [区切り, ID, 断片0, 数値0, 断片1, 数値1, ..., 数値6, 断片7]
+_VALUE_COLUMNS = len(_AGENT_FRAGMENTS) - 1
+_PIECE_COLUMNS = 2 + 2 * _VALUE_COLUMNS + 1
+
+
+def _format_numbers(values: np.ndarray) -> list:
+    """数値の配列をJSONの数値表現（bytes）のリストに変換する"""
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    if orjson is not None:
+        encoded = orjson.dumps(values, option=orjson.OPT_SERIALIZE_NUMPY)
+    else:
+        finite = np.isfinite(values)
+        if finite.all():
+            text = ",".join(map(repr, values.tolist()))
+        else:
+            text = ",".join(repr(value) if ok else "null"
+                            for value, ok in zip(values.tolist(), finite.tolist()))
+        if "e" in text:
+            text = _orjson_exponents(text)
+        encoded = ("[" + text + "]").encode()
+    return encoded[1:-1].split(b",")
+
+
+class TemplateTransformSerializer(TransformSerializer):
+    """定数部分のテンプレートに数値とIDを差し込んでJSONを生成する
+
+    JSONの断片を並べたオブジェクト配列（エージェント数 × 断片数）を保持し、
+    定数の断片は確保時に一度だけ書き込む。毎周期はIDと数値の列のみを上書きし、
+    全断片を連結してリクエストボディとする。
+    """
+
+    def __init__(self):
+        self._pieces = np.empty((0, _PIECE_COLUMNS), dtype=object)
+        # JSON文字列としてエンコード済みのエージェントID
+        self._encoded_ids: Dict[str, bytes] = {}
+
+    def _reserve(self, count: int) -> np.ndarray:
+        """少なくとも count 行の断片表を確保し、先頭 count 行のビューを返す"""
+        if count > len(self._pieces):
+            pieces = np.empty((max(count, len(self._pieces) * 2), _PIECE_COLUMNS), dtype=object)
+            pieces[:, 0] = b","
+            pieces[0, 0] = b""
+            for k, fragment in enumerate(_AGENT_FRAGMENTS):
+                pieces[:, 2 + 2 * k] = fragment
+            self._pieces = pieces
+        return self._pieces[:count]
+
+    def _encode_id(self, agent_id: str) -> bytes:
+        encoded = self._encoded_ids.get(agent_id)
+        if encoded is None:
+            encoded = json.dumps(agent_id).encode()
+            self._encoded_ids[agent_id] = encoded
+        return encoded
+
+    def serialize(self, timestamp, agent_ids, position, rotation, velocity) -> bytes:
+        head = b'{"timestamp":' + dumps(timestamp) + b',"agents":{'
+        count = len(agent_ids)
+        if count == 0:
+            return head + b"}}"
+
+        pieces = self._reserve(count)
+        encoded_ids = self._encoded_ids
+        pieces[:, 1] = [encoded_ids.get(agent_id) or self._encode_id(agent_id)
+                        for agent_id in agent_ids]
+        columns = (rotation, position[:, 0], position[:, 1], position[:, 2],
+                   velocity[:, 0], velocity[:, 1], velocity[:, 2])
+        for k, values in enumerate(columns):
+            pieces[:, 3 + 2 * k] = _format_numbers(values)
+        return b"".join((head, b"".join(pieces.ravel().tolist()), b"}}"))
+
+
+# 名前で選択できるシリアライザー
+SERIALIZERS = {
+    "dict": DictTransformSerializer,
+    "template": TemplateTransformSerializer,
+}
+
+
+def create_serializer(name: str = "template") -> TransformSerializer:
+    """名前に対応するシリアライザーを作成する"""
+    if name not in SERIALIZERS:
+        raise ValueError(f"未知のシリアライザーです: {name}")
+    return SERIALIZERS[name]()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+クライアントごとの表示範囲
+
+ダッシュボードが subscribe イベントで送信する表示範囲（矩形）と種類の絞り込みを表し、
+スナップショットの全エージェントから範囲内のエージェントを空間索引で選び出す。
+空間索引はスナップショットのバージョンごとに1回だけ作り直し、全クライアントで共有する。
+"""
+
+from dataclasses import dataclass
+from typing import FrozenSet, List, Optional, Tuple
+
+import numpy as np
+
+from snapshot_store import Snapshot
+from spatial_index import SpatialGrid
+
+# 絞り込みに使う種類（プロキシは kind またはIDの先頭で車両・歩行者に振り分ける）
+KINDS = ("vehicle", "pedestrian")
+
+
+@dataclass(frozen=True)
+class Viewport:
+    """クライアントの表示範囲と種類の絞り込み
+
+    Attributes:
+        bbox (Optional[Tuple[float, float, float, float]]): min_x, min_y, max_x, max_y（メートル、Noneの場合は全域）
+        kinds (Optional[FrozenSet[str]]): 受信する種類（Noneの場合はすべて）
+    """
+    bbox: Optional[Tuple[float, float, float, float]] = None
+    kinds: Optional[FrozenSet[str]] = None
+
+    @classmethod
+    def parse(cls, data: Optional[dict]) -> Optional["Viewport"]:
+        """subscribe イベントのデータ（{"bbox": [min_x, min_y, max_x, max_y], "kinds": [...]}）を解析する
+
+        Returns:
+            Optional[Viewport]: 表示範囲（絞り込みがない場合はNone）
+
+        Raises:
+            ValueError: 形式が正しくない場合
+        """
+        data = data or {}
+        bbox = data.get("bbox")
+        if bbox is not None:
+            if len(bbox) != 4:
+                raise ValueError("bbox は [min_x, min_y, max_x, max_y] で指定してください")
+            min_x, min_y, max_x, max_y = (float(value) for value in bbox)
+            if min_x > max_x or min_y > max_y:
+                raise ValueError("bbox の最小値が最大値を超えています")
+            bbox = (min_x, min_y, max_x, max_y)
+        kinds = data.get("kinds")
+        if kinds is not None:
+            kinds = frozenset(str(kind) for kind in kinds)
+            unknown = kinds.difference(KINDS)
+            if unknown:
+                raise ValueError(f"不明な種類です: {', '.join(sorted(unknown))}")
+        if bbox is None and kinds is None:
+            return None
+        return cls(bbox=bbox, kinds=kinds)
+
+
+class ViewportIndex:
+    """スナップショットのエージェントを表示範囲で絞り込むための空間索引"""
+
+    def __init__(self, cell_size: float = 50.0):
+        self.grid = SpatialGrid(cell_size)
+        self._version: Optional[int] = None
+        self._agents: List[dict] = []
+        self._vehicle_count = 0
+
+    def update(self, snapshot: Snapshot):
+        """スナップショットの全エージェントで空間索引を作り直す（同じバージョンでは何もしない）"""
+        if snapshot.version == self._version:
+            return
+        agents = snapshot.agents()
+        xy = np.array([(agent["x"], agent["y"]) for agent in agents], dtype=float).reshape(-1, 2)
+        self.grid.reset([agent["id"] for agent in agents], xy)
+        self._agents = agents
+        # snapshot.agents() は車両、歩行者の順
+        self._vehicle_count = len(snapshot.vehicles)
+        self._version = snapshot.version
+
+    def select(self, viewport: Viewport) -> Tuple[List[dict], List[dict]]:
+        """表示範囲内の車両と歩行者を選び出す
+
+        Returns:
+            Tuple[List[dict], List[dict]]: 車両と歩行者（スナップショット内の順）
+        """
+        if viewport.bbox is None:
+            slots = np.arange(len(self._agents))
+        else:
+            slots = np.sort(self.grid.query_box(*viewport.bbox))
+        split = int(np.searchsorted(slots, self._vehicle_count))
+        kinds = viewport.kinds
+        agents = self._agents
+        vehicles = ([agents[slot] for slot in slots[:split].tolist()]
+                    if kinds is None or "vehicle" in kinds else [])
+        pedestrians = ([agents[slot] for slot in slots[split:].tolist()]
+                       if kinds is None or "pedestrian" in kinds else [])
+        return vehicles, pedestrians